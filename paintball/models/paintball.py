@@ -5,7 +5,8 @@ from datetime import datetime, timedelta
 from odoo.exceptions import UserError, ValidationError
 from odoo.osv import expression
 from odoo.tools import DEFAULT_SERVER_DATETIME_FORMAT
-from odoo import api, fields, models, _
+from odoo import api, fields, models, tools, _
+from odoo.addons.paintball.tools import intervals, profiling
 import logging
 _logger = logging.getLogger(__name__)
 
@@ -67,60 +68,94 @@ class PaintballArea(models.Model):
     sequence = fields.Integer(index=True)
 
 
-class PaintballZoneType(models.Model):
+class PaintballHierarchyMixin(models.AbstractModel):
 
-    _name = "paintball.zone.type"
-    _description = "Zone Type"
+    _name = 'paintball.hierarchy.mixin'
+    _description = 'Paintball Hierarchy Mixin'
+    _parent_store = True
 
-    name = fields.Char(required=True)
-    categ_id = fields.Many2one('paintball.zone.type', 'Category')
-    child_ids = fields.One2many('paintball.zone.type', 'categ_id',
-                                'Child Categories')
+    parent_path = fields.Char(index=False)
+    complete_name = fields.Char('Complete Name', store=True,
+                                compute='_compute_complete_name')
+
+    def init(self):
+        if self._abstract:
+            return
+        # child_of domains are LIKE 'path/%' queries on parent_path.
+        self._cr.execute("""
+            CREATE INDEX IF NOT EXISTS %s_parent_path_index
+                ON %s (parent_path text_pattern_ops)
+        """ % (self._table, self._table))
 
+    def _get_complete_name_depends(self):
+        if self._parent_name not in self._fields:
+            # The mixin itself has no parent field.
+            return ('name',)
+        return ('name', '%s.complete_name' % self._parent_name)
+
+    @api.depends(lambda self: self._get_complete_name_depends())
+    def _compute_complete_name(self):
+        for rec in self:
+            parent = rec[rec._parent_name]
+            if parent:
+                rec.complete_name = '%s / %s' % (parent.complete_name,
+                                                 rec.name)
+            else:
+                rec.complete_name = rec.name
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super(PaintballHierarchyMixin, self).create(vals_list)
+        if any(vals.get(self._parent_name) for vals in vals_list):
+            records._check_hierarchy()
+        return records
+
+    def write(self, vals):
+        res = super(PaintballHierarchyMixin, self).write(vals)
+        if self._parent_name in vals:
+            self._check_hierarchy()
+        return res
+
+    def _check_hierarchy(self):
+        if not self._check_recursion():
+            raise ValidationError(_('You cannot create recursive '
+                                    'categories.'))
 
     def name_get(self):
-        def get_names(cat):
-            """ Return the list [cat.name, cat.categ_id.name, ...] """
-            res = []
-            while cat:
-                res.append(cat.name)
-                cat = cat.categ_id
-            return res
-        return [(cat.id, " / ".join(reversed(get_names(cat)))) for cat in self]
+        return [(rec.id, rec.complete_name) for rec in self]
 
     @api.model
     def name_search(self, name, args=None, operator='ilike', limit=100):
-        if not args:
-            args = []
+        """
+        Search the full names, such as 'Parent / Child', as displayed
+        by name_get().
+        """
+        args = list(args or [])
         if name:
-            # Be sure name_search is symmetric to name_get
-            category_names = name.split(' / ')
-            parents = list(category_names)
-            child = parents.pop()
-            domain = [('name', operator, child)]
-            if parents:
-                names_ids = self.name_search(' / '.join(parents), args=args,
-                                             operator='ilike', limit=limit)
-                category_ids = [name_id[0] for name_id in names_ids]
-                if operator in expression.NEGATIVE_TERM_OPERATORS:
-                    categories = self.search([('id', 'not in', category_ids)])
-                    domain = expression.OR([[('categ_id', 'in',
-                                              categories.ids)], domain])
-                else:
-                    domain = expression.AND([[('categ_id', 'in',
-                                               category_ids)], domain])
-                for i in range(1, len(category_names)):
-                    domain = [[('name', operator,
-                                ' / '.join(category_names[-1 - i:]))], domain]
-                    if operator in expression.NEGATIVE_TERM_OPERATORS:
-                        domain = expression.AND(domain)
-                    else:
-                        domain = expression.OR(domain)
-            categories = self.search(expression.AND([domain, args]),
-                                     limit=limit)
-        else:
-            categories = self.search(args, limit=limit)
-        return categories.name_get()
+            args = expression.AND([[('complete_name', operator, name)],
+                                   args])
+        return self.search(args, limit=limit).name_get()
+
+    def _get_descendants(self):
+        """
+        Return the records and all their descendants, in one query on
+        the parent paths.
+        """
+        return self.search([('id', 'child_of', self.ids)])
+
+
+class PaintballZoneType(models.Model):
+
+    _name = "paintball.zone.type"
+    _inherit = 'paintball.hierarchy.mixin'
+    _parent_name = 'categ_id'
+    _description = "Zone Type"
+
+    name = fields.Char(required=True)
+    categ_id = fields.Many2one('paintball.zone.type', 'Category',
+                               index=True)
+    child_ids = fields.One2many('paintball.zone.type', 'categ_id',
+                                'Child Categories')
 
 
 class ProductProduct(models.Model):
@@ -130,6 +165,23 @@ class ProductProduct(models.Model):
     iszone = fields.Boolean('Is Zone')
     iscategid = fields.Boolean('Is Categ')
     isservice = fields.Boolean('Is Service')
+
+    def write(self, vals):
+        if {'lst_price', 'list_price', 'price_extra', 'standard_price',
+                'taxes_id'} & set(vals):
+            self.env['paintball.pricing']._clear_price_cache()
+        return super(ProductProduct, self).write(vals)
+
+
+class ProductTemplate(models.Model):
+
+    _inherit = "product.template"
+
+    def write(self, vals):
+        # Prices of the variants are read from their template.
+        if {'list_price', 'standard_price', 'taxes_id'} & set(vals):
+            self.env['paintball.pricing']._clear_price_cache()
+        return super(ProductTemplate, self).write(vals)
     
 
 
@@ -137,59 +189,17 @@ class ProductProduct(models.Model):
 class PaintballZoneAmenitiesType(models.Model):
 
     _name = 'paintball.zone.amenities.type'
+    _inherit = 'paintball.hierarchy.mixin'
+    _parent_name = 'amenity_id'
     _description = 'amenities Type'
 
     name = fields.Char(required=True)
-    amenity_id = fields.Many2one('paintball.zone.amenities.type', 'Category')
+    amenity_id = fields.Many2one('paintball.zone.amenities.type', 'Category',
+                                 index=True)
     child_ids = fields.One2many('paintball.zone.amenities.type', 'amenity_id',
                                 'Child Categories')
 
 
-    def name_get(self):
-        def get_names(cat):
-            """ Return the list [cat.name, cat.amenity_id.name, ...] """
-            res = []
-            while cat:
-                res.append(cat.name)
-                cat = cat.amenity_id
-            return res
-        return [(cat.id, " / ".join(reversed(get_names(cat)))) for cat in self]
-
-    @api.model
-    def name_search(self, name, args=None, operator='ilike', limit=100):
-        if not args:
-            args = []
-        if name:
-            # Be sure name_search is symetric to name_get
-            category_names = name.split(' / ')
-            parents = list(category_names)
-            child = parents.pop()
-            domain = [('name', operator, child)]
-            if parents:
-                names_ids = self.name_search(' / '.join(parents), args=args,
-                                             operator='ilike', limit=limit)
-                category_ids = [name_id[0] for name_id in names_ids]
-                if operator in expression.NEGATIVE_TERM_OPERATORS:
-                    categories = self.search([('id', 'not in', category_ids)])
-                    domain = expression.OR([[('amenity_id', 'in',
-                                              categories.ids)], domain])
-                else:
-                    domain = expression.AND([[('amenity_id', 'in',
-                                               category_ids)], domain])
-                for i in range(1, len(category_names)):
-                    domain = [[('name', operator,
-                                ' / '.join(category_names[-1 - i:]))], domain]
-                    if operator in expression.NEGATIVE_TERM_OPERATORS:
-                        domain = expression.AND(domain)
-                    else:
-                        domain = expression.OR(domain)
-            categories = self.search(expression.AND([domain, args]),
-                                     limit=limit)
-        else:
-            categories = self.search(args, limit=limit)
-        return categories.name_get()
-
-
 class PaintballZoneAmenities(models.Model):
 
     _name = 'paintball.zone.amenities'
@@ -215,6 +225,15 @@ class FolioZoneLine(models.Model):
     folio_id = fields.Many2one('paintball.folio', string='Folio Number')
     status = fields.Selection(string='state', related='folio_id.state')
 
+    def init(self):
+        # Range index used by paintball.zone._get_available_zones() so an
+        # overlap lookup does not depend on the size of the history.
+        self._cr.execute("""
+            CREATE INDEX IF NOT EXISTS folio_zone_line_period_idx
+            ON folio_zone_line
+            USING gist (tsrange(check_in, check_out, '[]'))
+        """)
+
 
 class PaintballZone(models.Model):
 
@@ -248,6 +267,41 @@ class PaintballZone(models.Model):
             if zone.capacity <= 0:
                 raise ValidationError(_('Zone capacity must be more than 0'))
 
+    @api.model
+    @tools.ormcache()
+    def _get_product_zone_map(self):
+        """
+        Return the {product id: zone id} mapping of all the zones. The
+        mapping is cached and cleared when zones are created, unlinked or
+        linked to another product.
+        """
+        self.flush(['product_id'])
+        self._cr.execute("SELECT product_id, id FROM paintball_zone")
+        return dict(self._cr.fetchall())
+
+    @api.model
+    def _get_zones_by_product(self, products):
+        """
+        Return the zones of the given products, in one batch.
+        @param self: object pointer
+        @param products: product.product record set
+        @return: dictionary of the paintball.zone record per product id
+        """
+        zone_map = self._get_product_zone_map()
+        return dict((product_id, self.browse(zone_map[product_id]))
+                    for product_id in products.ids if product_id in zone_map)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        zones = super(PaintballZone, self).create(vals_list)
+        self.clear_caches()
+        return zones
+
+    def unlink(self):
+        res = super(PaintballZone, self).unlink()
+        self.clear_caches()
+        return res
+
     @api.onchange('iszone')
     def iszone_change(self):
         '''
@@ -272,9 +326,119 @@ class PaintballZone(models.Model):
         if 'iszone'in vals and vals['iszone'] is True:
             vals.update({'color': 5, 'status': 'available'})
         ret_val = super(PaintballZone, self).write(vals)
+        if 'product_id' in vals:
+            self.clear_caches()
         return ret_val
 
 
+    @api.model
+    def _get_busy_zone_queries(self, checkin, checkout):
+        """
+        Return the SQL subqueries selecting the zones booked in the
+        [checkin, checkout] period, as a list of (query, params) tuples.
+        Modules adding a new kind of zone line extend this list.
+        ---------------------------------------------------------------
+        @param self: object pointer
+        @param checkin: start of the requested period
+        @param checkout: end of the requested period
+        """
+        return [("""
+            SELECT fzl.zone_id
+              FROM folio_zone_line fzl
+         LEFT JOIN paintball_folio pf ON pf.id = fzl.folio_id
+         LEFT JOIN sale_order so ON so.id = pf.order_id
+             WHERE tsrange(fzl.check_in, fzl.check_out, '[]')
+                   && tsrange(%s, %s, '[]')
+               AND fzl.zone_id IS NOT NULL
+               AND so.state IS DISTINCT FROM 'cancel'
+        """, [checkin, checkout])]
+
+    @api.model
+    def _get_busy_cell_queries(self):
+        """
+        Return the SQL conditions telling whether a zone is booked during
+        a cell, the zone and the period of the cell being the zone_id,
+        check_in and check_out columns of the "c" alias. Modules adding a
+        new kind of zone line extend this list.
+        """
+        return ["""
+            EXISTS (SELECT 1
+                      FROM folio_zone_line fzl
+                 LEFT JOIN paintball_folio pf ON pf.id = fzl.folio_id
+                 LEFT JOIN sale_order so ON so.id = pf.order_id
+                     WHERE fzl.zone_id = c.zone_id
+                       AND tsrange(fzl.check_in, fzl.check_out, '[]')
+                           && tsrange(c.check_in, c.check_out, '[]')
+                       AND so.state IS DISTINCT FROM 'cancel')
+        """]
+
+    @api.model
+    def _get_busy_cells(self, cells):
+        """
+        Return, in one query, the cells whose zone is booked during the
+        period of the cell.
+        ---------------------------------------------------------------
+        @param self: object pointer
+        @param cells: list of (zone_id, check_in, check_out) tuples
+        @return: set of the indexes of the busy cells in cells
+        """
+        if not cells:
+            return set()
+        self.env['folio.zone.line'].flush()
+        values = ', '.join(['(%s, %s, %s::timestamp, %s::timestamp)'] *
+                           len(cells))
+        self._cr.execute("""
+            WITH c (idx, zone_id, check_in, check_out) AS (
+                VALUES """ + values + """
+            )
+            SELECT c.idx FROM c
+             WHERE """ + ' OR '.join(self._get_busy_cell_queries()),
+                         [value for idx, cell in enumerate(cells)
+                          for value in (idx,) + tuple(cell)])
+        return set(row[0] for row in self._cr.fetchall())
+
+    @api.model
+    def _get_available_zones(self, checkin, checkout, categ_id=None,
+                             warehouse_id=None):
+        """
+        Return the zones that are free during the [checkin, checkout]
+        period with a single indexed query.
+        ---------------------------------------------------------------
+        @param self: object pointer
+        @param checkin: start of the requested period
+        @param checkout: end of the requested period
+        @param categ_id: optional paintball.zone.type id to filter on, the
+                         zones of its subcategories are included
+        @param warehouse_id: optional stock.warehouse id, only zones of
+                             its company (or shared ones) are returned
+        @return: paintball.zone record set
+        """
+        if not (checkin and checkout):
+            return self.browse()
+        query = """
+            SELECT z.id
+              FROM paintball_zone z
+              JOIN product_product pp ON pp.id = z.product_id
+              JOIN product_template pt ON pt.id = pp.product_tmpl_id
+             WHERE pp.active
+        """
+        params = []
+        if categ_id:
+            categs = self.env['paintball.zone.type'].browse(categ_id)
+            query += " AND z.categ_id IN %s"
+            params.append(tuple(categs._get_descendants().ids))
+        if warehouse_id:
+            query += """ AND (pt.company_id IS NULL OR pt.company_id = (
+                SELECT company_id FROM stock_warehouse WHERE id = %s))"""
+            params.append(warehouse_id)
+        for busy_query, busy_params in self._get_busy_zone_queries(checkin,
+                                                                   checkout):
+            query += " AND z.id NOT IN (%s)" % busy_query
+            params += busy_params
+        query += " ORDER BY z.id"
+        self._cr.execute(query, params)
+        return self.browse([row[0] for row in self._cr.fetchall()])
+
     def set_zone_status_occupied(self):
         """
         This method is used to change the state
@@ -295,6 +459,166 @@ class PaintballZone(models.Model):
         return self.write({'iszone': True, 'color': 5})
 
 
+class PaintballPricing(models.AbstractModel):
+
+    _name = 'paintball.pricing'
+    _description = 'Paintball Pricing Engine'
+
+    @api.model
+    def _get_price_cache(self):
+        """
+        Return the prices resolved in the current transaction, by
+        (pricelist, date, quantity, partner, product) ids.
+        """
+        return self._cr.cache.setdefault('paintball_pricing', {})
+
+    @api.model
+    def _clear_price_cache(self):
+        self._cr.cache.pop('paintball_pricing', None)
+
+    @api.model
+    def _compute_prices(self, requests):
+        """
+        Compute the unit prices of many products at once. The pricelist
+        rules are resolved in one _compute_price_rule() call per
+        pricelist, date, quantity and partner, and their result is kept
+        for the rest of the transaction.
+        ---------------------------------------------------------------
+        @param self: The object pointer
+        @param requests: list of (product, quantity, pricelist, partner,
+                         date) tuples, pricelist and partner may be empty
+        @return: list of unit prices, in the order of requests
+        """
+        cache = self._get_price_cache()
+        keys = []
+        missing = {}
+        for product, qty, pricelist, partner, date in requests:
+            key = (pricelist.id, fields.Datetime.to_string(date) or False,
+                   qty or 1.0, partner.id, product.id)
+            keys.append(key)
+            if key not in cache and pricelist:
+                group = missing.setdefault(key[:4], (pricelist, date,
+                                                     qty or 1.0, partner,
+                                                     {}))
+                group[4][product.id] = product
+        for group, (pricelist, date, qty, partner, products) in \
+                missing.items():
+            rule_prices = pricelist._compute_price_rule(
+                [(product, qty, partner) for product in products.values()],
+                date=date or False)
+            for product_id, (price, rule_id) in rule_prices.items():
+                cache[group + (product_id,)] = price
+        return [cache[key] if key in cache else product.lst_price
+                for key, (product, __, __, __, __) in zip(keys, requests)]
+
+    @api.model
+    def _compute_line_prices(self, lines):
+        """
+        Return the unit prices of folio zone or service lines, taxes
+        included in the price of the product moved to the taxes of the
+        lines as sale order lines do.
+        @param lines: paintball.folio.line or paintball.service.line
+                      records, possibly new ones
+        @return: dictionary of the unit price per line
+        """
+        tax_obj = self.env['account.tax']
+        requests = [(line.product_id, line.product_uom_qty,
+                     line.folio_id.pricelist_id, line.folio_id.partner_id,
+                     line.folio_id.date_order) for line in lines]
+        prices = self._compute_prices(requests)
+        return dict((line, tax_obj._fix_tax_included_price_company(
+            price, line.product_id.taxes_id, line.tax_id,
+            line.folio_id.company_id or self.env.company))
+            for line, price in zip(lines, prices))
+
+
+class ProductPricelist(models.Model):
+
+    _inherit = 'product.pricelist'
+
+    def write(self, vals):
+        self.env['paintball.pricing']._clear_price_cache()
+        return super(ProductPricelist, self).write(vals)
+
+
+class ProductPricelistItem(models.Model):
+
+    _inherit = 'product.pricelist.item'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        self.env['paintball.pricing']._clear_price_cache()
+        return super(ProductPricelistItem, self).create(vals_list)
+
+    def write(self, vals):
+        self.env['paintball.pricing']._clear_price_cache()
+        return super(ProductPricelistItem, self).write(vals)
+
+    def unlink(self):
+        self.env['paintball.pricing']._clear_price_cache()
+        return super(ProductPricelistItem, self).unlink()
+
+
+class PaintballDuration(models.AbstractModel):
+
+    _name = 'paintball.duration'
+    _description = 'Paintball Duration Engine'
+
+    @api.model
+    @tools.ormcache('company_id')
+    def _get_duration_settings(self, company_id):
+        """
+        Return the (additional_hours, duration_unit) of a company.
+        """
+        self.env['res.company'].flush(['additional_hours', 'duration_unit'])
+        self._cr.execute("""
+            SELECT additional_hours, duration_unit
+              FROM res_company WHERE id = %s
+        """, (company_id,))
+        row = self._cr.fetchone() or (0, 'day')
+        return (row[0] or 0, row[1] or 'day')
+
+    @api.model
+    def _compute_durations(self, periods):
+        """
+        Compute the billable units of many bookings at once.
+
+        With the day unit a booking is billed its number of started days,
+        the hours of the last day started within the additional hours of
+        the company being free. With the hour unit it is billed its
+        number of started hours. A booking is billed at least one unit.
+        ---------------------------------------------------------------
+        @param self: The object pointer
+        @param periods: list of (checkin, checkout, company) tuples, the
+                        company being a record or an id, the current
+                        company when empty
+        @return: list of durations, in the order of periods
+        """
+        default_company_id = self.env.company.id
+        durations = []
+        for checkin, checkout, company in periods:
+            if not (checkin and checkout):
+                durations.append(0.0)
+                continue
+            company_id = getattr(company, 'id', company) or \
+                default_company_id
+            additional_hours, unit = self._get_duration_settings(company_id)
+            delta = checkout - checkin
+            if unit == 'hour':
+                units = delta.days * 24 + delta.seconds // 3600 + \
+                    (1 if delta.seconds % 3600 else 0)
+            else:
+                units = delta.days
+                if delta.seconds > max(additional_hours, 0) * 3600:
+                    units += 1
+            durations.append(float(max(units, 1)))
+        return durations
+
+    @api.model
+    def _compute_duration(self, checkin, checkout, company=None):
+        return self._compute_durations([(checkin, checkout, company)])[0]
+
+
 class PaintballFolio(models.Model):
 
     _name = 'paintball.folio'
@@ -393,9 +717,11 @@ class PaintballFolio(models.Model):
                                     "either the guest has to payment at "
                                     "booking time or check-in "
                                     "check-out time.")
-    duration = fields.Float('Duration in Days',
-                            help="Number of days which will automatically "
-                            "count from the check-in and check-out date. ")
+    duration = fields.Float('Duration',
+                            help="Number of days or hours, depending on the "
+                            "billing unit of the company, which will "
+                            "automatically count from the check-in and "
+                            "check-out date. ")
     paintball_invoice_id = fields.Many2one('account.move', 'Invoice',
                                        copy=False)
     duration_dummy = fields.Float('Duration Dummy')
@@ -411,149 +737,172 @@ class PaintballFolio(models.Model):
         @param self: object pointer
         @return: raise warning depending on the validation
         '''
-        folio_zones = []
-        for zone in self[0].zone_lines:
-            if zone.product_id.id in folio_zones:
-                raise ValidationError(_('You Cannot Take Same Zone Twice'))
-            folio_zones.append(zone.product_id.id)
+        for folio in self:
+            periods = {}
+            for zone in folio.zone_lines:
+                period = (zone.checkin_date, zone.checkout_date)
+                for other in periods.get(zone.product_id.id, []):
+                    if intervals.intersection(period, other):
+                        raise ValidationError(_('You Cannot Take Same Zone '
+                                                'Twice in the same period'))
+                periods.setdefault(zone.product_id.id, []).append(period)
 
     @api.onchange('checkout_date', 'checkin_date')
     def onchange_dates(self):
         '''
-        This method gives the duration between check in and checkout
-        if customer will leave only for some hour it would be considers
-        as a whole day.If customer will check in checkout for more or equal
-        hours, which configured in company as additional hours than it would
-        be consider as full days
+        This method gives the billable duration between check in and
+        checkout, see paintball.duration.
         --------------------------------------------------------------------
         @param self: object pointer
-        @return: Duration and checkout_date
         '''
-        configured_addition_hours = 0
-        wid = self.warehouse_id
-        whouse_com_id = wid or wid.company_id
-        if whouse_com_id:
-            configured_addition_hours = wid.company_id.additional_hours
-        myduration = 0
-        if self.checkout_date and self.checkin_date:
-            dur = self.checkin_date - self.checkin_date
-            sec_dur = dur.seconds
-            if (not dur.days and not sec_dur) or (dur.days and not sec_dur):
-                myduration = dur.days
-            else:
-                myduration = dur.days + 1
-            # To calculate additional hours in paintball zone as per minutes
-            if configured_addition_hours > 0:
-                additional_hours = abs((dur.seconds / 60) / 60)
-                if additional_hours >= configured_addition_hours:
-                    myduration += 1
-        self.duration = myduration
+        self.duration = self.env['paintball.duration']._compute_duration(
+            self.checkin_date, self.checkout_date,
+            self.warehouse_id.company_id or self.company_id)
         self.duration_dummy = self.duration
 
-    @api.model
-    def create(self, vals):
+    @api.model_create_multi
+    @profiling.profiled
+    def create(self, vals_list):
         """
         Overrides orm create method.
         @param self: The object pointer
-        @param vals: dictionary of fields value.
+        @param vals_list: list of dictionaries of fields value.
         @return: new record set for paintball folio.
         """
-        if not 'service_lines' and 'folio_id' in vals:
-            tmp_zone_lines = vals.get('zone_lines', [])
-            vals['order_policy'] = vals.get('paintball_policy', 'manual')
-            vals.update({'zone_lines': []})
-            folio_id = super(PaintballFolio, self).create(vals)
-            for line in (tmp_zone_lines):
-                line[2].update({'folio_id': folio_id.id})
-            vals.update({'zone_lines': tmp_zone_lines})
-            folio_id.write(vals)
-        else:
-            if not vals:
-                vals = {}
-            vals['name'] = self.env['ir.sequence'].next_by_code('paintball.folio')
+        for vals in vals_list:
+            vals['name'] = self.env['ir.sequence'].next_by_code(
+                'paintball.folio')
             vals['duration'] = vals.get('duration',
                                         0.0) or vals.get('duration_dummy',
                                                          0.0)
-            folio_id = super(PaintballFolio, self).create(vals)
-            folio_zone_line_obj = self.env['folio.zone.line']
-            h_zone_obj = self.env['paintball.zone']
-            try:
-                for rec in folio_id:
-                    if not rec.reservation_id:
-                        for zone_rec in rec.zone_lines:
-                            prod = zone_rec.product_id.name
-                            zone_obj = h_zone_obj.search([('name', '=',
-                                                           prod)])
-                            zone_obj.write({'iszone': False})
-                            vals = {'zone_id': zone_obj.id,
-                                    'check_in': rec.checkin_date,
-                                    'check_out': rec.checkout_date,
-                                    'folio_id': rec.id,
-                                    }
-                            folio_zone_line_obj.create(vals)
-            except:
-                for rec in folio_id:
-                    for zone_rec in rec.zone_lines:
-                        prod = zone_rec.product_id.name
-                        zone_obj = h_zone_obj.search([('name', '=', prod)])
-                        zone_obj.write({'iszone': False})
-                        vals = {'zone_id': zone_obj.id,
-                                'check_in': rec.checkin_date,
-                                'check_out': rec.checkout_date,
-                                'folio_id': rec.id,
-                                }
-                        folio_zone_line_obj.create(vals)
-        return folio_id
-
+        folios = super(PaintballFolio, self).create(vals_list)
+        folio_zone_line_obj = self.env['folio.zone.line']
+        h_zone_obj = self.env['paintball.zone']
+        zone_line_folios = folios._get_zone_line_folios()
+        zone_by_product = h_zone_obj._get_zones_by_product(
+            zone_line_folios.mapped('zone_lines.product_id'))
+        zones = h_zone_obj
+        zone_line_vals = []
+        for rec in zone_line_folios:
+            periods = set()
+            for zone_rec in rec.zone_lines:
+                zone_obj = zone_by_product.get(zone_rec.product_id.id,
+                                               h_zone_obj)
+                period = (zone_obj.id,
+                          zone_rec.checkin_date or rec.checkin_date,
+                          zone_rec.checkout_date or rec.checkout_date)
+                if period in periods:
+                    continue
+                periods.add(period)
+                zones |= zone_obj
+                zone_line_vals.append({'zone_id': zone_obj.id,
+                                       'check_in': period[1],
+                                       'check_out': period[2],
+                                       'folio_id': rec.id,
+                                       })
+        if zones:
+            zones.write({'iszone': False})
+        if zone_line_vals:
+            folio_zone_line_obj.create(zone_line_vals)
+        return folios
+
+    def _get_zone_line_folios(self):
+        """
+        Return the folios whose zones are booked through folio.zone.line
+        records. Modules booking the zones of some folios by other means
+        filter them out.
+        """
+        return self
 
+    @profiling.profiled
     def write(self, vals):
         """
         Overrides orm write method.
         @param self: The object pointer
         @param vals: dictionary of fields value.
         """
-        product_obj = self.env['product.product']
+        if vals and vals.get('duration_dummy', False):
+            vals['duration'] = vals.get('duration_dummy', 0.0)
+        # The lines written through zone_lines are synced once below.
+        res = super(PaintballFolio, self.with_context(
+            paintball_folio_sync=True)).write(vals)
+        if {'zone_lines', 'checkin_date', 'checkout_date'} & set(vals):
+            self._sync_folio_zone_lines()
+        return res
+
+    def _sync_folio_zone_lines(self):
+        """
+        Bring the folio.zone.line records of the folios in line with
+        their zone lines: one line per zone and period of a folio line.
+        Only the differences are written: missing lines are created,
+        lines no longer matching a folio line are removed, or
+        rescheduled when their zone still has an unmatched period.
+        ---------------------------------------------------------------
+        @param self: object pointer
+        """
         h_zone_obj = self.env['paintball.zone']
         folio_zone_line_obj = self.env['folio.zone.line']
-        zone_lst = []
-        zone_lst1 = []
-        for rec in self:
-            for res in rec.zone_lines:
-                zone_lst1.append(res.product_id.id)
-            if vals and vals.get('duration_dummy', False):
-                vals['duration'] = vals.get('duration_dummy', 0.0)
+        folios = self._get_zone_line_folios()
+        if not folios:
+            return
+        zone_by_product = h_zone_obj._get_zones_by_product(
+            folios.mapped('zone_lines.product_id'))
+        # (folio, zone, check_in, check_out) -> zone lines
+        existing = {}
+        for zone_line in folio_zone_line_obj.search([('folio_id', 'in',
+                                                      folios.ids)]):
+            key = (zone_line.folio_id.id, zone_line.zone_id.id,
+                   zone_line.check_in, zone_line.check_out)
+            existing.setdefault(key, []).append(zone_line)
+        missing = []
+        for rec in folios:
+            wanted = set()
+            for folio_line in rec.zone_lines:
+                zone_obj = zone_by_product.get(folio_line.product_id.id)
+                if not zone_obj:
+                    continue
+                key = (rec.id, zone_obj.id,
+                       folio_line.checkin_date or rec.checkin_date,
+                       folio_line.checkout_date or rec.checkout_date)
+                if key in wanted:
+                    continue
+                wanted.add(key)
+                if existing.get(key):
+                    existing[key].pop()
+                else:
+                    missing.append(key)
+        # Lines left over, by folio and zone, are rescheduled first.
+        spare = {}
+        for key, zone_lines in existing.items():
+            spare.setdefault(key[:2], []).extend(zone_lines)
+        to_create = []
+        to_write = {}
+        new_zones = h_zone_obj
+        for folio_id, zone_id, check_in, check_out in missing:
+            if spare.get((folio_id, zone_id)):
+                zone_line = spare[(folio_id, zone_id)].pop()
+                to_write.setdefault((check_in, check_out),
+                                    folio_zone_line_obj)
+                to_write[(check_in, check_out)] |= zone_line
             else:
-                vals['duration'] = rec.duration
-            for folio_rec in rec.zone_lines:
-                zone_lst.append(folio_rec.product_id.id)
-            new_zones = set(zone_lst).difference(set(zone_lst1))
-            if len(list(new_zones)) != 0:
-                zone_list = product_obj.browse(list(new_zones))
-                for rm in zone_list:
-                    zone_obj = h_zone_obj.search([('name', '=', rm.name)])
-                    zone_obj.write({'iszone': False})
-                    vals = {'zone_id': zone_obj.id,
-                            'check_in': rec.checkin_date,
-                            'check_out': rec.checkout_date,
-                            'folio_id': rec.id,
-                            }
-                    folio_zone_line_obj.create(vals)
-            if len(list(new_zones)) == 0:
-                zone_list_obj = product_obj.browse(zone_lst1)
-                for rom in zone_list_obj:
-                    zone_obj = h_zone_obj.search([('name', '=', rom.name)])
-                    zone_obj.write({'iszone': False})
-                    zone_vals = {'zone_id': zone_obj.id,
-                                 'check_in': rec.checkin_date,
-                                 'check_out': rec.checkout_date,
-                                 'folio_id': rec.id,
-                                 }
-                    folio_romline_rec = (folio_zone_line_obj.search
-                                         ([('folio_id', '=', rec.id)]))
-                    folio_romline_rec.write(zone_vals)
-        return super(PaintballFolio, self).write(vals)
-
-
+                new_zones |= h_zone_obj.browse(zone_id)
+                to_create.append({'zone_id': zone_id,
+                                  'check_in': check_in,
+                                  'check_out': check_out,
+                                  'folio_id': folio_id,
+                                  })
+        to_unlink = folio_zone_line_obj
+        for zone_lines in spare.values():
+            for zone_line in zone_lines:
+                to_unlink |= zone_line
+        if to_unlink:
+            to_unlink.unlink()
+        for (check_in, check_out), zone_lines in to_write.items():
+            zone_lines.write({'check_in': check_in, 'check_out': check_out})
+        if to_create:
+            folio_zone_line_obj.create(to_create)
+        if new_zones:
+            new_zones.write({'iszone': False})
 
     @api.onchange('partner_id')
     def onchange_partner_id(self):
@@ -583,23 +932,29 @@ class PaintballFolio(models.Model):
 
     def action_invoice_create(self, grouped=False, final=False):
         '''
+        Invoice the orders of the folios at once, with the invoicing of
+        sale.order.
         @param self: object pointer
+        @return: the created account.move records
         '''
-        zone_lst = []
-        invoice_id = (self.order_id.action_invoice_create(grouped=False,
-                                                          final=False))
-        for line in self:
-            values = {'invoiced': True,
-                      'paintball_invoice_id': invoice_id
-                      }
-            line.write(values)
-            for rec in line.zone_lines:
-                zone_lst.append(rec.product_id)
-            for zone in zone_lst:
-                zone_rec = self.env['paintball.zone'].\
-                    search([('name', '=', zone.name)])
-                zone_rec.write({'iszone': True})
-        return invoice_id
+        h_zone_obj = self.env['paintball.zone']
+        invoices = self.mapped('order_id')._create_invoices(grouped=grouped,
+                                                            final=final)
+        folios_by_invoice = {}
+        for folio in self:
+            invoice = folio.order_id.invoice_ids & invoices
+            folios_by_invoice.setdefault(invoice[:1], self.browse())
+            folios_by_invoice[invoice[:1]] |= folio
+        for invoice, folios in folios_by_invoice.items():
+            folios.write({'paintball_invoice_id': invoice.id})
+        zones = h_zone_obj.browse()
+        zone_by_product = h_zone_obj._get_zones_by_product(
+            self.mapped('zone_lines.product_id'))
+        for zone in zone_by_product.values():
+            zones |= zone
+        if zones:
+            zones.write({'iszone': True})
+        return invoices
 
 
     def action_invoice_cancel(self):
@@ -711,18 +1066,35 @@ class PaintballFolioLine(models.Model):
                                  help='True when folio line created from \
                                  Reservation')
 
-    @api.model
-    def create(self, vals):
+    @api.model_create_multi
+    def create(self, vals_list):
         """
         Overrides orm create method.
         @param self: The object pointer
-        @param vals: dictionary of fields value.
+        @param vals_list: list of dictionaries of fields value.
         @return: new record set for paintball folio line.
         """
-        if 'folio_id' in vals:
-            folio = self.env["paintball.folio"].browse(vals['folio_id'])
-            vals.update({'order_id': folio.order_id.id})
-        return super(PaintballFolioLine, self).create(vals)
+        folios = self.env["paintball.folio"].browse(
+            [vals['folio_id'] for vals in vals_list if vals.get('folio_id')])
+        order_by_folio = dict((folio.id, folio.order_id.id)
+                              for folio in folios)
+        for vals in vals_list:
+            if 'folio_id' in vals:
+                vals.update({'order_id': order_by_folio.get(vals['folio_id'],
+                                                            False)})
+        return super(PaintballFolioLine, self).create(vals_list)
+
+    def write(self, vals):
+        """
+        Overrides orm write method.
+        @param self: The object pointer
+        @param vals: dictionary of fields value.
+        Reschedule the folio.zone.line records of the moved lines."""
+        res = super(PaintballFolioLine, self).write(vals)
+        if {'product_id', 'checkin_date', 'checkout_date'} & set(vals) and \
+                not self._context.get('paintball_folio_sync'):
+            self.mapped('folio_id')._sync_folio_zone_lines()
+        return res
 
     @api.constrains('checkin_date', 'checkout_date')
     def check_dates(self):
@@ -747,62 +1119,44 @@ class PaintballFolioLine(models.Model):
         @param self: The object pointer
         @return: True/False.
         """
-        sale_line_obj = self.env['sale.order.line']
         fr_obj = self.env['folio.zone.line']
-        for line in self:
-            if line.order_line_id:
-                sale_unlink_obj = (sale_line_obj.browse
-                                   ([line.order_line_id.id]))
-                for rec in sale_unlink_obj:
-                    zone_obj = self.env['paintball.zone'
-                                        ].search([('name', '=', rec.name)])
-                    if zone_obj.id:
-                        folio_arg = [('folio_id', '=', line.folio_id.id),
-                                     ('zone_id', '=', zone_obj.id)]
-                        folio_zone_line_myobj = fr_obj.search(folio_arg)
-                        if folio_zone_line_myobj.id:
-                            folio_zone_line_myobj.unlink()
-                            zone_obj.write({'iszone': True,
-                                            'status': 'available'})
-                sale_unlink_obj.unlink()
-        return super(PaintballFolioLine, self).unlink()
+        h_zone_obj = self.env['paintball.zone']
+        lines = self.filtered('order_line_id')
+        zone_by_product = h_zone_obj._get_zones_by_product(
+            lines.mapped('product_id'))
+        keys = set((line.folio_id.id, zone_by_product[line.product_id.id].id,
+                    line.checkin_date, line.checkout_date)
+                   for line in lines if line.product_id.id in zone_by_product)
+        if keys:
+            folio_zone_lines = fr_obj.search([
+                ('folio_id', 'in', [key[0] for key in keys]),
+                ('zone_id', 'in', [key[1] for key in keys])])
+            folio_zone_lines = folio_zone_lines.filtered(
+                lambda zone_line: (zone_line.folio_id.id,
+                                   zone_line.zone_id.id,
+                                   zone_line.check_in,
+                                   zone_line.check_out) in keys)
+            zones = folio_zone_lines.mapped('zone_id')
+            folio_zone_lines.unlink()
+            if zones:
+                zones.write({'iszone': True, 'status': 'available'})
+        sale_lines = lines.mapped('order_line_id')
+        res = super(PaintballFolioLine, self).unlink()
+        sale_lines.unlink()
+        return res
 
     @api.onchange('product_id')
     def product_id_change(self):
         '''
  -        @param self: object pointer
  -        '''
-        context = dict(self._context)
-        if not context:
-            context = {}
-        if context.get('folio', False):
-            if self.product_id and self.folio_id.partner_id:
-                self.name = self.product_id.name
-                self.price_unit = self.product_id.list_price
-                self.product_uom = self.product_id.uom_id
-                tax_obj = self.env['account.tax']
-                pr = self.product_id
-                self.price_unit = tax_obj._fix_tax_included_price(pr.price,
-                                                                  pr.taxes_id,
-                                                                  self.tax_id)
-        else:
-            if not self.product_id:
-                return {'domain': {'product_uom': []}}
-            val = {}
-            pr = self.product_id.with_context(
-                lang=self.folio_id.partner_id.lang,
-                partner=self.folio_id.partner_id.id,
-                quantity=val.get('product_uom_qty') or self.product_uom_qty,
-                date=self.folio_id.date_order,
-                pricelist=self.folio_id.pricelist_id.id,
-                uom=self.product_uom.id
-            )
-            p = pr.with_context(pricelist=self.order_id.pricelist_id.id).price
-            if self.folio_id.pricelist_id and self.folio_id.partner_id:
-                obj = self.env['account.tax']
-                val['price_unit'] = obj._fix_tax_included_price(p,
-                                                                pr.taxes_id,
-                                                                self.tax_id)
+        if not self.product_id:
+            return {'domain': {'product_uom': []}}
+        if self.folio_id.partner_id:
+            self.name = self.product_id.name
+            self.product_uom = self.product_id.uom_id
+            self.price_unit = self.env['paintball.pricing'
+                                       ]._compute_line_prices(self)[self]
 
     @api.onchange('checkin_date', 'checkout_date')
     def on_change_checkout(self):
@@ -812,48 +1166,19 @@ class PaintballFolioLine(models.Model):
         -----------------------------------------------------------------
         @param self: object pointer
         '''
-        configured_addition_hours = 0
-        fwhouse_id = self.folio_id.warehouse_id
-        fwc_id = fwhouse_id or fwhouse_id.company_id
-        if fwc_id:
-            configured_addition_hours = fwhouse_id.company_id.additional_hours
-        myduration = 0
         if not self.checkin_date:
             self.checkin_date = time.strftime(DEFAULT_SERVER_DATETIME_FORMAT)
         if not self.checkout_date:
             self.checkout_date = time.strftime(DEFAULT_SERVER_DATETIME_FORMAT)
-        if self.checkin_date and self.checkout_date:
-            dur = self.checkout_date - self.checkin_date
-            sec_dur = dur.seconds
-            if (not dur.days and not sec_dur) or (dur.days and not sec_dur):
-                myduration = dur.days
-            else:
-                myduration = dur.days + 1
-#            To calculate additional hours in paintball zone as per minutes
-            if configured_addition_hours > 0:
-                additional_hours = abs((dur.seconds / 60) / 60)
-                if additional_hours >= configured_addition_hours:
-                    myduration += 1
-        self.product_uom_qty = myduration
-        paintball_zone_obj = self.env['paintball.zone']
-        paintball_zone_ids = paintball_zone_obj.search([])
-        avail_prod_ids = []
-        for zone in paintball_zone_ids:
-            assigned = False
-            for rm_line in zone.zone_line_ids:
-                if rm_line.status != 'cancel':
-                    if(self.checkin_date <= rm_line.check_in <=
-                       self.checkout_date) or (self.checkin_date <=
-                                               rm_line.check_out <=
-                                               self.checkout_date):
-                        assigned = True
-                    elif (rm_line.check_in <= self.checkin_date <=
-                          rm_line.check_out) or (rm_line.check_in <=
-                                                 self.checkout_date <=
-                                                 rm_line.check_out):
-                        assigned = True
-            if not assigned:
-                avail_prod_ids.append(zone.product_id.id)
+        self.product_uom_qty = self.env['paintball.duration'
+                                        ]._compute_duration(
+            self.checkin_date, self.checkout_date,
+            self.folio_id.warehouse_id.company_id or
+            self.folio_id.company_id)
+        zones = self.env['paintball.zone']._get_available_zones(
+            self.checkin_date, self.checkout_date,
+            warehouse_id=self.folio_id.warehouse_id.id)
+        avail_prod_ids = zones.mapped('product_id').ids
         domain = {'product_id': [('id', 'in', avail_prod_ids)]}
         return {'domain': domain}
 
@@ -922,18 +1247,23 @@ class PaintballServiceLine(models.Model):
     ser_checkout_date = fields.Datetime('To Date', required=True,
                                         default=_service_checkout_date)
 
-    @api.model
-    def create(self, vals):
+    @api.model_create_multi
+    def create(self, vals_list):
         """
         Overrides orm create method.
         @param self: The object pointer
-        @param vals: dictionary of fields value.
+        @param vals_list: list of dictionaries of fields value.
         @return: new record set for paintball service line.
         """
-        if 'folio_id' in vals:
-            folio = self.env['paintball.folio'].browse(vals['folio_id'])
-            vals.update({'order_id': folio.order_id.id})
-        return super(PaintballServiceLine, self).create(vals)
+        folios = self.env['paintball.folio'].browse(
+            [vals['folio_id'] for vals in vals_list if vals.get('folio_id')])
+        order_by_folio = dict((folio.id, folio.order_id.id)
+                              for folio in folios)
+        for vals in vals_list:
+            if 'folio_id' in vals:
+                vals.update({'order_id': order_by_folio.get(vals['folio_id'],
+                                                            False)})
+        return super(PaintballServiceLine, self).create(vals_list)
 
 
     def unlink(self):
@@ -956,13 +1286,9 @@ class PaintballServiceLine(models.Model):
         '''
         if self.product_id and self.folio_id.partner_id:
             self.name = self.product_id.name
-            self.price_unit = self.product_id.list_price
             self.product_uom = self.product_id.uom_id
-            tax_obj = self.env['account.tax']
-            prod = self.product_id
-            self.price_unit = tax_obj._fix_tax_included_price(prod.price,
-                                                              prod.taxes_id,
-                                                              self.tax_id)
+            self.price_unit = self.env['paintball.pricing'
+                                       ]._compute_line_prices(self)[self]
 
     @api.onchange('ser_checkin_date', 'ser_checkout_date')
     def on_change_checkout(self):
@@ -978,11 +1304,13 @@ class PaintballServiceLine(models.Model):
         if not self.ser_checkout_date:
             self.ser_checkout_date = time_a
         if self.ser_checkout_date < self.ser_checkin_date:
-            raise _('Checkout must be greater or equal checkin date')
-        if self.ser_checkin_date and self.ser_checkout_date:
-            diffDate = self.ser_checkout_date - self.ser_checkin_date
-            qty = diffDate.days + 1
-            self.product_uom_qty = qty
+            raise ValidationError(_('Checkout must be greater or equal '
+                                    'checkin date'))
+        self.product_uom_qty = self.env['paintball.duration'
+                                        ]._compute_duration(
+            self.ser_checkin_date, self.ser_checkout_date,
+            self.folio_id.warehouse_id.company_id or
+            self.folio_id.company_id)
 
 
     def button_confirm(self):
@@ -1018,59 +1346,17 @@ class PaintballServiceLine(models.Model):
 class PaintballServiceType(models.Model):
 
     _name = "paintball.service.type"
+    _inherit = 'paintball.hierarchy.mixin'
+    _parent_name = 'service_id'
     _description = "Service Type"
 
     name = fields.Char('Service Name', size=64, required=True)
-    service_id = fields.Many2one('paintball.service.type', 'Service Category')
+    service_id = fields.Many2one('paintball.service.type',
+                                 'Service Category', index=True)
     child_ids = fields.One2many('paintball.service.type', 'service_id',
                                 'Child Categories')
 
 
-    def name_get(self):
-        def get_names(cat):
-            """ Return the list [cat.name, cat.service_id.name, ...] """
-            res = []
-            while cat:
-                res.append(cat.name)
-                cat = cat.service_id
-            return res
-        return [(cat.id, " / ".join(reversed(get_names(cat)))) for cat in self]
-
-    @api.model
-    def name_search(self, name, args=None, operator='ilike', limit=100):
-        if not args:
-            args = []
-        if name:
-            # Be sure name_search is symetric to name_get
-            category_names = name.split(' / ')
-            parents = list(category_names)
-            child = parents.pop()
-            domain = [('name', operator, child)]
-            if parents:
-                names_ids = self.name_search(' / '.join(parents), args=args,
-                                             operator='ilike', limit=limit)
-                category_ids = [name_id[0] for name_id in names_ids]
-                if operator in expression.NEGATIVE_TERM_OPERATORS:
-                    categories = self.search([('id', 'not in', category_ids)])
-                    domain = expression.OR([[('service_id', 'in',
-                                              categories.ids)], domain])
-                else:
-                    domain = expression.AND([[('service_id', 'in',
-                                               category_ids)], domain])
-                for i in range(1, len(category_names)):
-                    domain = [[('name', operator,
-                                ' / '.join(category_names[-1 - i:]))], domain]
-                    if operator in expression.NEGATIVE_TERM_OPERATORS:
-                        domain = expression.AND(domain)
-                    else:
-                        domain = expression.OR(domain)
-            categories = self.search(expression.AND([domain, args]),
-                                     limit=limit)
-        else:
-            categories = self.search(args, limit=limit)
-        return categories.name_get()
-
-
 class PaintballServices(models.Model):
 
     _name = 'paintball.services'
@@ -1093,6 +1379,17 @@ class ResCompany(models.Model):
                                       check in, checkout days, whatever the \
                                       hours will be provided here based on \
                                       that extra days will be calculated.")
+    duration_unit = fields.Selection([('day', 'Days'), ('hour', 'Hours')],
+                                     'Billing Unit', default='day',
+                                     required=True,
+                                     help="Unit in which the zones and "
+                                     "services are billed.")
+
+    def write(self, vals):
+        res = super(ResCompany, self).write(vals)
+        if {'additional_hours', 'duration_unit'} & set(vals):
+            self.env['paintball.duration'].clear_caches()
+        return res
     
 class ShooterTeam(models.Model):
     _name = 'paintball.shooter_team'
@@ -1145,4 +1442,125 @@ class AccountMove(models.Model):
 
          
     
-    
\ No newline at end of file
+    
+
+class PaintballProfileSample(models.Model):
+
+    _name = 'paintball.profile.sample'
+    _description = 'Paintball Profiling Sample'
+    _order = 'date desc, id desc'
+    _log_access = False
+
+    slot = fields.Integer('Slot', readonly=True)
+    name = fields.Char('Method', readonly=True, index=True)
+    res_model = fields.Char('Model', readonly=True)
+    date = fields.Datetime('Date', readonly=True)
+    user_id = fields.Many2one('res.users', 'User', readonly=True)
+    duration = fields.Float('Duration (ms)', readonly=True)
+    query_count = fields.Integer('Queries', readonly=True)
+    query_time = fields.Float('Query Time (ms)', readonly=True)
+    records = fields.Integer('Records', readonly=True)
+
+    _sql_constraints = [
+        ('slot_uniq', 'unique(slot)', 'A slot holds a single sample.'),
+    ]
+
+    def init(self):
+        self._cr.execute("""
+            CREATE SEQUENCE IF NOT EXISTS paintball_profile_sample_slot_seq
+        """)
+
+    @api.model
+    def _get_buffer_size(self):
+        size = self.env['ir.config_parameter'].sudo().get_param(
+            profiling.BUFFER_SIZE_PARAM)
+        try:
+            return max(int(size), 1)
+        except (TypeError, ValueError):
+            return profiling.DEFAULT_BUFFER_SIZE
+
+    @api.model
+    def _record_samples(self, samples):
+        """
+        Write samples in the ring buffer: the slots are taken in turn
+        from a sequence, a sample overwrites the one written buffer_size
+        samples before it, so the table never grows past that size.
+        ---------------------------------------------------------------
+        @param self: The object pointer
+        @param samples: list of (name, res_model, uid, duration,
+                        query_count, query_time, records) tuples
+        """
+        if not samples:
+            return
+        columns = list(zip(*samples))
+        self._cr.execute("""
+            INSERT INTO paintball_profile_sample
+                (slot, name, res_model, user_id, date, duration,
+                 query_count, query_time, records)
+            SELECT nextval('paintball_profile_sample_slot_seq') %% %s,
+                   s.name, s.res_model, s.user_id,
+                   now() AT TIME ZONE 'UTC', s.duration, s.query_count,
+                   s.query_time, s.records
+              FROM unnest(%s::varchar[], %s::varchar[], %s::int[],
+                          %s::float8[], %s::int[], %s::float8[],
+                          %s::int[])
+                   AS s(name, res_model, user_id, duration, query_count,
+                        query_time, records)
+                ON CONFLICT (slot) DO UPDATE
+               SET name = EXCLUDED.name,
+                   res_model = EXCLUDED.res_model,
+                   user_id = EXCLUDED.user_id,
+                   date = EXCLUDED.date,
+                   duration = EXCLUDED.duration,
+                   query_count = EXCLUDED.query_count,
+                   query_time = EXCLUDED.query_time,
+                   records = EXCLUDED.records
+        """, [self._get_buffer_size()] + [list(column) for column in columns])
+
+
+class PaintballProfileStats(models.Model):
+
+    _name = 'paintball.profile.stats'
+    _description = 'Paintball Profiling Statistics'
+    _auto = False
+    _order = 'p95_duration desc'
+
+    name = fields.Char('Method', readonly=True)
+    calls = fields.Integer('Calls', readonly=True)
+    avg_duration = fields.Float('Average (ms)', readonly=True)
+    p50_duration = fields.Float('Median (ms)', readonly=True)
+    p95_duration = fields.Float('95th Percentile (ms)', readonly=True)
+    p99_duration = fields.Float('99th Percentile (ms)', readonly=True)
+    max_duration = fields.Float('Max (ms)', readonly=True)
+    avg_query_count = fields.Float('Average Queries', readonly=True)
+    p95_query_count = fields.Float('95th Percentile Queries', readonly=True)
+    avg_query_time = fields.Float('Average Query Time (ms)', readonly=True)
+    avg_records = fields.Float('Average Records', readonly=True)
+    last_date = fields.Datetime('Last Call', readonly=True)
+
+    def init(self):
+        tools.drop_view_if_exists(self._cr, self._table)
+        self._cr.execute("""
+            CREATE VIEW %s AS (
+                SELECT min(id) AS id,
+                       name,
+                       count(*) AS calls,
+                       avg(duration) AS avg_duration,
+                       percentile_cont(0.5) WITHIN GROUP (ORDER BY duration)
+                           AS p50_duration,
+                       percentile_cont(0.95) WITHIN GROUP (ORDER BY duration)
+                           AS p95_duration,
+                       percentile_cont(0.99) WITHIN GROUP (ORDER BY duration)
+                           AS p99_duration,
+                       max(duration) AS max_duration,
+                       avg(query_count) AS avg_query_count,
+                       percentile_cont(0.95)
+                           WITHIN GROUP (ORDER BY query_count)
+                           AS p95_query_count,
+                       avg(query_time) AS avg_query_time,
+                       avg(records) AS avg_records,
+                       max(date) AS last_date
+                  FROM paintball_profile_sample
+              GROUP BY name
+            )
+        """ % self._table)
@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+
+from . import test_intervals
+from . import test_duration
@@ -0,0 +1,62 @@
+# See LICENSE file for full copyright and licensing details.
+
+from datetime import datetime, timedelta
+
+from odoo.tests.common import TransactionCase
+
+
+class TestDuration(TransactionCase):
+    """
+    Billable units of paintball.duration at the boundaries of its rules.
+    """
+
+    def setUp(self):
+        super(TestDuration, self).setUp()
+        self.company = self.env.company
+        self.company.write({'additional_hours': 2, 'duration_unit': 'day'})
+        self.checkin = datetime(2021, 6, 12, 9)
+
+    def _duration(self, **delta):
+        return self.env['paintball.duration']._compute_duration(
+            self.checkin, self.checkin + timedelta(**delta), self.company)
+
+    def test_whole_days(self):
+        self.assertEqual(self._duration(days=1), 1.0)
+        self.assertEqual(self._duration(days=3), 3.0)
+
+    def test_extra_time_within_additional_hours(self):
+        """ The last day started within the additional hours is free. """
+        self.assertEqual(self._duration(days=2, hours=1), 2.0)
+        self.assertEqual(self._duration(days=2, hours=2), 2.0)
+
+    def test_extra_time_over_additional_hours(self):
+        self.assertEqual(self._duration(days=2, hours=2, seconds=1), 3.0)
+        self.assertEqual(self._duration(days=2, hours=20), 3.0)
+
+    def test_without_additional_hours(self):
+        self.company.write({'additional_hours': 0})
+        self.assertEqual(self._duration(days=2), 2.0)
+        self.assertEqual(self._duration(days=2, seconds=1), 3.0)
+
+    def test_minimum_one_day(self):
+        self.assertEqual(self._duration(hours=1), 1.0)
+        self.assertEqual(self._duration(hours=5), 1.0)
+        self.assertEqual(self._duration(), 1.0)
+
+    def test_hour_unit(self):
+        """ Started hours are billed, the additional hours do not apply. """
+        self.company.write({'duration_unit': 'hour'})
+        self.assertEqual(self._duration(hours=3), 3.0)
+        self.assertEqual(self._duration(hours=3, seconds=1), 4.0)
+        self.assertEqual(self._duration(days=1, hours=2), 26.0)
+        self.assertEqual(self._duration(minutes=30), 1.0)
+
+    def test_batch(self):
+        durations = self.env['paintball.duration']._compute_durations([
+            (self.checkin, self.checkin + timedelta(days=2, hours=2),
+             self.company),
+            (self.checkin, self.checkin + timedelta(days=2, hours=3),
+             self.company.id),
+            (self.checkin, False, self.company),
+        ])
+        self.assertEqual(durations, [2.0, 3.0, 0.0])
@@ -0,0 +1,136 @@
+# See LICENSE file for full copyright and licensing details.
+
+from datetime import date, datetime
+
+from odoo.tests.common import BaseCase
+from odoo.addons.paintball.tools import intervals
+
+
+class TestIntervals(BaseCase):
+
+    def test_intersection(self):
+        a = (datetime(2021, 1, 5, 10), datetime(2021, 1, 7, 12))
+        b = (datetime(2021, 1, 6, 8), datetime(2021, 1, 9, 8))
+        self.assertEqual(intervals.intersection(a, b),
+                         (datetime(2021, 1, 6, 8), datetime(2021, 1, 7, 12)))
+        self.assertEqual(intervals.intersection(b, a),
+                         intervals.intersection(a, b))
+
+    def test_intersection_disjoint(self):
+        a = (datetime(2021, 1, 5, 10), datetime(2021, 1, 5, 12))
+        b = (datetime(2021, 1, 5, 12, 0, 1), datetime(2021, 1, 5, 14))
+        self.assertIsNone(intervals.intersection(a, b))
+
+    def test_intersection_touching(self):
+        """ Closed intervals sharing an instant overlap on that instant. """
+        a = (datetime(2021, 1, 5, 10), datetime(2021, 1, 5, 12))
+        b = (datetime(2021, 1, 5, 12), datetime(2021, 1, 5, 14))
+        self.assertEqual(intervals.intersection(a, b),
+                         (datetime(2021, 1, 5, 12), datetime(2021, 1, 5, 12)))
+
+    def test_intersection_contained(self):
+        season = (datetime(2021, 3, 1), datetime(2021, 10, 31, 23, 59, 59))
+        match = (datetime(2021, 6, 12, 9), datetime(2021, 6, 12, 18))
+        self.assertEqual(intervals.intersection(season, match), match)
+
+    def test_merge(self):
+        merged = intervals.merge([
+            (datetime(2021, 1, 8), datetime(2021, 1, 9)),
+            (datetime(2021, 1, 1), datetime(2021, 1, 3)),
+            (datetime(2021, 1, 2), datetime(2021, 1, 4)),
+            (datetime(2021, 1, 4), datetime(2021, 1, 5)),
+        ])
+        self.assertEqual(merged, [
+            (datetime(2021, 1, 1), datetime(2021, 1, 5)),
+            (datetime(2021, 1, 8), datetime(2021, 1, 9)),
+        ])
+
+    def test_intersections(self):
+        bookings = [(datetime(2021, 1, 1, 10), datetime(2021, 1, 1, 12)),
+                    (datetime(2021, 1, 1, 14), datetime(2021, 1, 1, 16)),
+                    (datetime(2021, 1, 2, 10), datetime(2021, 1, 2, 12))]
+        request = [(datetime(2021, 1, 1, 11), datetime(2021, 1, 1, 15))]
+        self.assertEqual(intervals.intersections(bookings, request), [
+            (datetime(2021, 1, 1, 11), datetime(2021, 1, 1, 12)),
+            (datetime(2021, 1, 1, 14), datetime(2021, 1, 1, 15)),
+        ])
+        self.assertEqual(intervals.intersections(request, []), [])
+
+    def test_overlap_days(self):
+        a = [(datetime(2021, 1, 5, 10), datetime(2021, 1, 10, 12))]
+        b = [(datetime(2021, 1, 7, 8), datetime(2021, 1, 20, 8))]
+        self.assertEqual(intervals.overlap_ranges(a, b),
+                         [(date(2021, 1, 7), date(2021, 1, 10))])
+
+    def test_overlap_days_same_day_no_overlap(self):
+        """ Two bookings of the same day that do not overlap in time
+        have no overlap day. """
+        a = [(datetime(2021, 1, 5, 8), datetime(2021, 1, 5, 10))]
+        b = [(datetime(2021, 1, 5, 15), datetime(2021, 1, 5, 18))]
+        self.assertEqual(intervals.overlap_ranges(a, b), [])
+
+    def test_overlap_days_consecutive_merged(self):
+        a = [(datetime(2021, 1, 5, 8), datetime(2021, 1, 5, 23)),
+             (datetime(2021, 1, 6, 1), datetime(2021, 1, 6, 3)),
+             (datetime(2021, 1, 9, 1), datetime(2021, 1, 9, 3))]
+        b = [(datetime(2021, 1, 1), datetime(2021, 1, 31))]
+        self.assertEqual(intervals.overlap_ranges(a, b), [
+            (date(2021, 1, 5), date(2021, 1, 6)),
+            (date(2021, 1, 9), date(2021, 1, 9)),
+        ])
+
+    def test_overlap_days_timezone(self):
+        """ An overlap late in the UTC evening is on the next day in a
+        timezone ahead of UTC and on the same day behind it. """
+        a = [(datetime(2021, 1, 5, 20), datetime(2021, 1, 5, 23))]
+        b = [(datetime(2021, 1, 5, 22), datetime(2021, 1, 6, 2))]
+        self.assertEqual(intervals.overlap_ranges(a, b),
+                         [(date(2021, 1, 5), date(2021, 1, 5))])
+        self.assertEqual(intervals.overlap_ranges(a, b, tz='Asia/Tokyo'),
+                         [(date(2021, 1, 6), date(2021, 1, 6))])
+        self.assertEqual(
+            intervals.overlap_ranges(a, b, tz='America/Mexico_City'),
+            [(date(2021, 1, 5), date(2021, 1, 5))])
+
+    def test_overlap_days_timezone_dst(self):
+        """ Days are counted on local midnights across a DST change. """
+        # Europe/Paris switches to summer time on 2021-03-28 at 01:00 UTC.
+        a = [(datetime(2021, 3, 27, 22, 30), datetime(2021, 3, 28, 22, 30))]
+        b = [(datetime(2021, 3, 1), datetime(2021, 3, 31))]
+        self.assertEqual(intervals.overlap_ranges(a, b, tz='Europe/Paris'),
+                         [(date(2021, 3, 27), date(2021, 3, 29))])
+
+    def test_overlap_hours(self):
+        a = [(datetime(2021, 1, 5, 10, 30), datetime(2021, 1, 5, 14))]
+        b = [(datetime(2021, 1, 5, 12, 15), datetime(2021, 1, 5, 18))]
+        ranges = intervals.overlap_ranges(a, b, intervals.HOUR)
+        self.assertEqual(ranges, [(datetime(2021, 1, 5, 12),
+                                   datetime(2021, 1, 5, 14))])
+        self.assertEqual(intervals.format_ranges(ranges, intervals.HOUR),
+                         ['05/01/2021 12:00 - 05/01/2021 15:00'])
+
+    def test_overlap_hours_touching(self):
+        a = [(datetime(2021, 1, 5, 10), datetime(2021, 1, 5, 12))]
+        b = [(datetime(2021, 1, 5, 12), datetime(2021, 1, 5, 14))]
+        self.assertEqual(intervals.overlap_ranges(a, b, intervals.HOUR),
+                         [(datetime(2021, 1, 5, 12),
+                           datetime(2021, 1, 5, 12))])
+
+    def test_long_rental(self):
+        """ A season lease is compared without enumerating its days. """
+        season = [(datetime(2021, 3, 1), datetime(2021, 10, 31, 23))]
+        booking = [(datetime(2021, 7, 3, 9), datetime(2021, 7, 4, 18))]
+        ranges = intervals.overlap_ranges(season, booking)
+        self.assertEqual(ranges, [(date(2021, 7, 3), date(2021, 7, 4))])
+        self.assertEqual(intervals.format_ranges(ranges),
+                         ['03/07/2021 - 04/07/2021'])
+
+    def test_format_single_day(self):
+        self.assertEqual(
+            intervals.format_ranges([(date(2021, 7, 3), date(2021, 7, 3))]),
+            ['03/07/2021'])
+
+    def test_unknown_granularity(self):
+        with self.assertRaises(ValueError):
+            intervals.to_units((datetime(2021, 1, 1), datetime(2021, 1, 2)),
+                               'week')
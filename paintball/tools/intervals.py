@@ -0,0 +1,136 @@
+# See LICENSE file for full copyright and licensing details.
+"""
+Arithmetic on closed datetime intervals.
+
+Booking periods are stored as naive UTC datetimes and are closed on both
+ends, like the ``tsrange(check_in, check_out, '[]')`` ranges used in SQL:
+two periods touching on the same instant overlap on that instant.
+Overlaps are computed on the intervals themselves and only converted to
+days or hours, in a given timezone, to be reported.
+"""
+
+from datetime import timedelta
+
+import pytz
+
+DAY = 'day'
+HOUR = 'hour'
+
+
+def intersection(interval1, interval2):
+    """
+    Return the overlap of two closed intervals.
+    @param interval1: (start, end) tuple
+    @param interval2: (start, end) tuple
+    @return: (start, end) tuple, or None when they do not overlap
+    """
+    start = max(interval1[0], interval2[0])
+    end = min(interval1[1], interval2[1])
+    if start > end:
+        return None
+    return (start, end)
+
+
+def merge(intervals, gap=None):
+    """
+    Merge overlapping closed intervals.
+    @param intervals: iterable of (start, end) tuples
+    @param gap: also merge intervals separated by at most this gap
+    @return: sorted list of disjoint (start, end) tuples
+    """
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= (merged[-1][1] + gap if gap else
+                                merged[-1][1]):
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def intersections(intervals1, intervals2):
+    """
+    Return the overlaps between two sets of closed intervals.
+    @param intervals1: iterable of (start, end) tuples
+    @param intervals2: iterable of (start, end) tuples
+    @return: sorted list of disjoint (start, end) tuples
+    """
+    intervals1 = merge(intervals1)
+    intervals2 = merge(intervals2)
+    result = []
+    i = j = 0
+    while i < len(intervals1) and j < len(intervals2):
+        overlap = intersection(intervals1[i], intervals2[j])
+        if overlap:
+            result.append(overlap)
+        if intervals1[i][1] < intervals2[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+def to_local(value, tz=None):
+    """
+    Convert a naive UTC datetime to a naive datetime in the timezone.
+    @param value: naive UTC datetime
+    @param tz: timezone name or tzinfo, UTC by default
+    """
+    if not tz:
+        return value
+    if not isinstance(tz, pytz.BaseTzInfo):
+        tz = pytz.timezone(tz)
+    return pytz.utc.localize(value).astimezone(tz).replace(tzinfo=None)
+
+
+def to_units(interval, granularity=DAY, tz=None):
+    """
+    Return the first and last day, or hour, covered by an interval.
+    @param interval: (start, end) tuple of naive UTC datetimes
+    @param granularity: DAY or HOUR
+    @param tz: timezone in which days and hours are counted
+    @return: (first, last) tuple of dates for DAY, of naive local
+             datetimes truncated to the hour for HOUR
+    """
+    start = to_local(interval[0], tz)
+    end = to_local(interval[1], tz)
+    if granularity == DAY:
+        return (start.date(), end.date())
+    if granularity == HOUR:
+        return (start.replace(minute=0, second=0, microsecond=0),
+                end.replace(minute=0, second=0, microsecond=0))
+    raise ValueError("Unknown granularity %r" % (granularity,))
+
+
+def overlap_ranges(intervals1, intervals2, granularity=DAY, tz=None):
+    """
+    Return the days, or hours, on which two sets of intervals overlap,
+    as ranges of consecutive units.
+    @param intervals1: iterable of (start, end) tuples (naive UTC)
+    @param intervals2: iterable of (start, end) tuples (naive UTC)
+    @param granularity: DAY or HOUR
+    @param tz: timezone in which days and hours are counted
+    @return: sorted list of (first, last) tuples, see to_units()
+    """
+    step = timedelta(days=1) if granularity == DAY else timedelta(hours=1)
+    return merge([to_units(overlap, granularity, tz) for overlap in
+                  intersections(intervals1, intervals2)], gap=step)
+
+
+def format_ranges(ranges, granularity=DAY):
+    """
+    Format ranges returned by overlap_ranges() for messages.
+    @return: list of strings such as '05/01/2021' or
+             '05/01/2021 - 07/01/2021'
+    """
+    if granularity == HOUR:
+        return ['%s - %s' % (first.strftime('%d/%m/%Y %H:%M'),
+                             (last + timedelta(hours=1)).strftime(
+                                 '%d/%m/%Y %H:%M'))
+                for first, last in ranges]
+    return [first.strftime('%d/%m/%Y') if first == last else
+            '%s - %s' % (first.strftime('%d/%m/%Y'),
+                         last.strftime('%d/%m/%Y'))
+            for first, last in ranges]
+
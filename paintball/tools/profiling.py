@@ -0,0 +1,85 @@
+# See LICENSE file for full copyright and licensing details.
+"""
+Opt-in profiling of the entry points of the paintball modules.
+
+Methods decorated with ``profiled`` record one paintball.profile.sample
+per call, with its wall time, the number and the time of its SQL queries
+and the number of records it handled, when the ``paintball.profiling``
+system parameter is set. Calls made within a profiled call are recorded
+too, their figures are included in the ones of the outer call. The
+samples of a call tree are written when the outermost call returns.
+"""
+
+import functools
+import threading
+import time
+
+PARAM = 'paintball.profiling'
+BUFFER_SIZE_PARAM = 'paintball.profiling.buffer_size'
+DEFAULT_BUFFER_SIZE = 10000
+
+_local = threading.local()
+
+
+def is_enabled(env):
+    """ ir.config_parameter values are cached, this costs no query. """
+    value = env['ir.config_parameter'].sudo().get_param(PARAM)
+    return bool(value) and value not in ('0', 'False', 'false')
+
+
+def _query_counters(cr):
+    """
+    Return the (count, seconds) of the queries run so far. The count is
+    the one of the cursor, kept by every cursor whatever the thread (HTTP
+    worker, cron, shell). The time is the one of the current thread,
+    which the cursors keep up to date once the thread has the counter:
+    it is added to the threads that miss it, such as the cron threads.
+    """
+    thread = threading.current_thread()
+    if not hasattr(thread, 'query_count'):
+        thread.query_count = 0
+        thread.query_time = 0
+    return cr.sql_log_count, thread.query_time
+
+
+def _count_records(records, result):
+    count = len(records)
+    if hasattr(result, '_name') and hasattr(result, '_ids'):
+        count = max(count, len(result))
+    return count
+
+
+def profiled(method):
+    """
+    Record a sample per call of a model method, see module docstring.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not is_enabled(self.env):
+            return method(self, *args, **kwargs)
+        stack = getattr(_local, 'samples', None)
+        outermost = stack is None
+        if outermost:
+            stack = _local.samples = []
+        cr = self.env.cr
+        queries, query_time = _query_counters(cr)
+        start = time.time()
+        try:
+            result = method(self, *args, **kwargs)
+            end_queries, end_query_time = _query_counters(cr)
+            stack.append((
+                '%s.%s' % (self._name, method.__name__),
+                self._name,
+                self.env.uid,
+                (time.time() - start) * 1000.0,
+                end_queries - queries,
+                (end_query_time - query_time) * 1000.0,
+                _count_records(self, result),
+            ))
+        finally:
+            if outermost:
+                _local.samples = None
+        if outermost:
+            self.env['paintball.profile.sample']._record_samples(stack)
+        return result
+    return wrapper
@@ -2,4 +2,5 @@
 
 from . import models
 from . import wizards
-from . import report
\ No newline at end of file
+from . import report
+from . import controllers
\ No newline at end of file
@@ -21,7 +21,7 @@
         'report/report_view.xml',
         #'data/paintball_reservation_data.xml',
         'views/assets.xml',
-        #'wizards/paintball_reservation_wizard.xml',
+        'wizards/paintball_reservation_wizard.xml',
         
     ],
     'qweb': [
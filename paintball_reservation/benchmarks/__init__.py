@@ -0,0 +1 @@
+# See LICENSE file for full copyright and licensing details.
@@ -0,0 +1,129 @@
+# See LICENSE file for full copyright and licensing details.
+"""
+Seeded generator of synthetic paintball data.
+
+The same seed and sizes always produce the same areas, zone categories,
+zones, partners and reservations, so that the timings of two releases
+are measured on the same dataset. Reservations never overlap on a zone:
+each zone is booked by walking its calendar from the start of the period
+with random gaps and durations.
+
+Used by run.py, or from an ``odoo shell``::
+
+    from odoo.addons.paintball_reservation.benchmarks import generate
+    generate.generate(env, zones=200, years=2, seed=42)
+"""
+
+import random
+from datetime import datetime, timedelta
+
+BATCH_SIZE = 500
+
+
+def _batched(items, size=BATCH_SIZE):
+    for index in range(0, len(items), size):
+        yield items[index:index + size]
+
+
+def _create(model, vals_list):
+    records = model.browse()
+    for batch in _batched(vals_list):
+        records |= model.create(batch)
+    return records
+
+
+def generate(env, zones=100, areas=5, categories=4, partners=500, years=1,
+             reservations_per_zone_year=40, confirm_ratio=0.7,
+             folio_ratio=0.5, seed=42, start=None):
+    """
+    Create a synthetic dataset.
+    @param env: odoo environment, the data is created in its transaction
+    @param zones: number of zones
+    @param areas: number of areas the zones are spread over
+    @param categories: number of zone categories
+    @param partners: number of guests
+    @param years: length of the booked period, starting one year ago by
+                  default so that past, current and future bookings exist
+    @param reservations_per_zone_year: bookings of each zone per year
+    @param confirm_ratio: share of the reservations confirmed
+    @param folio_ratio: share of the confirmed reservations with a folio
+    @param seed: seed of the random generator
+    @param start: start of the booked period
+    @return: dictionary of the created record sets
+    """
+    rnd = random.Random(seed)
+    start = start or datetime.now().replace(
+        minute=0, second=0, microsecond=0) - timedelta(days=365)
+    end = start + timedelta(days=365 * years)
+
+    area_recs = _create(env['paintball.area'], [
+        {'name': 'Bench Area %d' % index, 'sequence': index}
+        for index in range(areas)])
+    categ_recs = _create(env['paintball.zone.type'], [
+        {'name': 'Bench Category %d' % index}
+        for index in range(categories)])
+    zone_recs = _create(env['paintball.zone'], [{
+        'name': 'Bench Zone %05d' % index,
+        'area_id': area_recs[index % areas].id,
+        'categ_id': categ_recs[index % categories].id,
+        'capacity': rnd.randint(10, 40),
+        'capacity_min': 1,
+        'list_price': rnd.choice([50.0, 80.0, 120.0, 200.0]),
+        'iszone': True,
+    } for index in range(zones)])
+    partner_recs = _create(env['res.partner'], [
+        {'name': 'Bench Guest %06d' % index,
+         'email': 'guest%06d@example.com' % index}
+        for index in range(partners)])
+
+    warehouse = env['stock.warehouse'].search([], limit=1)
+    pricelist = env['product.pricelist'].search([], limit=1)
+    average_gap = timedelta(days=365) / max(reservations_per_zone_year, 1)
+    reservation_vals = []
+    for zone in zone_recs:
+        current = start
+        while True:
+            current += timedelta(hours=rnd.randint(
+                1, max(int(average_gap.total_seconds() // 1800), 2)))
+            checkin = current
+            checkout = checkin + timedelta(hours=rnd.choice(
+                [2, 3, 4, 6, 8, 24, 48]))
+            if checkout >= end:
+                break
+            partner = partner_recs[rnd.randrange(len(partner_recs))]
+            reservation_vals.append({
+                'partner_id': partner.id,
+                'partner_invoice_id': partner.id,
+                'partner_order_id': partner.id,
+                'partner_shipping_id': partner.id,
+                'pricelist_id': pricelist.id,
+                'warehouse_id': warehouse.id,
+                'date_order': checkin - timedelta(days=rnd.randint(1, 60)),
+                'checkin': checkin,
+                'checkout': checkout,
+                'adults': rnd.randint(1, zone.capacity),
+                'reservation_line': [(0, 0, {
+                    'categ_id': zone.categ_id.id,
+                    'reserve': [(6, 0, [zone.id])],
+                })],
+            })
+            current = checkout
+    rnd.shuffle(reservation_vals)
+    reservation_recs = _create(env['paintball.reservation'],
+                               reservation_vals)
+
+    confirmed = reservation_recs[:int(len(reservation_recs) * confirm_ratio)]
+    for batch in _batched(confirmed):
+        batch.confirmed_reservation()
+    with_folio = confirmed[:int(len(confirmed) * folio_ratio)]
+    for batch in _batched(with_folio):
+        batch.create_folio()
+    env['base'].flush()
+    return {
+        'areas': area_recs,
+        'categories': categ_recs,
+        'zones': zone_recs,
+        'partners': partner_recs,
+        'reservations': reservation_recs,
+        'period': (start, end),
+    }
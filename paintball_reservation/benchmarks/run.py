@@ -0,0 +1,237 @@
+# See LICENSE file for full copyright and licensing details.
+"""
+Benchmark of the booking hot paths.
+
+Generates a seeded dataset in a database where paintball_reservation is
+installed, times each hot path on it and writes a JSON report with the
+wall time, the number of SQL queries and the peak Python memory of every
+run. Everything is rolled back at the end, the database is left as it
+was. Run with the Python environment of the Odoo server::
+
+    python paintball_reservation/benchmarks/run.py -d bench_db \\
+        --zones 200 --years 2 --output bench-13.0.1.json \\
+        -- -c /etc/odoo.conf
+
+Arguments after ``--`` are passed to the Odoo configuration parser, whose
+addons path must contain this module. Two reports are compared with::
+
+    python paintball_reservation/benchmarks/run.py --compare \\
+        before.json after.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+PATHS = []
+
+
+def hot_path(func):
+    """ Register a benchmarked path, see run_path(). """
+    PATHS.append(func)
+    return func
+
+
+@hot_path
+def on_change_checkout(env, data, rnd):
+    reservation = env['paintball.reservation'].new({
+        'checkin': data['period'][0] + timedelta(days=rnd.randint(0, 300)),
+        'checkout': data['period'][0] + timedelta(days=rnd.randint(301, 360)),
+    })
+    reservation.on_change_checkout()
+
+
+@hot_path
+def on_change_categ(env, data, rnd):
+    checkin = data['period'][0] + timedelta(days=rnd.randint(0, 360))
+    reservation = env['paintball.reservation'].new({
+        'checkin': checkin,
+        'checkout': checkin + timedelta(hours=4),
+        'warehouse_id': env['stock.warehouse'].search([], limit=1).id,
+    })
+    line = env['paintball_reservation.line'].new({
+        'line_id': reservation,
+        'categ_id': data['categories'][rnd.randrange(
+            len(data['categories']))].id,
+    })
+    line.on_change_categ()
+
+
+@hot_path
+def confirmed_reservation(env, data, rnd):
+    drafts = data['reservations'].filtered(lambda r: r.state == 'draft')
+    drafts[:50].confirmed_reservation()
+
+
+@hot_path
+def create_folio(env, data, rnd):
+    confirmed = data['reservations'].filtered(
+        lambda r: r.state == 'confirm' and not r.folio_id)
+    confirmed[:50].create_folio()
+
+
+@hot_path
+def get_zone_summary(env, data, rnd):
+    date_from = data['period'][0] + timedelta(days=rnd.randint(0, 300))
+    summary = env['zone.reservation.summary'].new({
+        'date_from': date_from,
+        'date_to': date_from + timedelta(days=30),
+    })
+    summary.get_zone_summary()
+
+
+@hot_path
+def cron_zone_line(env, data, rnd):
+    env['paintball.zone']._plan_zone_boundaries()
+    env['paintball.zone'].cron_zone_line()
+
+
+def run_path(env, func, data, repeat, seed):
+    """
+    Run a hot path repeat times, flushing and invalidating the cache
+    before each run so that every run starts cold.
+    @return: dictionary of the measures of every run
+    """
+    rnd = random.Random(seed)
+    runs = []
+    for __ in range(repeat):
+        env['base'].flush()
+        env.cache.invalidate()
+        queries = env.cr.sql_log_count
+        tracemalloc.start()
+        start = time.perf_counter()
+        func(env, data, rnd)
+        env['base'].flush()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        runs.append({
+            'seconds': round(elapsed, 6),
+            'queries': env.cr.sql_log_count - queries,
+            'peak_memory_kb': round(peak / 1024.0, 1),
+        })
+    seconds = [r['seconds'] for r in runs]
+    return {
+        'runs': runs,
+        'median_seconds': round(statistics.median(seconds), 6),
+        'min_seconds': min(seconds),
+        'max_queries': max(r['queries'] for r in runs),
+        'max_peak_memory_kb': max(r['peak_memory_kb'] for r in runs),
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark(args, odoo_args):
+    import odoo
+    from odoo import api, SUPERUSER_ID
+
+    odoo.tools.config.parse_config(['-d', args.database] + odoo_args)
+    # Importable once the addons path is known.
+    from odoo.addons.paintball_reservation.benchmarks import generate
+    registry = odoo.registry(args.database)
+    sizes = {
+        'zones': args.zones,
+        'areas': args.areas,
+        'categories': args.categories,
+        'partners': args.partners,
+        'years': args.years,
+        'reservations_per_zone_year': args.reservations_per_zone_year,
+        'seed': args.seed,
+    }
+    with api.Environment.manage(), registry.cursor() as cr:
+        env = api.Environment(cr, SUPERUSER_ID, {'tracking_disable': True})
+        try:
+            start = time.perf_counter()
+            data = generate.generate(env, **sizes)
+            generated = time.perf_counter() - start
+            results = {}
+            for func in PATHS:
+                if args.paths and func.__name__ not in args.paths:
+                    continue
+                results[func.__name__] = run_path(env, func, data,
+                                                  args.repeat, args.seed)
+        finally:
+            cr.rollback()
+    return {
+        'meta': {
+            'date': datetime.utcnow().isoformat(),
+            'revision': _git_revision(),
+            'odoo': odoo.release.version,
+            'python': platform.python_version(),
+            'database': args.database,
+            'dataset': dict(sizes, reservations=len(data['reservations'])),
+            'generate_seconds': round(generated, 3),
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+
+
+def compare(before_path, after_path):
+    """ Print the change of every measure between two reports. """
+    with open(before_path) as before_file, open(after_path) as after_file:
+        before = json.load(before_file)['results']
+        after = json.load(after_file)['results']
+    line = '%-24s %14s %14s %14s'
+    print(line % ('path', 'seconds', 'queries', 'memory (kB)'))
+    for name in sorted(set(before) & set(after)):
+        cells = []
+        for key in ('median_seconds', 'max_queries', 'max_peak_memory_kb'):
+            old, new = before[name][key], after[name][key]
+            ratio = '%+.0f%%' % ((new - old) * 100.0 / old) if old else 'n/a'
+            cells.append('%s (%s)' % (new, ratio))
+        print(line % tuple([name] + cells))
+
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    odoo_args = []
+    if '--' in argv:
+        index = argv.index('--')
+        argv, odoo_args = argv[:index], argv[index + 1:]
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-d', '--database')
+    parser.add_argument('--zones', type=int, default=100)
+    parser.add_argument('--areas', type=int, default=5)
+    parser.add_argument('--categories', type=int, default=4)
+    parser.add_argument('--partners', type=int, default=500)
+    parser.add_argument('--years', type=int, default=1)
+    parser.add_argument('--reservations-per-zone-year', type=int, default=40)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--paths', nargs='*',
+                        help='only run these hot paths')
+    parser.add_argument('--output', default='-',
+                        help='report file, standard output by default')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'))
+    args = parser.parse_args(argv)
+    if args.compare:
+        compare(*args.compare)
+        return
+    if not args.database:
+        parser.error('the database is required')
+    report = json.dumps(benchmark(args, odoo_args), indent=2)
+    if args.output == '-':
+        print(report)
+    else:
+        with open(args.output, 'w') as output:
+            output.write(report + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+# See LICENSE file for full copyright and licensing details.
+
+from werkzeug.exceptions import NotFound
+
+from odoo import http
+from odoo.http import request, content_disposition
+
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv;charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.'
+            'spreadsheetml.sheet',
+}
+
+
+class PaintballReservationExport(http.Controller):
+
+    @http.route('/paintball_reservation/export/<int:wizard_id>',
+                type='http', auth='user')
+    def export_reservations(self, wizard_id, **kw):
+        """
+        Stream the list exported by a paintball.reservation.wizard, the
+        rows are read and written while the response is sent.
+        """
+        wizard = request.env['paintball.reservation.wizard'].browse(
+            wizard_id).exists()
+        if not wizard or wizard.create_uid != request.env.user:
+            raise NotFound()
+        filename = wizard._get_export_filename()
+        return request.make_response(wizard._stream_export(), headers=[
+            ('Content-Type', EXPORT_CONTENT_TYPES[wizard.export_format]),
+            ('Content-Disposition', content_disposition(filename)),
+        ])
@@ -1,12 +1,24 @@
 # See LICENSE file for full copyright and licensing details.
 
+import json
+import threading
 import time
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
 from odoo import api, fields, models, _
 from odoo.tools import DEFAULT_SERVER_DATETIME_FORMAT as dt
+from odoo.tools.lru import LRU
 from odoo.exceptions import ValidationError, UserError
+from odoo.addons.paintball.tools import intervals, profiling
+from psycopg2 import IntegrityError, errorcodes
 import pytz
+import logging
+_logger = logging.getLogger(__name__)
+
+# Computed summary grids, shared by the requests served by this process.
+# Entries are validated against zone_summary_invalidation before use.
+ZONE_SUMMARY_CACHE = LRU(64)
+ZONE_SUMMARY_CACHE_MAX_AGE = 24 * 60 * 60
 
 
 class PaintballFolio(models.Model):
@@ -19,29 +31,78 @@ class PaintballFolio(models.Model):
 
 
     def write(self, vals):
-        context = dict(self._context)
-        if not context:
-            context = {}
-        context.update({'from_reservation': True})
+        old_dates = {}
+        if {'checkin_date', 'checkout_date'} & set(vals):
+            old_dates = dict((folio.id, (folio.checkin_date,
+                                         folio.checkout_date))
+                             for folio in self)
         res = super(PaintballFolio, self).write(vals)
+        if 'state' in vals:
+            self._invalidate_zone_summary()
+        if old_dates:
+            self._sync_reservation_zone_lines(old_dates)
+        return res
+
+    def _sync_reservation_zone_lines(self, old_dates):
+        """
+        Move the zone reservation lines booked for the whole period of
+        their folio to the new dates of the folio. Lines with a period
+        of their own follow their folio line instead, see
+        PaintballFolioLineExt.write().
+        ---------------------------------------------------------------
+        @param self: The object pointer
+        @param old_dates: dictionary of the (check_in, check_out) of the
+                          folios before their dates were written
+        """
         reservation_line_obj = self.env['paintball.zone.reservation.line']
-        for folio_obj in self:
-            if folio_obj.reservation_id:
-                for reservation in folio_obj.reservation_id:
-                    reservation_obj = (reservation_line_obj.search
-                                       ([('reservation_id', '=',
-                                          reservation.id)]))
-                    if len(reservation_obj) == 1:
-                        for line_id in reservation.reservation_line:
-                            line_id = line_id.reserve
-                            for zone_id in line_id:
-                                vals = {'zone_id': zone_id.id,
-                                        'check_in': folio_obj.checkin_date,
-                                        'check_out': folio_obj.checkout_date,
-                                        'state': 'assigned',
-                                        'reservation_id': reservation.id,
-                                        }
-                                reservation_obj.write(vals)
+        folios = self.filtered(
+            lambda folio: folio.reservation_id and
+            old_dates.get(folio.id) != (folio.checkin_date,
+                                        folio.checkout_date))
+        if not folios:
+            return
+        folio_by_reservation = dict((folio.reservation_id.id, folio)
+                                    for folio in folios)
+        to_write = {}
+        for zone_line in reservation_line_obj.search([
+                ('reservation_id', 'in', list(folio_by_reservation))]):
+            folio = folio_by_reservation[zone_line.reservation_id.id]
+            if (zone_line.check_in, zone_line.check_out) != \
+                    old_dates[folio.id]:
+                continue
+            key = (zone_line.zone_id.id, folio.checkin_date,
+                   folio.checkout_date)
+            to_write.setdefault(key, reservation_line_obj)
+            to_write[key] |= zone_line
+        reservation_line_obj._write_periods(to_write)
+
+    def _get_zone_line_folios(self):
+        """
+        The zones of folios created from a reservation are booked by its
+        paintball.zone.reservation.line records.
+        """
+        folios = super(PaintballFolio, self)._get_zone_line_folios()
+        return folios.filtered(lambda folio: not folio.reservation_id)
+
+    def _invalidate_zone_summary(self):
+        """
+        The folio state decides whether its zone lines are shown in the
+        reservation summary.
+        """
+        zone_lines = self.env['folio.zone.line'].search([('folio_id', 'in',
+                                                          self.ids)])
+        zone_lines._notify_zone_changes(zone_lines._get_zone_changes())
+        self.env['paintball.zone.occupancy']._mark_folio_lines_dirty(
+            self.mapped('zone_lines'))
+
+    def action_confirm(self):
+        res = super(PaintballFolio, self).action_confirm()
+        self._invalidate_zone_summary()
+        return res
+
+    def action_cancel(self):
+        res = super(PaintballFolio, self).action_cancel()
+        self._invalidate_zone_summary()
         return res
 
 
@@ -49,30 +110,19 @@ class PaintballFolioLineExt(models.Model):
 
     _inherit = 'paintball.folio.line'
 
-    @api.onchange('checkin_date', 'checkout_date')
-    def on_change_checkout(self):
-        res = super(PaintballFolioLineExt, self).on_change_checkout()
-        paintball_zone_obj = self.env['paintball.zone']
-        avail_prod_ids = []
-        paintball_zone_ids = paintball_zone_obj.search([])
-        for zone in paintball_zone_ids:
-            assigned = False
-            for line in zone.zone_reservation_line_ids:
-                if line.status != 'cancel':
-                    if(self.checkin_date <= line.check_in <=
-                        self.checkout_date) or (self.checkin_date <=
-                                                line.check_out <=
-                                                self.checkout_date):
-                        assigned = True
-                    elif(line.check_in <= self.checkin_date <=
-                         line.check_out) or (line.check_in <=
-                                             self.checkout_date <=
-                                             line.check_out):
-                        assigned = True
-            if not assigned:
-                avail_prod_ids.append(zone.product_id.id)
-        return res
+    _occupancy_fields = {'product_id', 'checkin_date', 'checkout_date',
+                         'price_unit', 'product_uom_qty', 'discount',
+                         'tax_id'}
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super(PaintballFolioLineExt, self).create(vals_list)
+        self.env['paintball.zone.occupancy']._mark_folio_lines_dirty(lines)
+        return lines
 
+    def unlink(self):
+        self.env['paintball.zone.occupancy']._mark_folio_lines_dirty(self)
+        return super(PaintballFolioLineExt, self).unlink()
 
     def write(self, vals):
         """
@@ -80,31 +130,52 @@ class PaintballFolioLineExt(models.Model):
         @param self: The object pointer
         @param vals: dictionary of fields value.
         Update Paintball Zone Reservation line history"""
+        occupancy_obj = self.env['paintball.zone.occupancy']
+        if not {'product_id', 'checkin_date', 'checkout_date'} & set(vals):
+            # Same zones and days, queue them once.
+            res = super(PaintballFolioLineExt, self).write(vals)
+            if self._occupancy_fields & set(vals):
+                occupancy_obj._mark_folio_lines_dirty(self)
+            return res
+        # The lines leave their zones and days, queue the old ones too.
+        occupancy_obj._mark_folio_lines_dirty(self)
         reservation_line_obj = self.env['paintball.zone.reservation.line']
         zone_obj = self.env['paintball.zone']
-        prod_id = vals.get('product_id') or self.product_id.id
-        chkin = vals.get('checkin_date') or self.checkin_date
-        chkout = vals.get('checkout_date') or self.checkout_date
-        is_reserved = self.is_reserved
-        if prod_id and is_reserved:
-            prod_domain = [('product_id', '=', prod_id)]
-            prod_zone = zone_obj.search(prod_domain, limit=1)
-            if (self.product_id and self.checkin_date and self.checkout_date):
-                old_prd_domain = [('product_id', '=', self.product_id.id)]
-                old_prod_zone = zone_obj.search(old_prd_domain, limit=1)
-                if prod_zone and old_prod_zone:
-                    # Check for existing zone lines.
-                    srch_rmline = [('zone_id', '=', old_prod_zone.id),
-                                   ('check_in', '=', self.checkin_date),
-                                   ('check_out', '=', self.checkout_date),
-                                   ]
-                    rm_lines = reservation_line_obj.search(srch_rmline)
-                    if rm_lines:
-                        rm_line_vals = {'zone_id': prod_zone.id,
-                                        'check_in': chkin,
-                                        'check_out': chkout}
-                        rm_lines.write(rm_line_vals)
-        return super(PaintballFolioLineExt, self).write(vals)
+        lines = self.filtered(lambda line: line.is_reserved and
+                              line.product_id and line.checkin_date and
+                              line.checkout_date)
+        products = lines.mapped('product_id')
+        if vals.get('product_id'):
+            products |= self.env['product.product'].browse(vals['product_id'])
+        zone_by_product = zone_obj._get_zones_by_product(products)
+        # zone reservation line period -> new zone and period
+        moves = {}
+        for line in lines:
+            prod_zone = zone_by_product.get(vals.get('product_id') or
+                                            line.product_id.id)
+            old_prod_zone = zone_by_product.get(line.product_id.id)
+            if prod_zone and old_prod_zone:
+                moves[(old_prod_zone.id, line.checkin_date,
+                       line.checkout_date)] = (
+                    prod_zone.id,
+                    vals.get('checkin_date') or line.checkin_date,
+                    vals.get('checkout_date') or line.checkout_date)
+        to_write = {}
+        if moves:
+            # Fetch the existing zone lines of all the folio lines at once.
+            for rm_line in reservation_line_obj.search([
+                    ('zone_id', 'in', list(set(key[0] for key in moves))),
+                    ('check_in', 'in', list(set(key[1] for key in moves))),
+                    ('check_out', 'in', list(set(key[2] for key in moves)))]):
+                target = moves.get((rm_line.zone_id.id, rm_line.check_in,
+                                    rm_line.check_out))
+                if target:
+                    to_write.setdefault(target, reservation_line_obj)
+                    to_write[target] |= rm_line
+        reservation_line_obj._write_periods(to_write)
+        res = super(PaintballFolioLineExt, self).write(vals)
+        occupancy_obj._mark_folio_lines_dirty(self)
+        return res
 
 
 class PaintballReservation(models.Model):
@@ -176,6 +247,8 @@ class PaintballReservation(models.Model):
                                 'order_id', 'invoice_id', string='Folio')
     no_of_folio = fields.Integer('No. Folio', compute="_compute_folio_id")
     dummy = fields.Datetime('Dummy')
+    reminder_24hrs_sent = fields.Datetime('Reminder Sent', readonly=True,
+                                          copy=False)
     
     def _compute_checkout(self):
         dt =  self.checkin + datetime.timedelta(days=1)
@@ -234,6 +307,17 @@ class PaintballReservation(models.Model):
                         ' Members Accomodation.'))
             if reservation.adults <= 0:
                 raise ValidationError(_('Adults must be more than 0'))
+            periods = reservation._get_zone_periods()[reservation.id]
+            for index, (zone, check_in, check_out) in enumerate(periods):
+                if not (check_in and check_out):
+                    continue
+                for other, other_in, other_out in periods[index + 1:]:
+                    if other == zone and other_in and other_out and \
+                            intervals.intersection((check_in, check_out),
+                                                   (other_in, other_out)):
+                        raise ValidationError(_(
+                            'The zone %s is reserved twice for overlapping '
+                            'periods.') % zone.name)
 
     @api.constrains('checkin', 'checkout')
     def check_in_out_dates(self):
@@ -312,91 +396,136 @@ class PaintballReservation(models.Model):
         delta = date2 - date1
         return set([date1 + timedelta(days=i) for i in range(delta.days + 1)])
 
+    @api.model
+    def _get_confirm_conflicts(self, candidates):
+        """
+        Find, in one query, the candidate zone lines that overlap an
+        assigned zone line of another reservation or another candidate.
+        ------------------------------------------------------------
+        @param self: The object pointer
+        @param candidates: list of (reservation_id, zone_id, check_in,
+                           check_out) tuples
+        @return: list of (reservation_id, zone_id, check_in, check_out,
+                 other_reservation_id, other_check_in, other_check_out)
+        """
+        self.env['paintball.zone.reservation.line'].flush()
+        values = ', '.join(['(%s, %s, %s::timestamp, %s::timestamp)'] *
+                           len(candidates))
+        self._cr.execute("""
+            WITH candidate (reservation_id, zone_id, check_in, check_out) AS (
+                VALUES """ + values + """
+            )
+            SELECT c.reservation_id, c.zone_id, c.check_in, c.check_out,
+                   zrl.reservation_id, zrl.check_in, zrl.check_out
+              FROM candidate c
+              JOIN paintball_zone_reservation_line zrl
+                ON zrl.zone_id = c.zone_id
+               AND zrl.state = 'assigned'
+               AND zrl.reservation_id IS DISTINCT FROM c.reservation_id
+               AND tsrange(zrl.check_in, zrl.check_out, '[]')
+                   && tsrange(c.check_in, c.check_out, '[]')
+             UNION ALL
+            SELECT c1.reservation_id, c1.zone_id, c1.check_in, c1.check_out,
+                   c2.reservation_id, c2.check_in, c2.check_out
+              FROM candidate c1
+              JOIN candidate c2
+                ON c2.zone_id = c1.zone_id
+               AND c2.reservation_id > c1.reservation_id
+               AND tsrange(c2.check_in, c2.check_out, '[]')
+                   && tsrange(c1.check_in, c1.check_out, '[]')
+          ORDER BY 1, 2, 5
+        """, [value for candidate in candidates for value in candidate])
+        return self._cr.fetchall()
+
+    def _get_confirm_conflict_message(self, conflicts):
+        """
+        Describe every conflict returned by _get_confirm_conflicts().
+        """
+        tz = self._context.get('tz') or self.env.user.tz
+        zones = self.env['paintball.zone'].browse(
+            set(conflict[1] for conflict in conflicts))
+        reservations = self.browse(
+            set(conflict[0] for conflict in conflicts) |
+            set(conflict[4] for conflict in conflicts))
+        zone_names = dict((zone.id, zone.name) for zone in zones)
+        numbers = dict((reservation.id, reservation.reservation_no or
+                        reservation.display_name)
+                       for reservation in reservations)
+        messages = []
+        for (reservation_id, zone_id, check_in, check_out, other_id,
+             other_check_in, other_check_out) in conflicts:
+            overlap_dates = intervals.overlap_ranges(
+                [(check_in, check_out)], [(other_check_in, other_check_out)],
+                tz=tz)
+            messages.append(_('%s: zone %s is already reserved by %s. '
+                              'Overlap Dates are %s') % (
+                numbers[reservation_id], zone_names[zone_id],
+                numbers[other_id],
+                ', '.join(intervals.format_ranges(overlap_dates))))
+        return _('You tried to Confirm Reservation with zone those already '
+                 'reserved in this Reservation Period.\n%s') % \
+            '\n'.join(messages)
+
+    @profiling.profiled
     def confirmed_reservation(self):
         """
         This method create a new record set for paintball zone reservation line
+        The whole record set is confirmed at once: overlaps with other
+        reservations and within the record set are checked in one query
+        and every conflict is reported. Overlapping reservations are also
+        rejected by the exclusion constraint of
+        paintball.zone.reservation.line, so the check holds when two
+        users confirm the same zone at the same time.
         -------------------------------------------------------------------
         @param self: The object pointer
         @return: new record set for paintball zone reservation line.
         """
         reservation_line_obj = self.env['paintball.zone.reservation.line']
-        vals = {}
+        vals_list = []
+        zones = self.env['paintball.zone']
+        reservations = self.browse()
+        zone_periods = self._get_zone_periods()
         for reservation in self:
-            reserv_checkin = reservation.checkin
-            reserv_checkout = reservation.checkout
-            zone_bool = False
-            for line_id in reservation.reservation_line:
-                for zone_id in line_id.reserve:
-                    if zone_id.zone_reservation_line_ids:
-                        for reserv in zone_id.zone_reservation_line_ids.\
-                                search([('status', 'in', ('confirm', 'done')),
-                                        ('zone_id', '=', zone_id.id)]):
-                            check_in = reserv.check_in
-                            check_out = reserv.check_out
-                            if check_in <= reserv_checkin <= check_out:
-                                zone_bool = True
-                            if check_in <= reserv_checkout <= check_out:
-                                zone_bool = True
-                            if reserv_checkin <= check_in and \
-                                    reserv_checkout >= check_out:
-                                zone_bool = True
-                            mytime = "%Y-%m-%d"
-                            r_checkin = (reservation.checkin).date()
-                            r_checkin = r_checkin.strftime(mytime)
-                            r_checkout = (reservation.checkout).date()
-                            r_checkout = r_checkout.strftime(mytime)
-                            check_intm = (reserv.check_in).date()
-                            check_outtm = (reserv.check_out).date()
-                            check_intm = check_intm.strftime(mytime)
-                            check_outtm = check_outtm.strftime(mytime)
-                            range1 = [r_checkin, r_checkout]
-                            range2 = [check_intm, check_outtm]
-                            overlap_dates = self.check_overlap(*range1) \
-                                & self.check_overlap(*range2)
-                            overlap_dates = [datetime.strftime(dates,
-                                                               '%d/%m/%Y') for
-                                             dates in overlap_dates]
-                            if zone_bool:
-                                raise ValidationError(_('You tried to Confirm '
-                                                        'Reservation with zone'
-                                                        ' those already '
-                                                        'reserved in this '
-                                                        'Reservation Period. '
-                                                        'Overlap Dates are '
-                                                        '%s') % overlap_dates)
-                            else:
-                                self.state = 'confirm'
-                                vals = {'zone_id': zone_id.id,
-                                        'check_in': reservation.checkin,
-                                        'check_out': reservation.checkout,
-                                        'state': 'assigned',
-                                        'reservation_id': reservation.id,
-                                        }
-                                zone_id.write({'iszone': False,
-                                               'status': 'occupied'})
-                        else:
-                            self.state = 'confirm'
-                            vals = {'zone_id': zone_id.id,
-                                    'check_in': reservation.checkin,
-                                    'check_out': reservation.checkout,
-                                    'state': 'assigned',
-                                    'reservation_id': reservation.id,
-                                    }
-                            zone_id.write({'iszone': False,
-                                           'status': 'occupied'})
-                    else:
-                        self.state = 'confirm'
-                        vals = {'zone_id': zone_id.id,
-                                'check_in': reservation.checkin,
-                                'check_out': reservation.checkout,
-                                'state': 'assigned',
-                                'reservation_id': reservation.id,
-                                }
-                        zone_id.write({'iszone': False,
-                                       'status': 'occupied'})
-                    reservation_line_obj.create(vals)
+            if not zone_periods[reservation.id]:
+                continue
+            reservations |= reservation
+            for zone, check_in, check_out in zone_periods[reservation.id]:
+                zones |= zone
+                vals_list.append({'zone_id': zone.id,
+                                  'check_in': check_in,
+                                  'check_out': check_out,
+                                  'state': 'assigned',
+                                  'reservation_id': reservation.id,
+                                  })
+        if not vals_list:
+            return True
+        candidates = [(vals['reservation_id'], vals['zone_id'],
+                       vals['check_in'], vals['check_out'])
+                      for vals in vals_list]
+        conflicts = self._get_confirm_conflicts(candidates)
+        if not conflicts:
+            try:
+                with self._cr.savepoint():
+                    reservation_line_obj.create(vals_list)
+                    reservation_line_obj.flush()
+            except IntegrityError as e:
+                if e.pgcode != errorcodes.EXCLUSION_VIOLATION:
+                    raise
+                # Confirmed concurrently by another transaction, which
+                # may not be visible to this one yet.
+                conflicts = self._get_confirm_conflicts(candidates)
+                if not conflicts:
+                    raise ValidationError(_('Some of these zones have just '
+                                            'been reserved for the same '
+                                            'period, please try again.'))
+        if conflicts:
+            raise ValidationError(self._get_confirm_conflict_message(
+                conflicts))
+        zones.write({'iszone': False, 'status': 'occupied'})
+        reservations.write({'state': 'confirm'})
         return True
 
+    @profiling.profiled
     def cancel_reservation(self):
         """
         This method cancel record set for paintball zone reservation line
@@ -413,9 +542,8 @@ class PaintballReservation(models.Model):
         zone_reservation_line.unlink()
         reservation_lines = paintball_res_line_obj.search([('line_id',
                                                         'in', self.ids)])
-        for reservation_line in reservation_lines:
-            reservation_line.reserve.write({'iszone': True,
-                                            'status': 'available'})
+        reservation_lines.mapped('reserve').write({'iszone': True,
+                                                   'status': 'available'})
         return True
 
 
@@ -465,52 +593,180 @@ class PaintballReservation(models.Model):
         }
 
     @api.model
-    def reservation_reminder_24hrs(self):
+    def _get_reminder_24hrs_domain(self, warehouse):
+        """
+        Domain of the reservations to remind for a paintball: confirmed
+        reservations not reminded yet whose check in falls tomorrow in
+        the timezone of the paintball.
+        ----------------------------------------------
+        @param self: The object pointer
+        @param warehouse: stock.warehouse record
+        @return: domain
+        """
+        timezone = pytz.timezone(warehouse.partner_id.tz or 'UTC')
+        today = pytz.utc.localize(datetime.utcnow()).astimezone(
+            timezone).date()
+        tomorrow = datetime.combine(today + timedelta(days=1),
+                                    datetime.min.time())
+        start = timezone.localize(tomorrow).astimezone(pytz.utc)
+        end = timezone.localize(tomorrow + timedelta(days=1)).astimezone(
+            pytz.utc)
+        return [('warehouse_id', '=', warehouse.id),
+                ('state', '=', 'confirm'),
+                ('reminder_24hrs_sent', '=', False),
+                ('partner_id.email', '!=', False),
+                ('checkin', '>=', start.replace(tzinfo=None)),
+                ('checkin', '<', end.replace(tzinfo=None))]
+
+    def _queue_reminder_24hrs(self, template):
+        """
+        Render the reminder of the reservations in one pass (the template
+        renders one batch per language) and queue the mails for the mail
+        scheduler. The reservations are marked as reminded in the same
+        transaction as the mails are queued.
+        ----------------------------------------------
+        @param self: The object pointer
+        @param template: mail.template record
+        @return: the queued mail.mail records
+        """
+        values_list = []
+        attachment_obj = self.env['ir.attachment']
+        all_values = template.generate_email(self.ids)
+        for res_id in self.ids:
+            values = all_values[res_id]
+            values['recipient_ids'] = [(4, pid) for pid in
+                                       values.pop('partner_ids', [])]
+            attachment_ids = values.pop('attachment_ids', [])
+            for name, content in values.pop('attachments', []):
+                attachment_ids.append(attachment_obj.create({
+                    'name': name,
+                    'datas': content,
+                    'res_model': self._name,
+                    'res_id': res_id,
+                }).id)
+            if attachment_ids:
+                values['attachment_ids'] = [(6, 0, attachment_ids)]
+            if not values.get('email_from'):
+                values.pop('email_from', None)
+            values.update(model=self._name, res_id=res_id,
+                          auto_delete=template.auto_delete)
+            values_list.append(values)
+        mails = self.env['mail.mail'].sudo().create(values_list)
+        self.write({'reminder_24hrs_sent': fields.Datetime.now()})
+        return mails
+
+    @api.model
+    @profiling.profiled
+    def reservation_reminder_24hrs(self, batch_size=200):
         """
         This method is for scheduler
         every 1day scheduler will call this method to
         find all tomorrow's reservations.
         ----------------------------------------------
         @param self: The object pointer
-        @return: send a mail
+        @param batch_size: number of reminders queued per transaction
+        @return: queue the mails
         """
-        now_str = time.strftime(dt)
-        now_date = datetime.strptime(now_str, dt)
-        ir_model_data = self.env['ir.model.data']
-        template_id = (ir_model_data.get_object_reference
-                       ('paintball_reservation',
-                        'mail_template_reservation_reminder_24hrs')[1])
-        template_rec = self.env['mail.template'].browse(template_id)
-        for reserv_rec in self.search([]):
-            checkin_date = reserv_rec.checkin
-            difference = relativedelta(now_date, checkin_date)
-            if(difference.days == -1 and reserv_rec.partner_id.email and
-               reserv_rec.state == 'confirm'):
-                template_rec.send_mail(reserv_rec.id, force_send=True)
+        template_rec = self.env.ref(
+            'paintball_reservation.mail_template_reservation_reminder_24hrs')
+        auto_commit = not getattr(threading.currentThread(), 'testing', False)
+        for warehouse in self.env['stock.warehouse'].search([]):
+            reservations = self.search(
+                self._get_reminder_24hrs_domain(warehouse))
+            reservations = reservations.sorted(
+                key=lambda reservation: reservation.partner_id.lang or '')
+            for index in range(0, len(reservations), batch_size):
+                reservations[index:index + batch_size]._queue_reminder_24hrs(
+                    template_rec)
+                if auto_commit:
+                    self._cr.commit()
         return True
 
 
+    def _get_zone_periods(self):
+        """
+        Return the zones reserved by the reservations with the period of
+        each of them: the period of its reservation line when it has one,
+        the period of the reservation otherwise.
+        -----------------------------------------
+        @param self: The object pointer
+        @return: dictionary of the list of (zone, check_in, check_out)
+                 tuples per reservation id
+        """
+        res = {}
+        for reservation in self:
+            periods = res[reservation.id] = []
+            seen = set()
+            for line in reservation.reservation_line:
+                check_in = line.check_in or reservation.checkin
+                check_out = line.check_out or reservation.checkout
+                for zone in line.reserve:
+                    if (zone.id, check_in, check_out) in seen:
+                        continue
+                    seen.add((zone.id, check_in, check_out))
+                    periods.append((zone, check_in, check_out))
+        return res
+
+    def _get_folio_zone_prices(self, items, durations):
+        """
+        Compute the price of reserved zones with the pricelist of their
+        reservation, see paintball.pricing.
+        -----------------------------------------
+        @param self: The object pointer
+        @param items: list of (reservation, zone) tuples
+        @param durations: list of the durations of items
+        @return: list of the unit prices of items
+        """
+        return self.env['paintball.pricing']._compute_prices([
+            (zone.product_id, duration or 1.0, reservation.pricelist_id,
+             reservation.partner_id, reservation.date_order)
+            for (reservation, zone), duration in zip(items, durations)])
+
+    @profiling.profiled
     def create_folio(self):
         """
         This method is for create new paintball folio.
+        The folios of all the reservations are created at once.
         -----------------------------------------
         @param self: The object pointer
         @return: new record set for paintball folio.
         """
         paintball_folio_obj = self.env['paintball.folio']
+        duration_obj = self.env['paintball.duration']
         zone_obj = self.env['paintball.zone']
         for reservation in self:
-            folio_lines = []
-            checkin_date = reservation['checkin']
-            checkout_date = reservation['checkout']
-            if not self.checkin < self.checkout:
+            if not reservation.checkin < reservation.checkout:
                 raise ValidationError(_('Checkout date should be greater \
                                          than the Check-in date.'))
-            duration_vals = (self.onchange_check_dates
-                             (checkin_date=checkin_date,
-                              checkout_date=checkout_date, duration=False))
-            duration = duration_vals.get('duration') or 0.0
-            folio_vals = {
+        durations = dict(zip(self.ids, duration_obj._compute_durations(
+            [(reservation.checkin, reservation.checkout,
+              reservation.warehouse_id.company_id) for reservation in self])))
+        zone_periods = self._get_zone_periods()
+        items = []
+        periods = []
+        for reservation in self:
+            for zone, check_in, check_out in zone_periods[reservation.id]:
+                items.append((reservation, zone))
+                periods.append((check_in, check_out,
+                                reservation.warehouse_id.company_id))
+        line_durations = duration_obj._compute_durations(periods)
+        prices = self._get_folio_zone_prices(items, line_durations)
+        lines_by_reservation = {}
+        for (reservation, zone), period, duration, price in zip(
+                items, periods, line_durations, prices):
+            lines_by_reservation.setdefault(reservation.id, []).append(
+                (0, 0, {
+                    'checkin_date': period[0],
+                    'checkout_date': period[1],
+                    'product_id': zone.product_id.id,
+                    'name': reservation['reservation_no'],
+                    'price_unit': price,
+                    'product_uom_qty': duration,
+                    'is_reserved': True}))
+        zones = zone_obj.browse([zone.id for __, zone in items])
+        folio_vals_list = []
+        for reservation in self:
+            folio_vals_list.append({
                 'date_order': reservation.date_order,
                 'warehouse_id': reservation.warehouse_id.id,
                 'partner_id': reservation.partner_id.id,
@@ -519,62 +775,36 @@ class PaintballReservation(models.Model):
                 'partner_shipping_id': reservation.partner_shipping_id.id,
                 'checkin_date': reservation.checkin,
                 'checkout_date': reservation.checkout,
-                'duration': duration,
+                'duration': durations[reservation.id],
                 'reservation_id': reservation.id,
-                #'service_lines': reservation['folio_id']
-            }
-            for line in reservation.reservation_line:
-                for r in line.reserve:
-                    folio_lines.append((0, 0, {
-                        'checkin_date': checkin_date,
-                        'checkout_date': checkout_date,
-                        'product_id': r.product_id and r.product_id.id,
-                        'name': reservation['reservation_no'],
-                        'price_unit': r.list_price,
-                        'product_uom_qty': duration,
-                        'is_reserved': True}))
-                    res_obj = zone_obj.browse([r.id])
-                    res_obj.write({'status': 'occupied', 'iszone': False})
-            folio_vals.update({'zone_lines': folio_lines})
-            folio = paintball_folio_obj.create(folio_vals)
-            if folio:
-                for rm_line in folio.zone_lines:
-                    rm_line.product_id_change()
-            self._cr.execute('insert into paintball_folio_reservation_rel'
-                             '(order_id, invoice_id) values (%s,%s)',
-                             (reservation.id, folio.id))
-            self.state = 'done'
+                'zone_lines': lines_by_reservation.get(reservation.id, []),
+            })
+        if not folio_vals_list:
+            return True
+        folios = paintball_folio_obj.create(folio_vals_list)
+        if zones:
+            zones.write({'status': 'occupied', 'iszone': False})
+        self._cr.execute('INSERT INTO paintball_folio_reservation_rel'
+                         '(order_id, invoice_id) VALUES ' +
+                         ', '.join(['%s'] * len(folios)),
+                         [(folio.reservation_id.id, folio.id)
+                          for folio in folios])
+        self.invalidate_cache(['folio_id'])
+        self.write({'state': 'done'})
         return True
 
-
     def onchange_check_dates(self, checkin_date=False, checkout_date=False,
                              duration=False):
         '''
-        This method gives the duration between check in checkout if
-        customer will leave only for some hour it would be considers
-        as a whole day. If customer will checkin checkout for more or equal
-        hours, which configured in company as additional hours than it would
-        be consider as full days
+        This method gives the billable duration between check in and
+        checkout, see paintball.duration.
         --------------------------------------------------------------------
         @param self: object pointer
-        @return: Duration and checkout_date
+        @return: Duration
         '''
-        value = {}
-        configured_addition_hours = 0
-        wc_id = self.warehouse_id
-        whcomp_id = wc_id or wc_id.company_id
-        if whcomp_id:
-            configured_addition_hours = wc_id.company_id.additional_hours
-        duration = 0
-        if checkin_date and checkout_date:
-            dur = checkout_date - checkin_date
-            duration = dur.days + 1
-            if configured_addition_hours > 0:
-                additional_hours = abs((dur.seconds / 60))
-                if additional_hours <= abs(configured_addition_hours * 60):
-                    duration -= 1
-        value.update({'duration': duration})
-        return value
+        duration = self.env['paintball.duration']._compute_duration(
+            checkin_date, checkout_date, self.warehouse_id.company_id)
+        return {'duration': duration}
 
 
 class PaintballReservationLine(models.Model):
@@ -590,6 +820,23 @@ class PaintballReservationLine(models.Model):
                                domain="[('iszone','=',True),\
                                ('categ_id','=',categ_id)]")
     categ_id = fields.Many2one('paintball.zone.type', 'Zone Type')
+    check_in = fields.Datetime('Check In',
+                               help="Leave empty to reserve the zones for "
+                               "the whole period of the reservation.")
+    check_out = fields.Datetime('Check Out',
+                                help="Leave empty to reserve the zones for "
+                                "the whole period of the reservation.")
+
+    @api.constrains('check_in', 'check_out')
+    def check_line_dates(self):
+        for line in self:
+            if bool(line.check_in) != bool(line.check_out):
+                raise ValidationError(_('Set both the check in and the '
+                                        'check out of the line, or '
+                                        'none of them.'))
+            if line.check_in and line.check_out < line.check_in:
+                raise ValidationError(_('Check-out date should be greater '
+                                        'than Check-in date.'))
 
     @api.onchange('categ_id')
     def on_change_categ(self):
@@ -599,42 +846,17 @@ class PaintballReservationLine(models.Model):
         -----------------------------------------------------------
         @param self: object pointer
         '''
-        paintball_zone_obj = self.env['paintball.zone']
-        paintball_zone_ids = paintball_zone_obj.search([('categ_id', '=',
-                                                 self.categ_id.id)])
-        zone_ids = []
         if not self.line_id.checkin:
             raise ValidationError(_('Before choosing a zone,\n You have to \
                                      select a Check in date or a Check out \
                                      date in the reservation form.'))
-        for zone in paintball_zone_ids:
-            assigned = False
-            for line in zone.zone_reservation_line_ids:
-                if line.status != 'cancel':
-                    if(self.line_id.checkin <= line.check_in <=
-                        self.line_id.checkout) or (self.line_id.checkin <=
-                                                   line.check_out <=
-                                                   self.line_id.checkout):
-                        assigned = True
-                    elif(line.check_in <= self.line_id.checkin <=
-                         line.check_out) or (line.check_in <=
-                                             self.line_id.checkout <=
-                                             line.check_out):
-                        assigned = True
-            for rm_line in zone.zone_line_ids:
-                if rm_line.status != 'cancel':
-                    if(self.line_id.checkin <= rm_line.check_in <=
-                       self.line_id.checkout) or (self.line_id.checkin <=
-                                                  rm_line.check_out <=
-                                                  self.line_id.checkout):
-                        assigned = True
-                    elif(rm_line.check_in <= self.line_id.checkin <=
-                         rm_line.check_out) or (rm_line.check_in <=
-                                                self.line_id.checkout <=
-                                                rm_line.check_out):
-                        assigned = True
-            if not assigned:
-                zone_ids.append(zone.id)
+        zone_ids = []
+        if self.categ_id:
+            zones = self.env['paintball.zone']._get_available_zones(
+                self.line_id.checkin, self.line_id.checkout,
+                categ_id=self.categ_id.id,
+                warehouse_id=self.line_id.warehouse_id.id)
+            zone_ids = zones.ids
         domain = {'reserve': [('id', 'in', zone_ids)]}
         return {'domain': domain}
 
@@ -657,9 +879,68 @@ class PaintballReservationLine(models.Model):
         return super(PaintballReservationLine, self).unlink()
 
 
+class PaintballZoneLineMixin(models.AbstractModel):
+
+    _name = 'paintball.zone.line.mixin'
+    _description = 'Zone Booking Line'
+
+    def _get_zone_changes(self):
+        """
+        Return the (zone_id, check_in, check_out) tuples of the lines.
+        """
+        return [(line.zone_id.id, line.check_in, line.check_out)
+                for line in self if line.zone_id]
+
+    @api.model
+    def _notify_zone_changes(self, changes):
+        """
+        Called after zone lines are created, written or unlinked with the
+        (zone_id, check_in, check_out) tuples touched by the change, both
+        before and after a write.
+        ---------------------------------------------------------------
+        @param self: The object pointer
+        @param changes: list of (zone_id, check_in, check_out) tuples
+        """
+        self.env['zone.reservation.summary']._invalidate_zone_summary(
+            changes)
+        self.env['paintball.zone.occupancy']._mark_dirty(changes)
+        zone_ids = set(change[0] for change in changes if change[0])
+        if zone_ids:
+            self.env['paintball.zone']._plan_zone_boundaries(list(zone_ids))
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super(PaintballZoneLineMixin, self).create(vals_list)
+        records._notify_zone_changes(records._get_zone_changes())
+        return records
+
+    def write(self, vals):
+        changes = []
+        if set(vals) & {'zone_id', 'check_in', 'check_out', 'state',
+                        'folio_id', 'reservation_id'}:
+            changes = self._get_zone_changes()
+        res = super(PaintballZoneLineMixin, self).write(vals)
+        if changes:
+            self._notify_zone_changes(changes + self._get_zone_changes())
+        return res
+
+    def unlink(self):
+        changes = self._get_zone_changes()
+        res = super(PaintballZoneLineMixin, self).unlink()
+        self._notify_zone_changes(changes)
+        return res
+
+
+class FolioZoneLine(models.Model):
+
+    _name = 'folio.zone.line'
+    _inherit = ['folio.zone.line', 'paintball.zone.line.mixin']
+
+
 class PaintballZoneReservationLine(models.Model):
 
     _name = 'paintball.zone.reservation.line'
+    _inherit = ['paintball.zone.line.mixin']
     _description = 'Paintball Zone Reservation'
     _rec_name = 'zone_id'
 
@@ -672,6 +953,60 @@ class PaintballZoneReservationLine(models.Model):
                                      string='Reservation')
     status = fields.Selection(string='state', related='reservation_id.state')
 
+    _sql_constraints = [
+        ('zone_period_excl',
+         "EXCLUDE USING gist (int4range(zone_id, zone_id, '[]') WITH &&, "
+         "tsrange(check_in, check_out, '[]') WITH &&) "
+         "WHERE (state = 'assigned')",
+         'This zone is already reserved in this period.'),
+    ]
+
+    def init(self):
+        # Range index used by paintball.zone._get_available_zones().
+        self._cr.execute("""
+            CREATE INDEX IF NOT EXISTS paintball_zone_reservation_line_period_idx
+            ON paintball_zone_reservation_line
+            USING gist (tsrange(check_in, check_out, '[]'))
+        """)
+
+    @api.model
+    def _write_periods(self, periods):
+        """
+        Move zone reservation lines to other zones or periods, reporting
+        an overlap with another reservation, rejected by the exclusion
+        constraint, as a validation error.
+        ---------------------------------------------------------------
+        @param self: The object pointer
+        @param periods: dictionary of the record sets to write per
+                        (zone_id, check_in, check_out) tuple
+        """
+        if not periods:
+            return
+        try:
+            with self._cr.savepoint():
+                for (zone_id, check_in, check_out), lines in periods.items():
+                    lines.write({'zone_id': zone_id,
+                                 'check_in': check_in,
+                                 'check_out': check_out})
+                self.flush()
+        except IntegrityError as e:
+            if e.pgcode != errorcodes.EXCLUSION_VIOLATION:
+                raise
+            raise ValidationError(_('The new dates overlap another '
+                                    'reservation of the same zone.'))
+
+
+class PaintballZoneBoundary(models.Model):
+
+    _name = 'paintball.zone.boundary'
+    _description = 'Zone Occupancy Boundary'
+    _order = 'date'
+    _log_access = False
+
+    zone_id = fields.Many2one('paintball.zone', 'Zone', required=True,
+                              ondelete='cascade', index=True)
+    date = fields.Datetime('Date', required=True, index=True)
+
 
 class PaintballZone(models.Model):
 
@@ -696,45 +1031,437 @@ class PaintballZone(models.Model):
                                             zone after the zone in %s state \
                                             in reservation')
                                           % (reserv_line.status))
-        return super(PaintballZone, self).unlink()
+        res = super(PaintballZone, self).unlink()
+        self.env['zone.reservation.summary']._invalidate_zone_summary(
+            [(None, None, None)])
+        return res
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        zones = super(PaintballZone, self).create(vals_list)
+        self.env['zone.reservation.summary']._invalidate_zone_summary(
+            [(None, None, None)])
+        return zones
+
+    def write(self, vals):
+        res = super(PaintballZone, self).write(vals)
+        if 'name' in vals:
+            self.env['zone.reservation.summary']._invalidate_zone_summary(
+                [(zone.id, None, None) for zone in self])
+        if 'product_id' in vals:
+            self.env['paintball.zone.occupancy']._mark_dirty(
+                [(None, None, None)])
+        elif {'area_id', 'categ_id'} & set(vals):
+            self.env['paintball.zone.occupancy']._mark_dirty(
+                [(zone.id, None, None) for zone in self])
+        return res
 
     @api.model
+    def _get_busy_zone_queries(self, checkin, checkout):
+        """
+        Also consider the zones held by reservations as busy.
+        """
+        res = super(PaintballZone, self)._get_busy_zone_queries(checkin,
+                                                                checkout)
+        res.append(("""
+            SELECT zrl.zone_id
+              FROM paintball_zone_reservation_line zrl
+         LEFT JOIN paintball_reservation r ON r.id = zrl.reservation_id
+             WHERE tsrange(zrl.check_in, zrl.check_out, '[]')
+                   && tsrange(%s, %s, '[]')
+               AND zrl.zone_id IS NOT NULL
+               AND r.state IS DISTINCT FROM 'cancel'
+        """, [checkin, checkout]))
+        return res
+
+    @api.model
+    def _get_busy_cell_queries(self):
+        """
+        Also consider the zones held by reservations as busy.
+        """
+        res = super(PaintballZone, self)._get_busy_cell_queries()
+        res.append("""
+            EXISTS (SELECT 1
+                      FROM paintball_zone_reservation_line zrl
+                 LEFT JOIN paintball_reservation r
+                        ON r.id = zrl.reservation_id
+                     WHERE zrl.zone_id = c.zone_id
+                       AND tsrange(zrl.check_in, zrl.check_out, '[]')
+                           && tsrange(c.check_in, c.check_out, '[]')
+                       AND r.state IS DISTINCT FROM 'cancel')
+        """)
+        return res
+
+    @api.model
+    def _get_busy_cells(self, cells):
+        self.env['paintball.zone.reservation.line'].flush()
+        return super(PaintballZone, self)._get_busy_cells(cells)
+
+    @api.model
+    def _sync_zone_status(self, zone_ids=None):
+        """
+        Bring iszone/status/color of the zones in line with their
+        current occupancy. A single query finds the zones whose state is
+        out of date and only those are written, in one write per target
+        state.
+        --------------------------------------------------------------
+        @param self: The object pointer
+        @param zone_ids: zones to check, all the zones by default
+        @return: the zones that were updated
+        """
+        query = """
+            WITH occupancy AS (
+                SELECT z.id,
+                       COALESCE(pp.iszone, false) AS iszone,
+                       z.status,
+                       pt.color,
+                       EXISTS (SELECT 1
+                                 FROM paintball_zone_reservation_line zrl
+                                WHERE zrl.zone_id = z.id
+                                  AND tsrange(zrl.check_in, zrl.check_out, '[]')
+                                      @> %(now)s::timestamp) AS reserved,
+                       EXISTS (SELECT 1
+                                 FROM folio_zone_line fzl
+                                WHERE fzl.zone_id = z.id
+                                  AND tsrange(fzl.check_in, fzl.check_out, '[]')
+                                      @> %(now)s::timestamp) AS in_folio
+                  FROM paintball_zone z
+                  JOIN product_product pp ON pp.id = z.product_id
+                  JOIN product_template pt ON pt.id = pp.product_tmpl_id
+                 WHERE %(all_zones)s OR z.id IN %(zone_ids)s
+            )
+            SELECT id, reserved OR in_folio, reserved AND in_folio
+              FROM occupancy
+             WHERE (reserved OR in_folio) <> (NOT iszone)
+                OR status IS DISTINCT FROM
+                       CASE WHEN reserved OR in_folio
+                            THEN 'occupied' ELSE 'available' END
+                OR color IS DISTINCT FROM
+                       CASE WHEN reserved OR in_folio THEN 2 ELSE 5 END
+                OR (reserved AND in_folio)
+        """
+        self.flush(['status'])
+        self.env['product.product'].flush(['iszone'])
+        self.env['product.template'].flush(['color'])
+        self.env['paintball.zone.reservation.line'].flush()
+        self.env['folio.zone.line'].flush()
+        self._cr.execute(query, {
+            'now': fields.Datetime.now(),
+            'all_zones': zone_ids is None,
+            'zone_ids': tuple(zone_ids or [0]),
+        })
+        occupied_ids = []
+        available_ids = []
+        for zone_id, occupied, conflict in self._cr.fetchall():
+            if conflict:
+                _logger.warning('Zone %s is occupied by both a reservation '
+                                'and a folio.', zone_id)
+            (occupied_ids if occupied else available_ids).append(zone_id)
+        occupied_zones = self.browse(occupied_ids)
+        available_zones = self.browse(available_ids)
+        # Zones only reported because of a conflict are already up to date.
+        occupied_zones = occupied_zones.filtered(
+            lambda zone: zone.iszone or zone.status != 'occupied' or
+            zone.color != 2)
+        if occupied_zones:
+            occupied_zones.write({'iszone': False})
+        if available_zones:
+            available_zones.write({'iszone': True})
+        return occupied_zones | available_zones
+
+    @api.model
+    def _plan_zone_boundaries(self, zone_ids=None):
+        """
+        Rebuild the queue of the moments at which the occupancy of the
+        zones may change: the check in of their current and future lines
+        and the second following their check out. A boundary at the
+        current time is added so that the change being made is applied
+        by the next run of the scheduler.
+        --------------------------------------------------------------
+        @param self: The object pointer
+        @param zone_ids: zones to plan, all the zones by default
+        """
+        now = fields.Datetime.now()
+        params = {'now': now,
+                  'all_zones': zone_ids is None,
+                  'zone_ids': tuple(zone_ids or [0])}
+        self.env['paintball.zone.reservation.line'].flush()
+        self.env['folio.zone.line'].flush()
+        self._cr.execute("""
+            DELETE FROM paintball_zone_boundary
+             WHERE %(all_zones)s OR zone_id IN %(zone_ids)s
+        """, params)
+        self._cr.execute("""
+            WITH lines AS (
+                SELECT zone_id, check_in, check_out
+                  FROM paintball_zone_reservation_line
+                 WHERE check_out >= %(now)s
+                   AND (%(all_zones)s OR zone_id IN %(zone_ids)s)
+                 UNION ALL
+                SELECT zone_id, check_in, check_out
+                  FROM folio_zone_line
+                 WHERE check_out >= %(now)s
+                   AND (%(all_zones)s OR zone_id IN %(zone_ids)s)
+            )
+            INSERT INTO paintball_zone_boundary (zone_id, date)
+            SELECT zone_id, date
+              FROM (SELECT zone_id, check_in AS date FROM lines
+                     WHERE check_in > %(now)s
+                     UNION
+                    SELECT zone_id, check_out + interval '1 second'
+                      FROM lines
+                     UNION
+                    SELECT id, %(now)s FROM paintball_zone
+                     WHERE %(all_zones)s OR id IN %(zone_ids)s) AS boundary
+             WHERE zone_id IS NOT NULL
+        """, params)
+        self.env['paintball.zone.boundary'].invalidate_cache()
+
+    @api.model
+    @profiling.profiled
     def cron_zone_line(self):
         """
         This method is for scheduler
-        every 1min scheduler will call this method and check Status of
-        zone is occupied or available
+        it runs every minute and flips the status of the zones whose
+        boundaries are due. Bookings only queue their boundaries in
+        paintball.zone.boundary, they never lock or reschedule ir.cron
+        records, and a run without due boundary costs a single query.
         --------------------------------------------------------------
         @param self: The object pointer
         @return: update status of paintball zone reservation line
         """
-        reservation_line_obj = self.env['paintball.zone.reservation.line']
-        folio_zone_line_obj = self.env['folio.zone.line']
-        now = datetime.now()
-        curr_date = now.strftime(dt)
-        for zone in self.search([]):
-            reserv_line_ids = [reservation_line.id for
-                               reservation_line in
-                               zone.zone_reservation_line_ids]
-            reserv_args = [('id', 'in', reserv_line_ids),
-                           ('check_in', '<=', curr_date),
-                           ('check_out', '>=', curr_date)]
-            reservation_line_ids = reservation_line_obj.search(reserv_args)
-            zones_ids = [zone_line.ids for zone_line in zone.zone_line_ids]
-            rom_args = [('id', 'in', zones_ids),
-                        ('check_in', '<=', curr_date),
-                        ('check_out', '>=', curr_date)]
-            zone_line_ids = folio_zone_line_obj.search(rom_args)
-            status = {'iszone': True, 'color': 5}
-            if reservation_line_ids.ids:
-                status = {'iszone': False, 'color': 2}
-            zone.write(status)
-            if zone_line_ids.ids:
-                status = {'iszone': False, 'color': 2}
-            zone.write(status)
-            if reservation_line_ids.ids and zone_line_ids.ids:
-                raise ValidationError(_('Please Check Zones Status \
-                                         for %s.' % (zone.name)))
+        now = fields.Datetime.now()
+        self._cr.execute("""
+            DELETE FROM paintball_zone_boundary
+             WHERE date <= %s
+         RETURNING zone_id
+        """, (now,))
+        zone_ids = list(set(row[0] for row in self._cr.fetchall()))
+        self.env['paintball.zone.boundary'].invalidate_cache()
+        if zone_ids:
+            self._sync_zone_status(zone_ids)
+        return True
+
+
+class PaintballZoneOccupancy(models.Model):
+
+    _name = 'paintball.zone.occupancy'
+    _description = 'Daily Zone Occupancy'
+    _order = 'day desc, zone_id'
+    _log_access = False
+
+    zone_id = fields.Many2one('paintball.zone', 'Zone', readonly=True,
+                              ondelete='cascade', index=True)
+    area_id = fields.Many2one('paintball.area', 'Area', readonly=True)
+    categ_id = fields.Many2one('paintball.zone.type', 'Zone Category',
+                               readonly=True)
+    company_id = fields.Many2one('res.company', 'Company', readonly=True)
+    day = fields.Date('Day', readonly=True, index=True)
+    hours = fields.Float('Occupied Hours', readonly=True)
+    reservations = fields.Integer('Reservations', readonly=True)
+    revenue = fields.Float('Revenue', readonly=True)
+
+    def init(self):
+        # Periods whose occupancy changed since the last refresh.
+        self._cr.execute("""
+            CREATE TABLE IF NOT EXISTS paintball_zone_occupancy_queue (
+                zone_id integer,
+                check_in timestamp,
+                check_out timestamp
+            )
+        """)
+
+    @api.model
+    def _mark_dirty(self, changes):
+        """
+        Queue the days of the given periods for the next refresh.
+        ---------------------------------------------------------------
+        @param self: The object pointer
+        @param changes: list of (zone_id, check_in, check_out) tuples, a
+                        missing zone refreshes everything and a missing
+                        period the zone and area of the zone facts.
+        """
+        changes = set(changes)
+        if not changes:
+            return
+        query = """
+            INSERT INTO paintball_zone_occupancy_queue
+                (zone_id, check_in, check_out)
+            VALUES %s
+        """ % ', '.join(['(%s, %s, %s)'] * len(changes))
+        self._cr.execute(query, [value for change in changes
+                                 for value in change])
+
+    @api.model
+    def _mark_folio_lines_dirty(self, folio_lines):
+        """
+        Queue the days of the given paintball.folio.line records, whose
+        amounts are spread over their period as revenue.
+        """
+        zone_by_product = self.env['paintball.zone']._get_zones_by_product(
+            folio_lines.mapped('product_id'))
+        self._mark_dirty([(zone_by_product[line.product_id.id].id,
+                           line.checkin_date, line.checkout_date)
+                          for line in folio_lines
+                          if line.product_id.id in zone_by_product and
+                          line.checkin_date and line.checkout_date])
+
+    @api.model
+    def _get_occupancy_tz(self):
+        return self.env.company.partner_id.tz or 'UTC'
+
+    @api.model
+    def _refresh_days(self, zone_ids, days, tz):
+        """
+        Recompute the facts of the given (zone, day) pairs.
+        ---------------------------------------------------------------
+        @param self: The object pointer
+        @param zone_ids: list of zone ids
+        @param days: list of days, one per zone id
+        @param tz: timezone in which days are counted
+        """
+        params = {'zone_ids': zone_ids, 'days': days, 'tz': tz}
+        self._cr.execute("""
+            DELETE FROM paintball_zone_occupancy o
+             USING unnest(%(zone_ids)s::int[], %(days)s::date[])
+                   AS d(zone_id, day)
+             WHERE o.zone_id = d.zone_id AND o.day = d.day
+        """, params)
+        self._cr.execute("""
+            WITH dirty AS (
+                SELECT DISTINCT zone_id, day,
+                       (day::timestamp AT TIME ZONE %(tz)s)
+                           AT TIME ZONE 'UTC' AS day_start,
+                       ((day + 1)::timestamp AT TIME ZONE %(tz)s)
+                           AT TIME ZONE 'UTC' AS day_end
+                  FROM unnest(%(zone_ids)s::int[], %(days)s::date[])
+                       AS d(zone_id, day)
+            )
+            INSERT INTO paintball_zone_occupancy
+                (zone_id, area_id, categ_id, company_id, day, hours,
+                 reservations, revenue)
+            SELECT d.zone_id, z.area_id, z.categ_id, pt.company_id, d.day,
+                   COALESCE(b.hours, 0), COALESCE(b.bookings, 0),
+                   COALESCE(r.revenue, 0)
+              FROM dirty d
+              JOIN paintball_zone z ON z.id = d.zone_id
+              JOIN product_product pp ON pp.id = z.product_id
+              JOIN product_template pt ON pt.id = pp.product_tmpl_id
+         LEFT JOIN LATERAL (
+                SELECT sum(extract(epoch FROM least(l.check_out, d.day_end)
+                                   - greatest(l.check_in, d.day_start)))
+                       / 3600.0 AS hours,
+                       count(*) AS bookings
+                  FROM (SELECT zrl.check_in, zrl.check_out
+                          FROM paintball_zone_reservation_line zrl
+                         WHERE zrl.zone_id = d.zone_id
+                           AND zrl.state = 'assigned'
+                           AND tsrange(zrl.check_in, zrl.check_out, '[]')
+                               && tsrange(d.day_start, d.day_end, '[)')
+                         UNION ALL
+                        SELECT fzl.check_in, fzl.check_out
+                          FROM folio_zone_line fzl
+                          JOIN paintball_folio pf ON pf.id = fzl.folio_id
+                          JOIN sale_order so ON so.id = pf.order_id
+                         WHERE fzl.zone_id = d.zone_id
+                           AND so.state NOT IN ('draft', 'cancel')
+                           AND tsrange(fzl.check_in, fzl.check_out, '[]')
+                               && tsrange(d.day_start, d.day_end, '[)')
+                       ) AS l
+              ) AS b ON true
+         LEFT JOIN LATERAL (
+                SELECT sum(sol.price_subtotal
+                           * extract(epoch FROM
+                                     least(pfl.checkout_date, d.day_end)
+                                     - greatest(pfl.checkin_date, d.day_start))
+                           / extract(epoch FROM pfl.checkout_date
+                                                - pfl.checkin_date))
+                       AS revenue
+                  FROM paintball_folio_line pfl
+                  JOIN sale_order_line sol ON sol.id = pfl.order_line_id
+                  JOIN sale_order so ON so.id = sol.order_id
+                 WHERE sol.product_id = z.product_id
+                   AND so.state NOT IN ('draft', 'cancel')
+                   AND pfl.checkout_date > pfl.checkin_date
+                   AND tsrange(pfl.checkin_date, pfl.checkout_date, '[]')
+                       && tsrange(d.day_start, d.day_end, '[)')
+              ) AS r ON true
+             WHERE b.bookings > 0 OR r.revenue IS NOT NULL
+        """, params)
+
+    @api.model
+    def _refresh_occupancy(self, batch_size=10000):
+        """
+        Refresh the facts of the days queued since the last refresh, or
+        all the facts when a full refresh is queued.
+        ---------------------------------------------------------------
+        @param self: The object pointer
+        @param batch_size: number of (zone, day) pairs per statement
+        """
+        for model in ('paintball.zone.reservation.line', 'folio.zone.line',
+                      'paintball.folio.line', 'sale.order.line',
+                      'sale.order', 'paintball.zone'):
+            self.env[model].flush()
+        tz = self._get_occupancy_tz()
+        # Expand the queued periods to the local days they cover, a
+        # period-less change yields a single row without day.
+        self._cr.execute("""
+            WITH changes AS (
+                DELETE FROM paintball_zone_occupancy_queue
+             RETURNING zone_id, check_in, check_out
+            )
+            SELECT DISTINCT c.zone_id, d.day::date
+              FROM changes c
+         LEFT JOIN LATERAL generate_series(
+                    ((least(c.check_in, c.check_out) AT TIME ZONE 'UTC')
+                        AT TIME ZONE %(tz)s)::date,
+                    ((greatest(c.check_in, c.check_out) AT TIME ZONE 'UTC')
+                        AT TIME ZONE %(tz)s)::date,
+                    interval '1 day') AS d(day) ON true
+        """, {'tz': tz})
+        changes = self._cr.fetchall()
+        if not changes:
+            return True
+        if any(zone_id is None for zone_id, __ in changes):
+            self._cr.execute("DELETE FROM paintball_zone_occupancy")
+            self._cr.execute("""
+                SELECT DISTINCT lines.zone_id, d.day::date
+                  FROM (SELECT zone_id, check_in, check_out
+                          FROM paintball_zone_reservation_line
+                         UNION
+                        SELECT zone_id, check_in, check_out
+                          FROM folio_zone_line
+                         UNION
+                        SELECT z.id, pfl.checkin_date, pfl.checkout_date
+                          FROM paintball_folio_line pfl
+                          JOIN sale_order_line sol
+                            ON sol.id = pfl.order_line_id
+                          JOIN paintball_zone z
+                            ON z.product_id = sol.product_id) AS lines
+            CROSS JOIN LATERAL generate_series(
+                        ((lines.check_in AT TIME ZONE 'UTC')
+                            AT TIME ZONE %(tz)s)::date,
+                        ((lines.check_out AT TIME ZONE 'UTC')
+                            AT TIME ZONE %(tz)s)::date,
+                        interval '1 day') AS d(day)
+                 WHERE lines.zone_id IS NOT NULL
+            """, {'tz': tz})
+            pairs = self._cr.fetchall()
+        else:
+            pairs = sorted(change for change in changes if change[1])
+            zone_only = set(zone_id for zone_id, day in changes if not day)
+            if zone_only:
+                self._cr.execute("""
+                    UPDATE paintball_zone_occupancy o
+                       SET area_id = z.area_id, categ_id = z.categ_id
+                      FROM paintball_zone z
+                     WHERE z.id = o.zone_id AND o.zone_id IN %s
+                """, (tuple(zone_only),))
+        for index in range(0, len(pairs), batch_size):
+            chunk = pairs[index:index + batch_size]
+            self._refresh_days([pair[0] for pair in chunk],
+                               [pair[1] for pair in chunk], tz)
+        self.invalidate_cache()
         return True
 
 
@@ -804,162 +1531,341 @@ class ZoneReservationSummary(models.Model):
                 'target': 'new',
                 }
 
+    def init(self):
+        # Zones and periods whose summary changed, per transaction. Used by
+        # every worker to drop the stale parts of its cached grids.
+        self._cr.execute("""
+            CREATE TABLE IF NOT EXISTS zone_summary_invalidation (
+                id serial PRIMARY KEY,
+                txid bigint NOT NULL,
+                zone_id integer,
+                check_in timestamp,
+                check_out timestamp,
+                create_date timestamp NOT NULL DEFAULT (now() at time zone 'UTC')
+            )
+        """)
+        self._cr.execute("""
+            CREATE INDEX IF NOT EXISTS zone_summary_invalidation_txid_idx
+            ON zone_summary_invalidation (txid)
+        """)
+
+    @api.model
+    def _invalidate_zone_summary(self, changes):
+        """
+        Record that the summary of some zones changed over a period.
+        ---------------------------------------------------------------
+        @param self: The object pointer
+        @param changes: list of (zone_id, check_in, check_out) tuples, a
+                        missing zone invalidates all the zones and a
+                        missing period all the days.
+        """
+        changes = set(changes)
+        if not changes:
+            return
+        query = """
+            INSERT INTO zone_summary_invalidation
+                (txid, zone_id, check_in, check_out)
+            VALUES %s
+        """ % ', '.join(['(txid_current(), %s, %s, %s)'] * len(changes))
+        self._cr.execute(query, [value for change in changes
+                                 for value in change])
+        # Grids computed from now on see uncommitted data.
+        self._cr.cache['zone_summary_dirty'] = True
+
+    @api.model
+    def _gc_zone_summary_invalidation(self):
+        """
+        Remove the invalidations older than any cached grid.
+        """
+        self._cr.execute("""
+            DELETE FROM zone_summary_invalidation
+             WHERE create_date < (now() at time zone 'UTC') - %s * interval '1 second'
+        """, (2 * ZONE_SUMMARY_CACHE_MAX_AGE,))
+
+    @api.model
+    def _get_cached_zone_summary_grid(self, date_from, date_to, tz_name=None):
+        """
+        Same as _get_zone_summary_grid() but served from the grids cached
+        by this worker. Only the zones invalidated since a grid was
+        computed are computed again.
+        ---------------------------------------------------------------
+        @param self: The object pointer
+        @param date_from: start of the summary period (UTC)
+        @param date_to: end of the summary period (UTC)
+        @param tz_name: timezone in which days are computed
+        @return: dictionary, see _get_zone_summary_grid()
+        """
+        company = self.env.user.company_id
+        key = (self._cr.dbname, date_from, date_to, tz_name or 'UTC',
+               company.id, company.additional_hours,
+               self._context.get('lang'))
+        self._cr.execute("SELECT txid_snapshot_xmin(txid_current_snapshot())")
+        xmin = self._cr.fetchone()[0]
+        entry = ZONE_SUMMARY_CACHE.get(key)
+        if entry and time.time() - entry['time'] > ZONE_SUMMARY_CACHE_MAX_AGE:
+            entry = None
+        zone_ids = None
+        if entry:
+            grid = entry['grid']
+            dates = grid['dates']
+            self._cr.execute("""
+                SELECT DISTINCT zone_id
+                  FROM zone_summary_invalidation
+                 WHERE txid >= %s
+                   AND (check_in IS NULL
+                        OR tsrange(check_in, check_out, '[]')
+                           && tsrange(%s::timestamp - interval '1 day', %s, '[]'))
+            """, (entry['xmin'], dates and dates[0] or date_from,
+                  dates and dates[-1] or date_to))
+            zone_ids = [row[0] for row in self._cr.fetchall()]
+            if None in zone_ids:
+                entry = None
+        if not entry:
+            grid = self._get_zone_summary_grid(date_from, date_to, tz_name)
+            self._gc_zone_summary_invalidation()
+        elif zone_ids:
+            changed = self._get_zone_summary_grid(date_from, date_to, tz_name,
+                                                  zone_ids=zone_ids)
+            rows = dict((zone['id'], zone) for zone in changed['zones'])
+            zones = [rows.pop(zone['id'], zone) for zone in grid['zones']
+                     if zone['id'] not in zone_ids or zone['id'] in rows]
+            grid = dict(grid, zones=zones + list(rows.values()))
+        if not self._cr.cache.get('zone_summary_dirty'):
+            ZONE_SUMMARY_CACHE[key] = {
+                'xmin': xmin,
+                'time': entry['time'] if entry else time.time(),
+                'grid': grid,
+            }
+        return grid
+
+    @api.model
+    def _get_zone_summary_grid(self, date_from, date_to, tz_name=None,
+                               zone_ids=None):
+        """
+        Compute the zone x day reservation grid of the summary with two
+        aggregated queries, whatever the number of zones and days.
+        A day is reserved for a zone when an assigned reservation line or
+        a confirmed folio line covers the end of that day (23:59:59 in
+        the user timezone). A reservation ending during the day is still
+        shown on that day when the previous days of the stay are reserved
+        and the remaining hours reach the company additional hours.
+        ---------------------------------------------------------------
+        @param self: The object pointer
+        @param date_from: start of the summary period (UTC)
+        @param date_to: end of the summary period (UTC)
+        @param tz_name: timezone in which days are computed
+        @param zone_ids: only compute the rows of these zones
+        @return: dictionary with the header labels, the end of day of
+                 each column (UTC) and, per zone, the reserved columns.
+        """
+        timezone = pytz.timezone(tz_name or 'UTC')
+        d_frm_obj = date_from.replace(tzinfo=pytz.utc).astimezone(timezone)
+        d_to_obj = date_to.replace(tzinfo=pytz.utc).astimezone(timezone)
+        summary_header_list = ['Zones']
+        temp_date = d_frm_obj
+        while temp_date <= d_to_obj:
+            summary_header_list.append(temp_date.strftime("%a %b %d"))
+            temp_date = temp_date + timedelta(days=1)
+        ndays = len(summary_header_list) - 1
+        days_query = """
+            WITH days AS (
+                SELECT i AS idx,
+                       ((%(first_day)s::date + i) + time '23:59:59')
+                           AT TIME ZONE %(tz)s AT TIME ZONE 'UTC' AS eod
+                  FROM generate_series(0, %(ndays)s - 1) AS i
+            )
+        """
+        params = {'first_day': d_frm_obj.date(),
+                  'tz': timezone.zone,
+                  'ndays': ndays,
+                  'zone_ids': tuple(zone_ids or [0])}
+        zone_filter = zone_ids is not None and \
+            "AND {0}.zone_id IN %(zone_ids)s" or ""
+        # Zones directly occupied at the end of each day.
+        self._cr.execute(days_query + """,
+            busy AS (
+                SELECT zrl.zone_id, d.idx
+                  FROM days d
+                  JOIN paintball_zone_reservation_line zrl
+                    ON tsrange(zrl.check_in, zrl.check_out, '[]') @> d.eod
+                 WHERE zrl.state = 'assigned' """ + zone_filter.format('zrl') + """
+                 UNION
+                SELECT fzl.zone_id, d.idx
+                  FROM days d
+                  JOIN folio_zone_line fzl
+                    ON tsrange(fzl.check_in, fzl.check_out, '[]') @> d.eod
+                  JOIN paintball_folio pf ON pf.id = fzl.folio_id
+                  JOIN sale_order so ON so.id = pf.order_id
+                 WHERE so.state NOT IN ('draft', 'cancel') """ + zone_filter.format('fzl') + """
+            )
+            SELECT d.idx, d.eod,
+                   array_agg(b.zone_id) FILTER (WHERE b.zone_id IS NOT NULL)
+              FROM days d
+         LEFT JOIN busy b ON b.idx = d.idx
+          GROUP BY d.idx, d.eod
+          ORDER BY d.idx
+        """, params)
+        eods = []
+        busy = {}
+        for idx, eod, busy_zone_ids in self._cr.fetchall():
+            eods.append(eod)
+            for zone_id in busy_zone_ids or []:
+                busy.setdefault(zone_id, set()).add(idx)
+        # Reservations ending during the day (carry-over candidates).
+        self._cr.execute(days_query + """
+            SELECT zrl.zone_id, d.idx, zrl.check_in, zrl.check_out
+              FROM days d
+              JOIN paintball_zone_reservation_line zrl
+                ON tsrange(zrl.check_in, zrl.check_out, '[]')
+                   @> (d.eod - interval '1 day')
+             WHERE zrl.state = 'assigned' """ + zone_filter.format('zrl') + """
+          ORDER BY zrl.zone_id, d.idx, zrl.id
+        """, params)
+        carry_lines = {}
+        for zone_id, idx, check_in, check_out in self._cr.fetchall():
+            carry_lines.setdefault((zone_id, idx), []).append((check_in,
+                                                               check_out))
+        con_add = self.env.user.company_id.additional_hours
+        amin = abs(con_add * 60) if con_add > 0 else 0.0
+        zones_detail = []
+        zone_domain = zone_ids is not None and [('id', 'in', zone_ids)] or []
+        for zone in self.env['paintball.zone'].search(zone_domain):
+            reserved = set(busy.get(zone.id, ()))
+            for idx in range(ndays):
+                if idx in reserved or (zone.id, idx) not in carry_lines:
+                    continue
+                if not idx:
+                    reserved.add(idx)
+                    continue
+                is_reserved = False
+                for cid, cod in carry_lines[(zone.id, idx)]:
+                    dur = cod - cid
+                    count = len([j for j in reserved
+                                 if j < idx and cid <= eods[j] <= cod])
+                    if count - dur.days == 0:
+                        hr_dur = abs((dur.seconds / 60))
+                        if amin > 0:
+                            is_reserved = hr_dur >= amin
+                        else:
+                            is_reserved = hr_dur > 0
+                    else:
+                        is_reserved = False
+                if is_reserved:
+                    reserved.add(idx)
+            zones_detail.append({'id': zone.id,
+                                 'name': zone.name or '',
+                                 'reserved': sorted(reserved)})
+        return {'header': summary_header_list,
+                'dates': [eod.strftime(dt) for eod in eods],
+                'zones': zones_detail}
+
+    @api.model
+    def _encode_zone_states(self, reserved, ndays):
+        """
+        Run-length encode the reserved columns of a zone row.
+        Runs alternate between free and reserved days and always start
+        with a (possibly empty) run of free days.
+        ---------------------------------------------------------------
+        @param self: The object pointer
+        @param reserved: indexes of the reserved columns
+        @param ndays: number of columns of the grid
+        @return: list of run lengths
+        """
+        reserved = set(reserved)
+        runs = []
+        current = False
+        run = 0
+        for idx in range(ndays):
+            state = idx in reserved
+            if state != current:
+                runs.append(run)
+                current = state
+                run = 0
+            run += 1
+        runs.append(run)
+        return runs
+
+    @api.model
+    def _get_zone_summary_payload(self, grid):
+        """
+        Build the columnar payload sent to the Zone_Reservation widget:
+        the header labels, the date of each column, the zones as
+        [id, name] pairs and one run-length encoded state row per zone.
+        """
+        ndays = len(grid['dates'])
+        return {
+            'header': grid['header'],
+            'dates': grid['dates'],
+            'zones': [[zone['id'], zone['name']] for zone in grid['zones']],
+            'states': [self._encode_zone_states(zone['reserved'], ndays)
+                       for zone in grid['zones']],
+        }
+
+    @api.model
+    def get_summary_window(self, date_from, date_to):
+        """
+        Return the widget payload of another date window. Called by the
+        Zone_Reservation widget to load more days while scrolling.
+        ---------------------------------------------------------------
+        @param self: The object pointer
+        @param date_from: start of the window (UTC, server format)
+        @param date_to: end of the window (UTC, server format)
+        @return: dictionary, see _get_zone_summary_payload()
+        """
+        date_from = fields.Datetime.to_datetime(date_from)
+        date_to = fields.Datetime.to_datetime(date_to)
+        if date_from > date_to:
+            raise UserError(_('Please Check Time period Date From can\'t \
+                               be greater than Date To !'))
+        grid = self._get_cached_zone_summary_grid(date_from, date_to,
+                                                  self._context.get('tz'))
+        return self._get_zone_summary_payload(grid)
+
     @api.onchange('date_from', 'date_to')
+    @profiling.profiled
     def get_zone_summary(self):
         '''
         @param self: object pointer
          '''
         res = {}
-        all_detail = []
-        zone_obj = self.env['paintball.zone']
-        reservation_line_obj = self.env['paintball.zone.reservation.line']
-        folio_zone_line_obj = self.env['folio.zone.line']
-        user_obj = self.env['res.users']
-        date_range_list = []
-        main_header = []
-        summary_header_list = ['Zones']
         if self.date_from and self.date_to:
             if self.date_from > self.date_to:
                 raise UserError(_('Please Check Time period Date From can\'t \
                                    be greater than Date To !'))
-            if self._context.get('tz', False):
-                timezone = pytz.timezone(self._context.get('tz', False))
-            else:
-                timezone = pytz.timezone('UTC')
-            d_frm_obj = (self.date_from).replace(tzinfo=pytz.timezone('UTC')
-                                                 ).astimezone(timezone)
-            d_to_obj = (self.date_to).replace(tzinfo=pytz.timezone('UTC')
-                                              ).astimezone(timezone)
-            temp_date = d_frm_obj
-            while(temp_date <= d_to_obj):
-                val = ''
-                val = (str(temp_date.strftime("%a")) + ' ' +
-                       str(temp_date.strftime("%b")) + ' ' +
-                       str(temp_date.strftime("%d")))
-                summary_header_list.append(val)
-                date_range_list.append(temp_date.strftime
-                                       (dt))
-                temp_date = temp_date + timedelta(days=1)
-            all_detail.append(summary_header_list)
-            zone_ids = zone_obj.search([])
-            all_zone_detail = []
-            for zone in zone_ids:
-                zone_detail = {}
-                zone_list_stats = []
-                zone_detail.update({'name': zone.name or ''})
-                if not zone.zone_reservation_line_ids and \
-                   not zone.zone_line_ids:
-                    for chk_date in date_range_list:
-                        zone_list_stats.append({'state': 'Free',
-                                                'date': chk_date,
-                                                'zone_id': zone.id})
-                else:
-                    for chk_date in date_range_list:
-                        ch_dt = chk_date[:10] + ' 23:59:59'
-                        ttime = datetime.strptime(ch_dt, dt)
-                        c = ttime.replace(tzinfo=timezone).\
-                            astimezone(pytz.timezone('UTC'))
-                        chk_date = c.strftime(dt)
-                        reserline_ids = zone.zone_reservation_line_ids.ids
-                        reservline_ids = (reservation_line_obj.search
-                                          ([('id', 'in', reserline_ids),
-                                            ('check_in', '<=', chk_date),
-                                            ('check_out', '>=', chk_date),
-                                            ('state', '=', 'assigned')
-                                            ]))
-                        if not reservline_ids:
-                            sdt = dt
-                            chk_date = datetime.strptime(chk_date, sdt)
-                            chk_date = datetime.\
-                                strftime(chk_date - timedelta(days=1), sdt)
-                            reservline_ids = (reservation_line_obj.search
-                                              ([('id', 'in', reserline_ids),
-                                                ('check_in', '<=', chk_date),
-                                                ('check_out', '>=', chk_date),
-                                                ('state', '=', 'assigned')]))
-                            for res_zone in reservline_ids:
-                                cid = res_zone.check_in
-                                cod = res_zone.check_out
-                                dur = cod - cid
-                                if zone_list_stats:
-                                    count = 0
-                                    for rlist in zone_list_stats:
-                                        cidst = datetime.strftime(cid, dt)
-                                        codst = datetime.strftime(cod, dt)
-                                        rm_id = res_zone.zone_id.id
-                                        ci = rlist.get('date') >= cidst
-                                        co = rlist.get('date') <= codst
-                                        rm = rlist.get('zone_id') == rm_id
-                                        st = rlist.get('state') == 'Reserved'
-                                        if ci and co and rm and st:
-                                            count += 1
-                                    if count - dur.days == 0:
-                                        c_id1 = user_obj.browse(self._uid)
-                                        c_id = c_id1.company_id
-                                        con_add = 0
-                                        amin = 0.0
-                                        if c_id:
-                                            con_add = c_id.additional_hours
-#                                        When configured_addition_hours is
-#                                        greater than zero then we calculate
-#                                        additional minutes
-                                        if con_add > 0:
-                                            amin = abs(con_add * 60)
-                                        hr_dur = abs((dur.seconds / 60))
-#                                        When additional minutes is greater
-#                                        than zero then check duration with
-#                                        extra minutes and give the zone
-#                                        reservation status is reserved or
-#                                        free
-                                        if amin > 0:
-                                            if hr_dur >= amin:
-                                                reservline_ids = True
-                                            else:
-                                                reservline_ids = False
-                                        else:
-                                            if hr_dur > 0:
-                                                reservline_ids = True
-                                            else:
-                                                reservline_ids = False
-                                    else:
-                                        reservline_ids = False
-                        fol_zone_line_ids = zone.zone_line_ids.ids
-                        chk_state = ['draft', 'cancel']
-                        folio_resrv_ids = (folio_zone_line_obj.search
-                                           ([('id', 'in', fol_zone_line_ids),
-                                             ('check_in', '<=', chk_date),
-                                             ('check_out', '>=', chk_date),
-                                             ('status', 'not in', chk_state)
-                                             ]))
-                        if reservline_ids or folio_resrv_ids:
-                            zone_list_stats.append({'state': 'Reserved',
-                                                    'date': chk_date,
-                                                    'zone_id': zone.id,
-                                                    'is_draft': 'No',
-                                                    'data_model': '',
-                                                    'data_id': 0})
-                        else:
-                            zone_list_stats.append({'state': 'Free',
-                                                    'date': chk_date,
-                                                    'zone_id': zone.id})
-
-                zone_detail.update({'value': zone_list_stats})
-                all_zone_detail.append(zone_detail)
-            main_header.append({'header': summary_header_list})
-            self.summary_header = str(main_header)
-            self.zone_summary = str(all_zone_detail)
+            grid = self._get_cached_zone_summary_grid(
+                self.date_from, self.date_to, self._context.get('tz'))
+            payload = self._get_zone_summary_payload(grid)
+            self.summary_header = json.dumps(payload['header'],
+                                             separators=(',', ':'))
+            self.zone_summary = json.dumps(payload, separators=(',', ':'))
         return res
 
 
+class QuickZoneReservationSlot(models.TransientModel):
+    _name = 'quick.zone.reservation.slot'
+    _description = 'Quick Zone Reservation Slot'
+    _order = 'check_in, zone_id'
+
+    wizard_id = fields.Many2one('quick.zone.reservation', 'Quick Reservation',
+                                required=True, ondelete='cascade')
+    zone_id = fields.Many2one('paintball.zone', 'Zone', required=True)
+    check_in = fields.Datetime('Check In', required=True)
+    check_out = fields.Datetime('Check Out', required=True)
+
+
 class QuickZoneReservation(models.TransientModel):
     _name = 'quick.zone.reservation'
     _description = 'Quick Zone Reservation'
 
     partner_id = fields.Many2one('res.partner', string="Customer",
                                  required=True)
-    check_in = fields.Datetime('Check In', required=True)
-    check_out = fields.Datetime('Check Out', required=True)
-    zone_id = fields.Many2one('paintball.zone', 'Zone', required=True)
+    check_in = fields.Datetime('Check In')
+    check_out = fields.Datetime('Check Out')
+    zone_id = fields.Many2one('paintball.zone', 'Zone')
+    slot_ids = fields.One2many('quick.zone.reservation.slot', 'wizard_id',
+                               'Slots',
+                               help="Zones and periods to book together, in "
+                               "place of the zone and period above.")
     warehouse_id = fields.Many2one('stock.warehouse', 'Paintball', required=True)
     pricelist_id = fields.Many2one('product.pricelist', 'pricelist')
     partner_invoice_id = fields.Many2one('res.partner', 'Invoice Address',
@@ -1006,50 +1912,138 @@ class QuickZoneReservation(models.TransientModel):
             self.pricelist_id = self.partner_id.property_product_pricelist.id
 
     @api.model
-    def default_get(self, fields):
+    def default_get(self, fields_list):
         """
         To get default values for the object.
         @param self: The object pointer.
-        @param fields: List of fields for which we want default values
+        @param fields_list: List of fields for which we want default values
         @return: A dictionary which of fields with values.
         """
         if self._context is None:
             self._context = {}
-        res = super(QuickZoneReservation, self).default_get(fields)
+        res = super(QuickZoneReservation, self).default_get(fields_list)
         if self._context:
             keys = self._context.keys()
             if 'date' in keys:
-                res.update({'check_in': self._context['date']})
+                check_in, check_out = self._get_day_period(
+                    self._context['date'])
+                res.update({'check_in': check_in, 'check_out': check_out})
             if 'zone_id' in keys:
                 zoneid = self._context['zone_id']
                 res.update({'zone_id': int(zoneid)})
+            if self._context.get('cells') and 'slot_ids' in fields_list:
+                # cells selected on the zone summary: [zone_id, date]
+                slots = []
+                for zone_id, date in self._context['cells']:
+                    check_in, check_out = self._get_day_period(date)
+                    slots.append((0, 0, {
+                        'zone_id': int(zone_id),
+                        'check_in': check_in,
+                        'check_out': check_out,
+                    }))
+                res.update({'slot_ids': slots})
         return res
 
+    @api.model
+    def _get_day_period(self, date):
+        """
+        Return the period of a column of the zone summary, whose date is
+        the end of its local day, 23:59:59, in UTC.
+        -----------------------------------------------------
+        @param self: The object pointer
+        @param date: date of the column, as sent by the zone summary
+        @return: (check_in, check_out) strings, the UTC start and end of
+                 the local day
+        """
+        timezone = pytz.timezone(self._context.get('tz') or 'UTC')
+        eod = fields.Datetime.to_datetime(date)
+        day = pytz.utc.localize(eod).astimezone(timezone).date()
+        start = timezone.localize(datetime.combine(day, datetime.min.time()))
+        return (fields.Datetime.to_string(
+                    start.astimezone(pytz.utc).replace(tzinfo=None)),
+                fields.Datetime.to_string(eod))
+
+    def _get_cells(self):
+        """
+        Return the zones and periods booked by the wizard: its slots, or
+        its zone and period when it has no slot.
+        -----------------------------------------------------
+        @param self: The object pointer
+        @return: list of (zone, check_in, check_out) tuples
+        """
+        self.ensure_one()
+        if self.slot_ids:
+            cells = [(slot.zone_id, slot.check_in, slot.check_out)
+                     for slot in self.slot_ids]
+        else:
+            cells = [(self.zone_id, self.check_in, self.check_out)]
+        for zone, check_in, check_out in cells:
+            if not (zone and check_in and check_out):
+                raise ValidationError(_('Please select the zone, the check '
+                                        'in and the check out to book.'))
+            if check_out < check_in:
+                raise ValidationError(_('Checkout date should be greater \
+                                         than Checkin date.'))
+        return cells
+
+    def _check_cells(self, cells):
+        """
+        Check that the cells overlap neither each other nor the bookings
+        of their zones, with a single availability query.
+        -----------------------------------------------------
+        @param self: The object pointer
+        @param cells: list of (zone, check_in, check_out) tuples
+        @return: raise a warning listing the unavailable cells
+        """
+        for index, (zone, check_in, check_out) in enumerate(cells):
+            for other, other_in, other_out in cells[index + 1:]:
+                if other == zone and intervals.intersection(
+                        (check_in, check_out), (other_in, other_out)):
+                    raise ValidationError(_(
+                        'The zone %s is selected twice for overlapping '
+                        'periods.') % zone.name)
+        busy = self.env['paintball.zone']._get_busy_cells(
+            [(zone.id, check_in, check_out)
+             for zone, check_in, check_out in cells])
+        if busy:
+            raise ValidationError(_(
+                'These zones are not available anymore:\n%s') % '\n'.join(
+                    '%s: %s - %s' % (
+                        cells[index][0].name,
+                        fields.Datetime.to_string(cells[index][1]),
+                        fields.Datetime.to_string(cells[index][2]))
+                    for index in sorted(busy)))
 
     def zone_reserve(self):
         """
-        This method create a new record for paintball.reservation
+        This method create a new record for paintball.reservation, booking
+        all the zones and slots of the wizard at once.
         -----------------------------------------------------
         @param self: The object pointer
         @return: new record set for paintball reservation.
         """
         paintball_res_obj = self.env['paintball.reservation']
         for res in self:
+            cells = res._get_cells()
+            res._check_cells(cells)
             rec = (paintball_res_obj.create
                    ({'partner_id': res.partner_id.id,
                      'partner_invoice_id': res.partner_invoice_id.id,
                      'partner_order_id': res.partner_order_id.id,
                      'partner_shipping_id': res.partner_shipping_id.id,
-                     'checkin': res.check_in,
-                     'checkout': res.check_out,
+                     'checkin': min(cell[1] for cell in cells),
+                     'checkout': max(cell[2] for cell in cells),
                      'warehouse_id': res.warehouse_id.id,
                      'pricelist_id': res.pricelist_id.id,
                      'adults': res.adults,
                      'reservation_line': [(0, 0,
-                                           {'reserve': [(6, 0,
-                                                         [res.zone_id.id])],
-                                            'name': (res.zone_id and
-                                                     res.zone_id.name or '')
-                                            })]
+                                           {'reserve': [(6, 0, [zone.id])],
+                                            'categ_id': zone.categ_id.id,
+                                            'name': zone.name or '',
+                                            'check_in': check_in,
+                                            'check_out': check_out,
+                                            })
+                                          for zone, check_in, check_out
+                                          in cells]
                      }))
-        return rec
\ No newline at end of file
+        return rec
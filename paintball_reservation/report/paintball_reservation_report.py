@@ -1,60 +1,123 @@
 # See LICENSE file for full copyright and licensing details.
 
 import time
-from datetime import datetime
+from datetime import datetime, time as dtime
 from dateutil.relativedelta import relativedelta
 from odoo import api, fields, models
-from odoo.tools import DEFAULT_SERVER_DATETIME_FORMAT
+from odoo.addons.paintball.tools import profiling
+
+
+class ReportReservationDataset(models.AbstractModel):
+    _name = "report.paintball_reservation.dataset"
+    _description = 'Reservations shared by the reservation reports'
+
+    @api.model
+    def _get_period(self, data):
+        """
+        Return the (start, end) datetimes of the report period.
+        @param self: The object pointer
+        @param data: report data, the period is read in data['form']
+        """
+        form = (data or {}).get('form') or {}
+        date_start = form.get('date_start')
+        date_end = form.get('date_end')
+        if date_start:
+            date_start = fields.Datetime.to_datetime(date_start)
+        else:
+            date_start = datetime.combine(fields.Date.today(), dtime.min)
+        if date_end:
+            date_end = fields.Datetime.to_datetime(date_end)
+        else:
+            date_end = datetime.combine(
+                fields.Date.today() + relativedelta(months=+1, day=1,
+                                                    days=-1), dtime.max)
+        return date_start, date_end
+
+    @api.model
+    def _get_dataset(self, date_start, date_end, reservation_ids=None):
+        """
+        Return the reservations of the period, read once per transaction
+        for all the reports printed for it, with the data displayed by
+        the report templates prefetched.
+        @param self: The object pointer
+        @param date_start: start of the period
+        @param date_end: end of the period
+        @param reservation_ids: reservations already selected for this
+                                period by a previous print, if any
+        @return: dictionary of reservation record sets:
+                 'checkin': checking in during the period,
+                 'checkout': checking out during the period,
+                 'period': staying within the period.
+        """
+        memo = self._cr.cache.setdefault('paintball_reservation_report', {})
+        key = (date_start, date_end, self.env.uid,
+               tuple(self._context.get('allowed_company_ids') or ()),
+               tuple(reservation_ids) if reservation_ids is not None else None)
+        if key not in memo:
+            reservation_obj = self.env['paintball.reservation']
+            if reservation_ids is not None:
+                reservations = reservation_obj.browse(reservation_ids).exists()
+            else:
+                reservations = reservation_obj.search([
+                    '|',
+                    '&', ('checkin', '>=', date_start),
+                    ('checkin', '<=', date_end),
+                    '&', ('checkout', '>=', date_start),
+                    ('checkout', '<=', date_end)])
+            lines = reservations.mapped('reservation_line')
+            reservations.mapped('partner_id.name')
+            lines.mapped('categ_id.name')
+            lines.mapped('reserve.name')
+            memo[key] = {
+                'checkin': reservations.filtered(
+                    lambda r: date_start <= r.checkin <= date_end),
+                'checkout': reservations.filtered(
+                    lambda r: date_start <= r.checkout <= date_end),
+                'period': reservations.filtered(
+                    lambda r: r.checkin >= date_start and
+                    r.checkout <= date_end),
+            }
+        return dict((name, records.with_env(self.env))
+                    for name, records in memo[key].items())
+
+    @api.model
+    def _get_report_dataset(self, data):
+        """
+        Return the period and the dataset of a report rendering.
+        """
+        date_start, date_end = self._get_period(data)
+        form = (data or {}).get('form') or {}
+        reservation_ids = form.get('reservation_ids') or None
+        dataset = self._get_dataset(date_start, date_end, reservation_ids)
+        return date_start, date_end, dataset
 
 
 class ReportTestCheckin(models.AbstractModel):
     _name = "report.paintball_reservation.report_checkin_qweb"
     _description = 'Auxiliar to get the check in report'
 
-    def _get_zone_type(self, date_start, date_end):
-        reservation_obj = self.env['paintball.reservation']
-        zone_dom = [('checkin', '>=', date_start),
-                    ('checkout', '<=', date_end)]
-        res = reservation_obj.search(zone_dom)
-        return res
-
-    def _get_zone_nos(self, date_start, date_end):
-        reservation_obj = self.env['paintball.reservation']
-        res = reservation_obj.search([('checkin', '>=', date_start),
-                                      ('checkout', '<=', date_end)])
-        return res
-
-    def get_checkin(self, date_start, date_end):
-        reservation_obj = self.env['paintball.reservation']
-        res = reservation_obj.search([('checkin', '>=', date_start),
-                                      ('checkin', '<=', date_end)])
-        return res
-
     @api.model
+    @profiling.profiled
     def _get_report_values(self, docids, data):
         self.model = self.env.context.get('active_model')
         if data is None:
             data = {}
+        form = data.get('form') or {}
         if not docids:
-            docids = data['form'].get('docids')
+            docids = form.get('docids')
         folio_profile = self.env['paintball.reservation'].browse(docids)
-        date_start = data.get('date_start', fields.Date.today())
-        date_end = data['form'].get('date_end', str(datetime.now() +
-                                    relativedelta(months=+1,
-                                                  day=1, days=-1))[:10])
-        rm_act = self.with_context(data['form'].get('used_context', {}))
-        _get_zone_type = rm_act._get_zone_type(date_start, date_end)
-        _get_zone_nos = rm_act._get_zone_nos(date_start, date_end)
-        get_checkin = rm_act.get_checkin(date_start, date_end)
+        rm_act = self.env['report.paintball_reservation.dataset'].with_context(
+            form.get('used_context', {}))
+        date_start, date_end, dataset = rm_act._get_report_dataset(data)
         return {
             'doc_ids': docids,
             'doc_model': self.model,
-            'data': data['form'],
+            'data': form,
             'docs': folio_profile,
             'time': time,
-            'get_zone_type': _get_zone_type,
-            'get_zone_nos': _get_zone_nos,
-            'get_checkin': get_checkin,
+            'get_zone_type': dataset['period'],
+            'get_zone_nos': dataset['period'],
+            'get_checkin': dataset['checkin'],
         }
 
 
@@ -62,49 +125,28 @@ class ReportTestCheckout(models.AbstractModel):
     _name = "report.paintball_reservation.report_checkout_qweb"
     _description = 'Auxiliar to get the check out report'
 
-    def _get_zone_type(self, date_start, date_end):
-        reservation_obj = self.env['paintball.reservation']
-        res = reservation_obj.search([('checkout', '>=', date_start),
-                                      ('checkout', '<=', date_end)])
-        return res
-
-    def _get_zone_nos(self, date_start, date_end):
-        reservation_obj = self.env['paintball.reservation']
-        res = reservation_obj.search([('checkout', '>=', date_start),
-                                      ('checkout', '<=', date_end)])
-        return res
-
-    def _get_checkout(self, date_start, date_end):
-        reservation_obj = self.env['paintball.reservation']
-        res = reservation_obj.search([('checkout', '>=', date_start),
-                                      ('checkout', '<=', date_end)])
-        return res
-
     @api.model
+    @profiling.profiled
     def _get_report_values(self, docids, data):
         self.model = self.env.context.get('active_model')
         if data is None:
             data = {}
+        form = data.get('form') or {}
         if not docids:
-            docids = data['form'].get('docids')
+            docids = form.get('docids')
         folio_profile = self.env['paintball.reservation'].browse(docids)
-        date_start = data.get('date_start', fields.Date.today())
-        date_end = data['form'].get('date_end', str(datetime.now() +
-                                    relativedelta(months=+1,
-                                                  day=1, days=-1))[:10])
-        rm_act = self.with_context(data['form'].get('used_context', {}))
-        _get_zone_type = rm_act._get_zone_type(date_start, date_end)
-        _get_zone_nos = rm_act._get_zone_nos(date_start, date_end)
-        _get_checkout = rm_act._get_checkout(date_start, date_end)
+        rm_act = self.env['report.paintball_reservation.dataset'].with_context(
+            form.get('used_context', {}))
+        date_start, date_end, dataset = rm_act._get_report_dataset(data)
         return {
             'doc_ids': docids,
             'doc_model': self.model,
-            'data': data['form'],
+            'data': form,
             'docs': folio_profile,
             'time': time,
-            'get_zone_type': _get_zone_type,
-            'get_zone_nos': _get_zone_nos,
-            'get_checkout': _get_checkout,
+            'get_zone_type': dataset['checkout'],
+            'get_zone_nos': dataset['checkout'],
+            'get_checkout': dataset['checkout'],
         }
 
 
@@ -112,75 +154,102 @@ class ReportTestMaxzone(models.AbstractModel):
     _name = "report.paintball_reservation.report_maxzone_qweb"
     _description = 'Auxiliar to get the zone report'
 
-    def _get_zone_type(self, date_start, date_end):
-        reservation_obj = self.env['paintball.reservation']
-        tids = reservation_obj.search([('checkin', '>=', date_start),
-                                       ('checkout', '<=', date_end)])
-        res = reservation_obj.browse(tids)
-        return res
-
-    def _get_zone_nos(self, date_start, date_end):
-        reservation_obj = self.env['paintball.reservation']
-        tids = reservation_obj.search([('checkin', '>=', date_start),
-                                       ('checkout', '<=', date_end)])
-        res = reservation_obj.browse(tids)
-        return res
-
-    def _get_data(self, date_start, date_end):
-        reservation_obj = self.env['paintball.reservation']
-        res = reservation_obj.search([('checkin', '>=', date_start),
-                                      ('checkout', '<=', date_end)])
-        return res
-
-    def _get_zone_used_detail(self, date_start, date_end):
+    def _get_zone_usage(self, date_start, date_end):
+        """
+        Compute, in one aggregated query over the zone reservation lines
+        and the lines of the folios that are not cancelled, how many
+        times each zone is used during the period and for how many hours.
+        @param self: The object pointer
+        @param date_start: start of the period
+        @param date_end: end of the period
+        @return: list of (zone_id, no_of_times_used, hours) tuples
+        """
+        self.env['paintball.zone.reservation.line'].flush()
+        self.env['folio.zone.line'].flush()
+        self._cr.execute("""
+            WITH lines AS (
+                SELECT zrl.zone_id, zrl.check_in, zrl.check_out
+                  FROM paintball_zone_reservation_line zrl
+                 WHERE tsrange(zrl.check_in, zrl.check_out, '[]')
+                       && tsrange(%(start)s, %(end)s, '[]')
+                 UNION ALL
+                SELECT fzl.zone_id, fzl.check_in, fzl.check_out
+                  FROM folio_zone_line fzl
+                  JOIN paintball_folio pf ON pf.id = fzl.folio_id
+                  JOIN sale_order so ON so.id = pf.order_id
+                 WHERE so.state IS DISTINCT FROM 'cancel'
+                   AND tsrange(fzl.check_in, fzl.check_out, '[]')
+                       && tsrange(%(start)s, %(end)s, '[]')
+            )
+            SELECT zone_id, count(*),
+                   sum(extract(epoch FROM least(check_out, %(end)s)
+                                          - greatest(check_in, %(start)s)))
+                   / 3600.0
+              FROM lines
+             WHERE zone_id IS NOT NULL
+          GROUP BY zone_id
+        """, {'start': date_start, 'end': date_end})
+        return self._cr.fetchall()
+
+    def _get_zone_used_detail(self, date_start, date_end, groupby=None):
+        """
+        Return the usage statistics of the zones used during the period,
+        most used first, optionally grouped by zone category or area.
+        @param self: The object pointer
+        @param date_start: start of the period
+        @param date_end: end of the period
+        @param groupby: False, 'categ_id' or 'area_id'
+        @return: list of dictionaries with the zone name, the number of
+                 times it is used, its occupied hours and occupancy
+                 percentage, and its group
+        """
+        period_hours = (date_end - date_start).total_seconds() / 3600.0
+        usage = dict((zone_id, (count, hours)) for zone_id, count, hours in
+                     self._get_zone_usage(date_start, date_end))
+        zones = self.env['paintball.zone'].browse(list(usage))
         zone_used_details = []
-        paintball_zone_obj = self.env['paintball.zone']
-        zone_ids = paintball_zone_obj.search([])
-        for zone in paintball_zone_obj.browse(zone_ids.ids):
-            counter = 0
-            details = {}
-            if zone.zone_reservation_line_ids:
-                end_date = datetime.strptime(date_end,
-                                             DEFAULT_SERVER_DATETIME_FORMAT)
-                start_date = datetime.strptime(date_start,
-                                               DEFAULT_SERVER_DATETIME_FORMAT)
-                for zone_resv_line in zone.zone_reservation_line_ids:
-                    if(zone_resv_line.check_in >= start_date and
-                       zone_resv_line.check_in <= end_date):
-                        counter += 1
-            if counter >= 1:
-                details.update({'name': zone.name or '',
-                                'no_of_times_used': counter})
-                zone_used_details.append(details)
+        for zone in zones:
+            count, hours = usage[zone.id]
+            group = zone[groupby] if groupby in ('categ_id', 'area_id') \
+                else False
+            zone_used_details.append({
+                'name': zone.name or '',
+                'group': group and group.display_name or '',
+                'no_of_times_used': count,
+                'hours': round(hours or 0.0, 2),
+                'percentage': round(min(100.0, (hours or 0.0) * 100.0 /
+                                        period_hours), 2)
+                if period_hours > 0 else 0.0,
+            })
+        zone_used_details.sort(key=lambda detail: (
+            detail['group'], -detail['no_of_times_used'], detail['name']))
         return zone_used_details
 
     @api.model
+    @profiling.profiled
     def _get_report_values(self, docids, data):
         self.model = self.env.context.get('active_model')
         if data is None:
             data = {}
+        form = data.get('form') or {}
         if not docids:
-            docids = data['form'].get('docids')
+            docids = form.get('docids')
         folio_profile = self.env['paintball.reservation'].browse(docids)
-        date_start = data['form'].get('date_start', fields.Date.today())
-        date_end = data['form'].get('date_end', str(datetime.now() +
-                                    relativedelta(months=+1,
-                                                  day=1, days=-1))[:10])
-        rm_act = self.with_context(data['form'].get('used_context', {}))
-        _get_zone_type = rm_act._get_zone_type(date_start, date_end)
-        _get_zone_nos = rm_act._get_zone_nos(date_start, date_end)
-        _get_data = rm_act._get_data(date_start, date_end)
-        _get_zone_used_detail = rm_act._get_zone_used_detail(date_start,
-                                                             date_end)
+        rm_act = self.env['report.paintball_reservation.dataset'].with_context(
+            form.get('used_context', {}))
+        date_start, date_end, dataset = rm_act._get_report_dataset(data)
+        _get_zone_used_detail = self.with_context(
+            form.get('used_context', {}))._get_zone_used_detail(
+                date_start, date_end, form.get('groupby'))
         return {
             'doc_ids': docids,
             'doc_model': self.model,
-            'data': data['form'],
+            'data': form,
             'docs': folio_profile,
             'time': time,
-            'get_zone_type': _get_zone_type,
-            'get_zone_nos': _get_zone_nos,
-            'get_data': _get_data,
+            'get_zone_type': dataset['period'],
+            'get_zone_nos': dataset['period'],
+            'get_data': dataset['period'],
             'get_zone_used_detail': _get_zone_used_detail,
         }
 
@@ -189,49 +258,26 @@ class ReportTestRoomres(models.AbstractModel):
     _name = "report.paintball_reservation.report_zoneres_qweb"
     _description = 'Auxiliar to get the zone report'
 
-    def _get_zone_type(self, date_start, date_end):
-        reservation_obj = self.env['paintball.reservation']
-        tids = reservation_obj.search([('checkin', '>=', date_start),
-                                       ('checkout', '<=', date_end)])
-        res = reservation_obj.browse(tids)
-        return res
-
-    def _get_zone_nos(self, date_start, date_end):
-        reservation_obj = self.env['paintball.reservation']
-        tids = reservation_obj.search([('checkin', '>=', date_start),
-                                       ('checkout', '<=', date_end)])
-        res = reservation_obj.browse(tids)
-        return res
-
-    def _get_data(self, date_start, date_end):
-        reservation_obj = self.env['paintball.reservation']
-        res = reservation_obj.search([('checkin', '>=', date_start),
-                                      ('checkout', '<=', date_end)])
-        return res
-
     @api.model
+    @profiling.profiled
     def _get_report_values(self, docids, data):
         self.model = self.env.context.get('active_model')
         if data is None:
             data = {}
+        form = data.get('form') or {}
         if not docids:
-            docids = data['form'].get('docids')
+            docids = form.get('docids')
         folio_profile = self.env['paintball.reservation'].browse(docids)
-        date_start = data.get('date_start', fields.Date.today())
-        date_end = data['form'].get('date_end', str(datetime.now() +
-                                    relativedelta(months=+1,
-                                                  day=1, days=-1))[:10])
-        rm_act = self.with_context(data['form'].get('used_context', {}))
-        _get_zone_type = rm_act._get_zone_type(date_start, date_end)
-        _get_zone_nos = rm_act._get_zone_nos(date_start, date_end)
-        _get_data = rm_act._get_data(date_start, date_end)
+        rm_act = self.env['report.paintball_reservation.dataset'].with_context(
+            form.get('used_context', {}))
+        date_start, date_end, dataset = rm_act._get_report_dataset(data)
         return {
             'doc_ids': docids,
             'doc_model': self.model,
-            'data': data['form'],
+            'data': form,
             'docs': folio_profile,
             'time': time,
-            'get_zone_type': _get_zone_type,
-            'get_zone_nos': _get_zone_nos,
-            'get_data': _get_data,
+            'get_zone_type': dataset['period'],
+            'get_zone_nos': dataset['period'],
+            'get_data': dataset['period'],
         }
@@ -3,17 +3,39 @@ odoo.define('paintball_reservation.paintball_zone_summary', function (require) {
 
 var core = require('web.core');
 var registry = require('web.field_registry');
+var session = require('web.session');
 var _t = core._t;
 var basicFields = require('web.basic_fields');
 
 var FieldText = basicFields.FieldText;
-var InputField = basicFields.InputField;
 var QWeb = core.qweb;
 
+var SERVER_FORMAT = 'YYYY-MM-DD HH:mm:ss';
+
+/**
+ * Zone x day reservation grid.
+ *
+ * Only the rows and columns visible in the viewport are rendered, the
+ * rest of the grid is represented by the size of an empty canvas. More
+ * days are loaded from the server when the user scrolls close to either
+ * end of the loaded period, and the adjacent windows are prefetched so
+ * that they are usually available before they are needed.
+ *
+ * Several free cells, of one or many zones, can be selected with
+ * Ctrl+click and booked together in a single quick reservation.
+ */
 var MyWidget = FieldText.extend({
     events: _.extend({}, FieldText.prototype.events, {
-        'change': '_onFieldChanged',
+        'click .table_free': '_onFreeCellClicked',
+        'click .o_zone_summary_book': '_onBookSelectionClicked',
     }),
+    ROW_HEIGHT: 32,
+    CELL_WIDTH: 100,
+    NAME_WIDTH: 150,
+    OVERSCAN: 5,
+    WINDOW_DAYS: 30,
+    THRESHOLD: 10,
+
 	init: function () {
     	this._super.apply(this, arguments);
     	if (this.mode === 'edit') {
@@ -25,53 +47,335 @@ var MyWidget = FieldText.extend({
             summary_header: false,
             zone_summary: false,
         });
-        this.set({"summary_header": py.eval(this.recordData.summary_header)});
-        this.set({"zone_summary":py.eval(this.recordData.zone_summary )});
+        this.load_summary();
+    },
+    /**
+     * Parse the JSON payload of the zone_summary field and reset the
+     * loaded period to the one of the form.
+     */
+    load_summary: function () {
+        var summary = this.recordData.zone_summary ?
+            JSON.parse(this.recordData.zone_summary) : false;
+        this.zones = [];
+        this.dates = [];
+        this.states = {};
+        this._nextWindow = null;
+        this._previousWindow = null;
+        this._loading = {};
+        this.selection = {};
+        if (!summary || !summary.zones) {
+            this.set({"summary_header": false, "zone_summary": false});
+            return;
+        }
+        this.zones = _.map(summary.zones, function (zone) {
+            return {id: zone[0], name: zone[1]};
+        });
+        this._addWindow(summary, false);
+        this.set({"summary_header": summary.header, "zone_summary": this.zones});
+    },
+    /**
+     * Merge a window payload into the loaded grid.
+     *
+     * @param {Object} summary payload returned by the server
+     * @param {boolean} prepend whether the window precedes the loaded days
+     * @returns {integer} number of days added
+     */
+    _addWindow: function (summary, prepend) {
+        var self = this;
+        var first = this.dates.length ? this.dates[0].date : false;
+        var last = this.dates.length ? this.dates[this.dates.length - 1].date : false;
+        var keep = _.map(summary.dates, function (date) {
+            return prepend ? !first || date < first : !last || date > last;
+        });
+        var dates = [];
+        _.each(summary.dates, function (date, index) {
+            if (keep[index]) {
+                dates.push({date: date, label: summary.header[index + 1]});
+            }
+        });
+        var rows = {};
+        _.each(summary.zones, function (zone, index) {
+            var cells = [];
+            var reserved = false;
+            _.each(summary.states[index], function (run) {
+                for (var i = 0; i < run; i++) {
+                    cells.push(reserved);
+                }
+                reserved = !reserved;
+            });
+            rows[zone[0]] = _.filter(cells, function (cell, i) {
+                return keep[i];
+            });
+        });
+        _.each(this.zones, function (zone) {
+            var cells = rows[zone.id] || _.map(dates, function () {
+                return false;
+            });
+            var current = self.states[zone.id] || [];
+            self.states[zone.id] = prepend ? cells.concat(current) : current.concat(cells);
+        });
+        this.dates = prepend ? dates.concat(this.dates) : this.dates.concat(dates);
+        return dates.length;
     },
     start: function() {
         var self = this;
         if (self.setting)
             return;
-        
+
         if (! this.get("summary_header") || ! this.get("zone_summary"))
                return
-               
+
         this.renderElement();
         this.view_loading();
      },
-     initialize_field: function() {
-         FormView.ReinitializeWidgetMixin.initialize_field.call(this);
-         var self = this;
-         self.on("change:summary_header", self, self.start);
-         self.on("change:zone_summary", self, self.start);
-     },
      view_loading: function(r) {
          return this.load_form(r);
      },
 
      load_form: function(data) {
-         var self = this
-         this.$el.find(".table_free").bind("click", function(event){
-             self.do_action({
-                     type: 'ir.actions.act_window',
-                     res_model: "quick.zone.reservation",
-                     views: [[false, 'form']],
-                     target: 'new',
-                     context: {"zone_id": $(this).attr("data"), 'date': $(this).attr("date"), 'default_adults': 1},
-             });
-         });
+         this.$viewport = this.$('.o_zone_summary_viewport');
+         this.$viewport.on('scroll', this._onScroll.bind(this));
+         this._renderCanvas();
+         this._renderWindow();
+         this._renderToolbar();
+         this._prefetch();
      },
      renderElement: function() {
          this._super();
          this.$el.html(QWeb.render("ZoneSummary", {widget: this}));
     },
+    _render: function () {
+        this.load_summary();
+        this.renderElement();
+        this.view_loading();
+    },
     _onFieldChanged: function (event) {
     	this._super();
         this.lastChangeEvent = event;
-    	this.set({"summary_header": py.eval(this.recordData.summary_header)});
-        this.set({"zone_summary":py.eval(this.recordData.zone_summary)});
-        this.renderElement();
-        this.view_loading();
+        this._render();
+    },
+
+    //--------------------------------------------------------------------------
+    // Virtual rendering
+    //--------------------------------------------------------------------------
+
+    /**
+     * Size the canvas like the full grid so that the scrollbars reflect
+     * all the loaded zones and days.
+     */
+    _renderCanvas: function () {
+        if (!this.$viewport || !this.$viewport.length) {
+            return;
+        }
+        this.$('.o_zone_summary_canvas').css({
+            width: this.NAME_WIDTH + this.dates.length * this.CELL_WIDTH,
+            height: (this.zones.length + 1) * this.ROW_HEIGHT,
+        });
+    },
+    /**
+     * Render the slice of the grid visible in the viewport.
+     *
+     * @param {boolean} force render even if the visible slice is unchanged
+     */
+    _renderWindow: function (force) {
+        if (!this.$viewport || !this.$viewport.length) {
+            return;
+        }
+        var self = this;
+        var scrollTop = this.$viewport.scrollTop();
+        var scrollLeft = this.$viewport.scrollLeft();
+        var firstRow = Math.max(0, Math.floor(scrollTop / this.ROW_HEIGHT) - this.OVERSCAN);
+        var lastRow = Math.min(this.zones.length,
+            Math.ceil((scrollTop + this.$viewport.height()) / this.ROW_HEIGHT) + this.OVERSCAN);
+        var firstCol = Math.max(0, Math.floor(scrollLeft / this.CELL_WIDTH) - this.OVERSCAN);
+        var lastCol = Math.min(this.dates.length,
+            Math.ceil((scrollLeft + this.$viewport.width()) / this.CELL_WIDTH) + this.OVERSCAN);
+        var slice = [firstRow, lastRow, firstCol, lastCol, this.dates.length].join(',');
+        if (!force && slice === this._slice) {
+            return;
+        }
+        this._slice = slice;
+        var dates = this.dates.slice(firstCol, lastCol);
+        var zones = _.map(this.zones.slice(firstRow, lastRow), function (zone) {
+            var states = self.states[zone.id].slice(firstCol, lastCol);
+            return {
+                id: zone.id,
+                name: zone.name,
+                cells: _.map(states, function (reserved, index) {
+                    return {
+                        reserved: reserved,
+                        date: dates[index].date,
+                        selected: !!self.selection[zone.id + '|' + dates[index].date],
+                    };
+                }),
+            };
+        });
+        this.$('.o_zone_summary_window').remove();
+        this.$('.o_zone_summary_canvas').append(QWeb.render("ZoneSummary.Window", {
+            widget: this,
+            dates: dates,
+            zones: zones,
+            top: firstRow * this.ROW_HEIGHT,
+            left: firstCol * this.CELL_WIDTH,
+        }));
+    },
+    /**
+     * Show the number of selected cells on the booking button.
+     */
+    _renderToolbar: function () {
+        var count = _.size(this.selection);
+        this.$('.o_zone_summary_book')
+            .prop('disabled', !count)
+            .text(_.str.sprintf(_t("Book selection (%s)"), count));
+    },
+
+    //--------------------------------------------------------------------------
+    // Lazy loading of date windows
+    //--------------------------------------------------------------------------
+
+    /**
+     * @param {string} dateFrom
+     * @param {string} dateTo
+     * @returns {Promise} resolved with the payload of the window
+     */
+    _fetchWindow: function (dateFrom, dateTo) {
+        return this._rpc({
+            model: 'zone.reservation.summary',
+            method: 'get_summary_window',
+            args: [dateFrom.format(SERVER_FORMAT), dateTo.format(SERVER_FORMAT)],
+            context: session.user_context,
+        });
+    },
+    /**
+     * @returns {Promise} the window following the loaded days
+     */
+    _requestNext: function () {
+        var last = moment.utc(this.dates[this.dates.length - 1].date, SERVER_FORMAT);
+        var dateFrom = last.clone().add(1, 'seconds');
+        var dateTo = dateFrom.clone().add(this.WINDOW_DAYS, 'days').subtract(1, 'seconds');
+        return this._fetchWindow(dateFrom, dateTo);
+    },
+    /**
+     * @returns {Promise} the window preceding the loaded days
+     */
+    _requestPrevious: function () {
+        var first = moment.utc(this.dates[0].date, SERVER_FORMAT);
+        var dateTo = first.clone().subtract(1, 'days');
+        var dateFrom = dateTo.clone().subtract(this.WINDOW_DAYS - 1, 'days');
+        return this._fetchWindow(dateFrom, dateTo);
+    },
+    /**
+     * Start loading the windows adjacent to the loaded days.
+     */
+    _prefetch: function () {
+        if (!this.dates.length) {
+            return;
+        }
+        if (!this._nextWindow) {
+            this._nextWindow = this._requestNext();
+        }
+        if (!this._previousWindow) {
+            this._previousWindow = this._requestPrevious();
+        }
+    },
+    /**
+     * Add the prefetched window on the given side, then prefetch the one
+     * after it.
+     *
+     * @param {string} side 'next' or 'previous'
+     */
+    _loadWindow: function (side) {
+        var self = this;
+        var key = side === 'next' ? '_nextWindow' : '_previousWindow';
+        if (this._loading[side] || !this.dates.length) {
+            return;
+        }
+        var request = this[key] || (side === 'next' ? this._requestNext() : this._requestPrevious());
+        var summary = this.recordData.zone_summary;
+        this._loading[side] = true;
+        request.then(function (payload) {
+            if (summary !== self.recordData.zone_summary) {
+                return;
+            }
+            self[key] = null;
+            self._loading[side] = false;
+            var added = self._addWindow(payload, side === 'previous');
+            self._renderCanvas();
+            if (side === 'previous' && added) {
+                self.$viewport.scrollLeft(self.$viewport.scrollLeft() + added * self.CELL_WIDTH);
+            }
+            self._renderWindow(true);
+            self._prefetch();
+        }, function () {
+            self[key] = null;
+            self._loading[side] = false;
+        });
+    },
+
+    //--------------------------------------------------------------------------
+    // Handlers
+    //--------------------------------------------------------------------------
+
+    _onScroll: function () {
+        var self = this;
+        if (this._scrollPending) {
+            return;
+        }
+        this._scrollPending = true;
+        window.requestAnimationFrame(function () {
+            self._scrollPending = false;
+            self._renderWindow();
+            var scrollLeft = self.$viewport.scrollLeft();
+            var firstCol = Math.floor(scrollLeft / self.CELL_WIDTH);
+            var lastCol = Math.ceil((scrollLeft + self.$viewport.width()) / self.CELL_WIDTH);
+            if (lastCol + self.THRESHOLD >= self.dates.length) {
+                self._loadWindow('next');
+            }
+            if (firstCol < self.THRESHOLD) {
+                self._loadWindow('previous');
+            }
+        });
+    },
+    /**
+     * Ctrl+click, or any click while cells are selected, toggles the
+     * selection of the cell. A plain click books the cell alone.
+     */
+    _onFreeCellClicked: function (event) {
+        var $cell = $(event.currentTarget);
+        if (event.ctrlKey || event.metaKey || !_.isEmpty(this.selection)) {
+            var key = $cell.attr("data") + '|' + $cell.attr("date");
+            if (this.selection[key]) {
+                delete this.selection[key];
+            } else {
+                this.selection[key] = [parseInt($cell.attr("data"), 10), $cell.attr("date")];
+            }
+            $cell.toggleClass('table_selected', !!this.selection[key]);
+            this._renderToolbar();
+            return;
+        }
+        this.do_action({
+                type: 'ir.actions.act_window',
+                res_model: "quick.zone.reservation",
+                views: [[false, 'form']],
+                target: 'new',
+                context: {"zone_id": $cell.attr("data"), 'date': $cell.attr("date"), 'default_adults': 1},
+        });
+    },
+    _onBookSelectionClicked: function () {
+        var cells = _.values(this.selection);
+        if (!cells.length) {
+            return;
+        }
+        this.selection = {};
+        this._renderToolbar();
+        this._renderWindow(true);
+        this.do_action({
+                type: 'ir.actions.act_window',
+                res_model: "quick.zone.reservation",
+                views: [[false, 'form']],
+                target: 'new',
+                context: {'cells': cells, 'default_adults': 1},
+        });
     },
 });
 
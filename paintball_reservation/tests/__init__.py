@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+
+from . import test_query_counts
+from . import test_quick_reservation
@@ -0,0 +1,248 @@
+# See LICENSE file for full copyright and licensing details.
+
+import logging
+from datetime import datetime, timedelta
+
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+from odoo.addons.paintball_reservation.models import paintball_reservation
+
+_logger = logging.getLogger(__name__)
+
+
+@tagged('post_install', '-at_install')
+class TestQueryCounts(TransactionCase):
+    """
+    Upper bounds on the SQL queries of the reservation and folio flows.
+
+    Every flow is measured on a small and a large record set. The small
+    run must stay under an absolute bound, and the number of queries
+    added by each extra record must stay under a per-record budget: a
+    search or a write brought back into a per-line loop makes the growth
+    exceed it.
+
+    Set the bounds to the counts of a reference run plus a small margin,
+    every run logs the counts it measured.
+    """
+
+    SMALL = 2
+    LARGE = 6
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestQueryCounts, cls).setUpClass()
+        cls.env = cls.env(context=dict(cls.env.context,
+                                       tracking_disable=True))
+        cls.warehouse = cls.env.ref('stock.warehouse0')
+        cls.pricelist = cls.env.ref('product.list0')
+        cls.partner = cls.env['res.partner'].create({'name': 'Query Guest'})
+        cls.area = cls.env['paintball.area'].create({'name': 'Query Area'})
+        cls.categ = cls.env['paintball.zone.type'].create(
+            {'name': 'Query Category'})
+        cls.zones = cls.env['paintball.zone'].create([{
+            'name': 'Query Zone %d' % index,
+            'area_id': cls.area.id,
+            'categ_id': cls.categ.id,
+            'capacity': 10,
+            'capacity_min': 1,
+            'list_price': 100.0,
+            'iszone': True,
+        } for index in range(cls.LARGE)])
+        cls.start = (datetime.now() + timedelta(days=30)).replace(
+            minute=0, second=0, microsecond=0)
+        cls.slot = 0
+
+    def _next_slot(self):
+        """ Return a period no other reservation of the test uses. """
+        type(self).slot += 1
+        checkin = self.start + timedelta(days=2 * self.slot)
+        return checkin, checkin + timedelta(hours=4)
+
+    def _create_reservations(self, count, zones_per_reservation=1):
+        vals_list = []
+        for __ in range(count):
+            checkin, checkout = self._next_slot()
+            vals_list.append({
+                'partner_id': self.partner.id,
+                'partner_invoice_id': self.partner.id,
+                'partner_order_id': self.partner.id,
+                'partner_shipping_id': self.partner.id,
+                'pricelist_id': self.pricelist.id,
+                'warehouse_id': self.warehouse.id,
+                'checkin': checkin,
+                'checkout': checkout,
+                'adults': 1,
+                'reservation_line': [(0, 0, {
+                    'categ_id': self.categ.id,
+                    'reserve': [(4, zone.id)],
+                }) for zone in self.zones[:zones_per_reservation]],
+            })
+        return self.env['paintball.reservation'].create(vals_list)
+
+    def _count_queries(self, func, *args):
+        self.env['base'].flush()
+        self.env['base'].invalidate_cache()
+        count = self.cr.sql_log_count
+        func(*args)
+        self.env['base'].flush()
+        return self.cr.sql_log_count - count
+
+    def assertQueriesScale(self, flow, build, bound, per_record):
+        """
+        @param flow: function measured, called with the result of build
+        @param build: function preparing the records of the flow for a
+                      given size, not measured
+        @param bound: maximum number of queries on SMALL records
+        @param per_record: maximum number of queries per extra record
+        """
+        counts = [self._count_queries(flow, build(size))
+                  for size in (self.SMALL, self.LARGE)]
+        growth = (counts[1] - counts[0]) / float(self.LARGE - self.SMALL)
+        _logger.info("%s: %d queries for %d records, %.1f per extra record "
+                     "(bound %d, %d per record)", self._testMethodName,
+                     counts[0], self.SMALL, growth, bound, per_record)
+        self.assertLessEqual(counts[0], bound,
+                             "%d queries for %d records, expected at most "
+                             "%d" % (counts[0], self.SMALL, bound))
+        self.assertLessEqual(growth, per_record,
+                             "%.1f queries per extra record (%d for %d, %d "
+                             "for %d), expected at most %d" % (
+                                 growth, counts[0], self.SMALL, counts[1],
+                                 self.LARGE, per_record))
+
+    def test_create_reservation(self):
+        def build(size):
+            checkin, checkout = self._next_slot()
+            return {
+                'partner_id': self.partner.id,
+                'partner_invoice_id': self.partner.id,
+                'partner_order_id': self.partner.id,
+                'partner_shipping_id': self.partner.id,
+                'pricelist_id': self.pricelist.id,
+                'warehouse_id': self.warehouse.id,
+                'checkin': checkin,
+                'checkout': checkout,
+                'adults': 1,
+                'reservation_line': [(0, 0, {
+                    'categ_id': self.categ.id,
+                    'reserve': [(4, zone.id)],
+                }) for zone in self.zones[:size]],
+            }
+        self.assertQueriesScale(
+            self.env['paintball.reservation'].create, build,
+            bound=40, per_record=3)
+
+    def test_confirm_reservations(self):
+        self.assertQueriesScale(
+            lambda reservations: reservations.confirmed_reservation(),
+            self._create_reservations, bound=40, per_record=4)
+
+    def test_confirm_reservation_lines(self):
+        self.assertQueriesScale(
+            lambda reservation: reservation.confirmed_reservation(),
+            lambda size: self._create_reservations(1, size),
+            bound=40, per_record=3)
+
+    def test_create_folio(self):
+        def build(size):
+            reservations = self._create_reservations(size)
+            reservations.confirmed_reservation()
+            return reservations
+        self.assertQueriesScale(
+            lambda reservations: reservations.create_folio(), build,
+            bound=150, per_record=20)
+
+    def test_create_folio_lines(self):
+        def build(size):
+            reservation = self._create_reservations(1, size)
+            reservation.confirmed_reservation()
+            return reservation
+        self.assertQueriesScale(
+            lambda reservation: reservation.create_folio(), build,
+            bound=150, per_record=6)
+
+    def _create_folio(self):
+        reservation = self._create_reservations(1)
+        reservation.confirmed_reservation()
+        reservation.create_folio()
+        return reservation.folio_id
+
+    def test_add_folio_lines(self):
+        def build(size):
+            folio = self._create_folio()
+            return folio, [(0, 0, {
+                'product_id': zone.product_id.id,
+                'checkin_date': folio.checkin_date,
+                'checkout_date': folio.checkout_date,
+                'name': zone.name,
+                'price_unit': 100.0,
+                'product_uom_qty': 1.0,
+            }) for zone in self.zones[1:size]]
+        self.assertQueriesScale(
+            lambda args: args[0].write({'zone_lines': args[1]}), build,
+            bound=100, per_record=10)
+
+    def test_remove_folio_lines(self):
+        def build(size):
+            folio = self._create_folio()
+            folio.write({'zone_lines': [(0, 0, {
+                'product_id': zone.product_id.id,
+                'checkin_date': folio.checkin_date,
+                'checkout_date': folio.checkout_date,
+                'name': zone.name,
+                'price_unit': 100.0,
+                'product_uom_qty': 1.0,
+            }) for zone in self.zones[1:size]]})
+            return folio.zone_lines
+        self.assertQueriesScale(
+            lambda lines: lines.unlink(), build, bound=60, per_record=4)
+
+    def test_move_folio_lines(self):
+        """ Moving the lines of a folio moves its zone reservation lines
+        with a single search. """
+        def build(size):
+            reservation = self._create_reservations(1, size)
+            reservation.confirmed_reservation()
+            reservation.create_folio()
+            return reservation.folio_id.zone_lines
+        self.assertQueriesScale(
+            lambda lines: lines.write({
+                'checkout_date': lines[0].checkout_date + timedelta(hours=1),
+            }), build, bound=60, per_record=4)
+
+    def test_cancel_reservation(self):
+        def build(size):
+            reservation = self._create_reservations(1, size)
+            reservation.confirmed_reservation()
+            return reservation
+        self.assertQueriesScale(
+            lambda reservation: reservation.cancel_reservation(), build,
+            bound=40, per_record=3)
+
+    def test_invoice_folio(self):
+        def build(size):
+            reservation = self._create_reservations(1, size)
+            reservation.confirmed_reservation()
+            reservation.create_folio()
+            reservation.folio_id.action_confirm()
+            return reservation.folio_id
+        self.assertQueriesScale(
+            lambda folio: folio.action_invoice_create(), build,
+            bound=200, per_record=15)
+
+    def test_zone_summary(self):
+        """ The summary of a fixed window does not depend on the number of
+        reservations in it. """
+        date_from = self.start
+        date_to = self.start + timedelta(days=365)
+
+        def build(size):
+            self._create_reservations(size).confirmed_reservation()
+            paintball_reservation.ZONE_SUMMARY_CACHE.clear()
+            return self.env['zone.reservation.summary'].new({
+                'date_from': date_from,
+                'date_to': date_to,
+            })
+        self.assertQueriesScale(
+            lambda summary: summary.get_zone_summary(), build,
+            bound=20, per_record=0)
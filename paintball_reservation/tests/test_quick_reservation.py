@@ -0,0 +1,133 @@
+# See LICENSE file for full copyright and licensing details.
+
+import json
+from datetime import datetime, timedelta
+
+import pytz
+
+from odoo import fields
+from odoo.exceptions import ValidationError
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+from odoo.addons.paintball_reservation.models import paintball_reservation
+
+
+@tagged('post_install', '-at_install')
+class TestQuickReservation(TransactionCase):
+    """
+    Booking cells selected on the zone summary with the quick reservation
+    wizard. The cells carry the dates of the summary columns, the end of
+    their local day in UTC, and are booked for the whole local day.
+    """
+
+    TZ = 'Europe/Brussels'
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestQuickReservation, cls).setUpClass()
+        cls.env = cls.env(context=dict(cls.env.context,
+                                       tracking_disable=True, tz=cls.TZ))
+        cls.warehouse = cls.env.ref('stock.warehouse0')
+        cls.partner = cls.env['res.partner'].create({'name': 'Quick Guest'})
+        cls.area = cls.env['paintball.area'].create({'name': 'Quick Area'})
+        cls.categ = cls.env['paintball.zone.type'].create(
+            {'name': 'Quick Category'})
+        cls.zones = cls.env['paintball.zone'].create([{
+            'name': 'Quick Zone %d' % index,
+            'area_id': cls.area.id,
+            'categ_id': cls.categ.id,
+            'capacity': 10,
+            'capacity_min': 1,
+            'list_price': 100.0,
+            'iszone': True,
+        } for index in range(2)])
+        cls.date_from = (datetime.now() + timedelta(days=30)).replace(
+            hour=12, minute=0, second=0, microsecond=0)
+
+    def setUp(self):
+        super(TestQuickReservation, self).setUp()
+        paintball_reservation.ZONE_SUMMARY_CACHE.clear()
+        summary = self.env['zone.reservation.summary'].new({
+            'date_from': self.date_from,
+            'date_to': self.date_from + timedelta(days=2),
+        })
+        summary.get_zone_summary()
+        # Dates of the columns, as sent by the widget.
+        self.dates = json.loads(summary.zone_summary)['dates']
+
+    def _day_start(self, index):
+        """ Start of the local day of a column, in UTC. """
+        timezone = pytz.timezone(self.TZ)
+        day = pytz.utc.localize(self.date_from).astimezone(
+            timezone).date() + timedelta(days=index)
+        start = timezone.localize(datetime.combine(day,
+                                                   datetime.min.time()))
+        return start.astimezone(pytz.utc).replace(tzinfo=None)
+
+    def _open_wizard(self, cells=None, **context):
+        if cells:
+            context['cells'] = cells
+        return self.env['quick.zone.reservation'].with_context(
+            default_adults=1, **context).create({
+                'partner_id': self.partner.id,
+                'partner_invoice_id': self.partner.id,
+                'partner_order_id': self.partner.id,
+                'partner_shipping_id': self.partner.id,
+                'warehouse_id': self.warehouse.id,
+            })
+
+    def test_default_slots(self):
+        wizard = self._open_wizard([[self.zones[0].id, self.dates[0]],
+                                    [self.zones[1].id, self.dates[1]]])
+        self.assertEqual(
+            [(slot.zone_id, slot.check_in, slot.check_out)
+             for slot in wizard.slot_ids],
+            [(self.zones[0], self._day_start(0),
+              fields.Datetime.to_datetime(self.dates[0])),
+             (self.zones[1], self._day_start(1),
+              fields.Datetime.to_datetime(self.dates[1]))])
+        self.assertEqual(self._day_start(1) - self._day_start(0),
+                         timedelta(days=1))
+
+    def test_single_cell(self):
+        wizard = self._open_wizard(zone_id=self.zones[0].id,
+                                   date=self.dates[0])
+        self.assertEqual(wizard.check_in, self._day_start(0))
+        self.assertEqual(wizard.check_out,
+                         fields.Datetime.to_datetime(self.dates[0]))
+
+    def test_reserve_slots(self):
+        zone = self.zones[0]
+        wizard = self._open_wizard([[zone.id, date] for date in self.dates])
+        reservation = wizard.zone_reserve()
+        self.assertEqual(reservation.checkin, self._day_start(0))
+        self.assertEqual(reservation.checkout,
+                         fields.Datetime.to_datetime(self.dates[-1]))
+        self.assertEqual(len(reservation.reservation_line), len(self.dates))
+        reservation.confirmed_reservation()
+        zone_lines = self.env['paintball.zone.reservation.line'].search(
+            [('reservation_id', '=', reservation.id)], order='check_in')
+        starts = [self._day_start(index) for index in range(len(self.dates))]
+        self.assertEqual(zone_lines.mapped('check_in'), starts)
+
+        # Moving the folio keeps the periods of the slots.
+        reservation.create_folio()
+        reservation.folio_id.write({
+            'checkout_date': reservation.folio_id.checkout_date +
+            timedelta(hours=1)})
+        self.assertEqual(zone_lines.mapped('check_in'), starts)
+
+    def test_reserve_busy_slot(self):
+        """ A booking within a day makes its cell busy, not the next one. """
+        zone = self.zones[1]
+        booked = self._open_wizard(zone_id=zone.id, date=self.dates[0])
+        booked.write({
+            'check_in': self._day_start(0) + timedelta(hours=10),
+            'check_out': self._day_start(0) + timedelta(hours=12),
+        })
+        booked.zone_reserve().confirmed_reservation()
+        with self.assertRaises(ValidationError):
+            self._open_wizard([[zone.id, self.dates[0]]]).zone_reserve()
+        reservation = self._open_wizard(
+            [[zone.id, self.dates[1]]]).zone_reserve()
+        self.assertEqual(reservation.checkin, self._day_start(1))
@@ -1,6 +1,22 @@
 # See LICENSE file for full copyright and licensing details.
 
-from odoo import api, fields, models
+import csv
+import io
+import os
+import tempfile
+
+import odoo
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+from odoo.addons.paintball.tools import intervals
+
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+EXPORT_BATCH_SIZE = 2000
+EXPORT_CHUNK_SIZE = 64 * 1024
 
 
 class PaintballReservationWizard(models.TransientModel):
@@ -9,46 +25,232 @@ class PaintballReservationWizard(models.TransientModel):
 
     date_start = fields.Datetime('Start Date', required=True)
     date_end = fields.Datetime('End Date', required=True)
+    reservation_ids = fields.Many2many('paintball.reservation',
+                                       string='Reservations')
+    groupby = fields.Selection([('categ_id', 'Zone Category'),
+                                ('area_id', 'Area')],
+                               string='Group Zones By')
+    export_report = fields.Selection([('checkin', 'Check-In List'),
+                                      ('checkout', 'Check-Out List'),
+                                      ('reservation', 'Reservation List')],
+                                     string='Export', default='checkin')
+    export_format = fields.Selection([('csv', 'CSV'), ('xlsx', 'XLSX')],
+                                     string='Export Format', default='csv')
 
-    
-    def report_reservation_detail(self):
-        data = {
+    @api.onchange('date_start', 'date_end')
+    def onchange_period(self):
+        self.reservation_ids = [(5, 0, 0)]
+
+    def _get_report_data(self):
+        """
+        Return the data of the reports. The reservations of the period
+        are selected by the first report printed and reused by the next
+        ones printed from this wizard.
+        """
+        self.ensure_one()
+        if not self.reservation_ids:
+            dataset_obj = self.env['report.paintball_reservation.dataset']
+            dataset = dataset_obj._get_dataset(self.date_start, self.date_end)
+            self.reservation_ids = dataset['checkin'] | dataset['checkout']
+        return {
             'ids': self.ids,
             'model': 'paintball.reservation',
-            'form': self.read(['date_start', 'date_end'])[0]
+            'form': self.read(['date_start', 'date_end',
+                               'reservation_ids', 'groupby'])[0]
         }
-        return self.env.ref('paintball_reservation.paintball_roomres_details'
-                            ).report_action(self, data=data)
 
-    
+    def report_reservation_detail(self):
+        return self.env.ref('paintball_reservation.paintball_zoneres_details'
+                            ).report_action(self,
+                                            data=self._get_report_data())
+
     def report_checkin_detail(self):
-        data = {
-            'ids': self.ids,
-            'model': 'paintball.reservation',
-            'form': self.read(['date_start', 'date_end'])[0],
-        }
         return self.env.ref('paintball_reservation.paintball_checkin_details'
-                            ).report_action(self, data=data)
+                            ).report_action(self,
+                                            data=self._get_report_data())
 
-    
     def report_checkout_detail(self):
-        data = {
-            'ids': self.ids,
-            'model': 'paintball.reservation',
-            'form': self.read(['date_start', 'date_end'])[0]
-        }
         return self.env.ref('paintball_reservation.paintball_checkout_details'
-                            ).report_action(self, data=data)
+                            ).report_action(self,
+                                            data=self._get_report_data())
 
-    
     def report_maxroom_detail(self):
-        data = {
-            'ids': self.ids,
-            'model': 'paintball.reservation',
-            'form': self.read(['date_start', 'date_end'])[0]
+        return self.env.ref('paintball_reservation.paintball_maxzone_details'
+                            ).report_action(self,
+                                            data=self._get_report_data())
+
+
+    def action_export(self):
+        """
+        Download the selected list as a file streamed by the
+        /paintball_reservation/export controller.
+        """
+        self.ensure_one()
+        if self.export_format == 'xlsx' and xlsxwriter is None:
+            raise UserError(_('The xlsxwriter library is required to '
+                              'export XLSX files.'))
+        return {
+            'type': 'ir.actions.act_url',
+            'url': '/paintball_reservation/export/%s' % self.id,
+            'target': 'self',
         }
-        return self.env.ref('paintball_reservation.paintball_maxroom_details'
-                            ).report_action(self, data=data)
+
+    def _get_export_filename(self):
+        self.ensure_one()
+        return '%s_%s_%s.%s' % (self.export_report,
+                                self.date_start.strftime('%Y%m%d'),
+                                self.date_end.strftime('%Y%m%d'),
+                                self.export_format)
+
+    def _get_export_header(self):
+        return [_('Reservation No'), _('Guest Name'), _('Check In'),
+                _('Check Out'), _('Zone Type'), _('Zone'), _('State')]
+
+    def _get_export_query(self):
+        """
+        Return the query and the parameters selecting one row per
+        reserved zone of the reservations of the exported list, the
+        record rules of the user applied.
+        """
+        self.ensure_one()
+        reservation_obj = self.env['paintball.reservation']
+        if self.export_report == 'checkin':
+            domain = [('checkin', '>=', self.date_start),
+                      ('checkin', '<=', self.date_end)]
+        elif self.export_report == 'checkout':
+            domain = [('checkout', '>=', self.date_start),
+                      ('checkout', '<=', self.date_end)]
+        else:
+            domain = [('checkin', '>=', self.date_start),
+                      ('checkout', '<=', self.date_end)]
+        reservation_obj.check_access_rights('read')
+        query = reservation_obj._where_calc(domain)
+        reservation_obj._apply_ir_rules(query, 'read')
+        from_clause, where_clause, params = query.get_sql()
+        return """
+            SELECT paintball_reservation.reservation_no, p.name,
+                   paintball_reservation.checkin,
+                   paintball_reservation.checkout, zt.name, zpt.name,
+                   paintball_reservation.state
+              FROM %s
+              JOIN res_partner p
+                ON p.id = paintball_reservation.partner_id
+         LEFT JOIN paintball_reservation_line rl
+                ON rl.line_id = paintball_reservation.id
+         LEFT JOIN paintball_zone_type zt ON zt.id = rl.categ_id
+         LEFT JOIN paintball_reservation_line_zone_rel rel
+                ON rel.paintball_reservation_line_id = rl.id
+         LEFT JOIN paintball_zone z ON z.id = rel.zone_id
+         LEFT JOIN product_product zp ON zp.id = z.product_id
+         LEFT JOIN product_template zpt ON zpt.id = zp.product_tmpl_id
+             WHERE %s
+          ORDER BY paintball_reservation.%s, paintball_reservation.id,
+                   rl.id, zpt.name
+        """ % (from_clause, where_clause or 'TRUE',
+               'checkout' if self.export_report == 'checkout' else
+               'checkin'), params
+
+    def _iter_export_rows(self):
+        """
+        Yield the rows of the export in batches, read through a named
+        server side cursor in a cursor of their own: the export is
+        streamed after the request that started it is over and its
+        memory does not grow with the size of the period.
+        """
+        self.ensure_one()
+        dbname, uid = self._cr.dbname, self._uid
+        context = dict(self._context)
+
+        def generate():
+            with api.Environment.manage(), \
+                    odoo.registry(dbname).cursor() as cr:
+                env = api.Environment(cr, uid, context)
+                wizard = self.with_env(env)
+                tz = env.user.tz or 'UTC'
+                query, params = wizard._get_export_query()
+                # Named cursors live in the transaction of the connection.
+                with cr._cnx.cursor('paintball_reservation_export') as named:
+                    named.itersize = EXPORT_BATCH_SIZE
+                    named.execute(query, params)
+                    while True:
+                        rows = named.fetchmany(EXPORT_BATCH_SIZE)
+                        if not rows:
+                            break
+                        yield [(number, guest,
+                                intervals.to_local(checkin, tz),
+                                intervals.to_local(checkout, tz),
+                                categ or '', zone or '', state)
+                               for number, guest, checkin, checkout, categ,
+                               zone, state in rows]
+        return generate()
+
+    def _stream_export(self):
+        """
+        Return the iterator of the bytes of the export file.
+        """
+        self.ensure_one()
+        if self.export_format == 'xlsx':
+            return self._stream_export_xlsx()
+        return self._stream_export_csv()
+
+    def _stream_export_csv(self):
+        header = self._get_export_header()
+        batches = self._iter_export_rows()
+
+        def generate():
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            writer.writerow(header)
+            for rows in batches:
+                writer.writerows(
+                    [row[:2] + (fields.Datetime.to_string(row[2]),
+                                fields.Datetime.to_string(row[3])) + row[4:]
+                     for row in rows])
+                yield buf.getvalue().encode('utf-8')
+                buf.seek(0)
+                buf.truncate()
+            yield buf.getvalue().encode('utf-8')
+        return generate()
+
+    def _stream_export_xlsx(self):
+        """
+        XLSX files are zip archives written at the end: the rows go
+        through xlsxwriter in constant memory mode to a temporary file,
+        which is then streamed in chunks.
+        """
+        header = self._get_export_header()
+        batches = self._iter_export_rows()
+
+        def generate():
+            fd, path = tempfile.mkstemp(suffix='.xlsx')
+            os.close(fd)
+            try:
+                workbook = xlsxwriter.Workbook(path, {
+                    'constant_memory': True,
+                    'tmpdir': tempfile.gettempdir(),
+                })
+                sheet = workbook.add_worksheet()
+                date_format = workbook.add_format(
+                    {'num_format': 'yyyy-mm-dd hh:mm'})
+                sheet.write_row(0, 0, header)
+                row_index = 1
+                for rows in batches:
+                    for row in rows:
+                        sheet.write_row(row_index, 0, row[:2])
+                        sheet.write_datetime(row_index, 2, row[2],
+                                             date_format)
+                        sheet.write_datetime(row_index, 3, row[3],
+                                             date_format)
+                        sheet.write_row(row_index, 4, row[4:])
+                        row_index += 1
+                workbook.close()
+                with open(path, 'rb') as xlsx:
+                    for chunk in iter(lambda: xlsx.read(EXPORT_CHUNK_SIZE),
+                                      b''):
+                        yield chunk
+            finally:
+                os.unlink(path)
+        return generate()
 
 
 class MakeFolioWizard(models.TransientModel):